@@ -104,18 +104,52 @@
 
 
 import os
-import asyncio
-from google import genai
-from dotenv import load_dotenv
+import time
+from collections import deque
 
-load_dotenv()
-API_KEY = os.getenv("GEMINI_API_KEY")
+from contextlib import aclosing
+from pydantic import ValidationError
 
-if not API_KEY:
-    raise ValueError("Missing GEMINI_API_KEY in .env file")
+from context_cache import generate_with_static_prefix, stream_with_static_prefix
+from intent_classifier import CALL_NORMAL_CHAT, classify_intent, record_llm_fallback
+from prompt_builder import CHAT_AND_ROUTE_TASK, CHAT_TASK, ROUTE_TASK, STATIC_PREFIX, task_header
+from schemas import AGENT_REPLY_JSON_SCHEMA, AgentReply
+from semantic_cache import chat_cache
 
-# Initialize Gemini client
-client = genai.Client(api_key=API_KEY)
+# "two_step": local/LLM routing then a chat call; "single_call": one structured Gemini call
+AGENT_MODES = ("two_step", "single_call")
+DEFAULT_AGENT_MODE = os.getenv("AGENT_MODE", "two_step")
+
+FALLBACK_REPLY = "Sorry, I can only answer questions related to weather, pollution, or health impacts."
+
+# ----------------------------
+# 📊 Per-mode metrics (so both paths can be compared side by side)
+# ----------------------------
+mode_metrics = {
+    mode: {"calls": 0, "chat": 0, "recommendation": 0, "latencies_ms": deque(maxlen=1000)}
+    for mode in AGENT_MODES
+}
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def agent_mode_stats() -> dict:
+    stats = {}
+    for mode, m in mode_metrics.items():
+        latencies = list(m["latencies_ms"])
+        stats[mode] = {
+            "calls": m["calls"],
+            "chat": m["chat"],
+            "recommendation": m["recommendation"],
+            "p50_ms": _percentile(latencies, 0.50),
+            "p95_ms": _percentile(latencies, 0.95),
+        }
+    return stats
 
 # ----------------------------
 # 🧩 Tool functions
@@ -126,41 +160,35 @@ async def get_normal_chat(user_input: str):
     Focus on weather, pollution, and health-related topics — but also handle greetings politely.
     """
 
-    chat_prompt = f"""
-    You are a friendly and knowledgeable environmental and health assistant.
-    You specialize in:
-    - Weather and air quality
-    - Pollutants (PM2.5, CO2, NOx, etc.)
-    - Health effects of pollution and poor air quality
-    - Ways to stay healthy and comfortable in polluted environments
-
-    Behavior guidelines:
-    1. If the user greets you (like "hi", "hello", "hey", "good morning"), respond with a friendly short greeting and invite them to ask about weather, air quality, or health.
-    2. If the user asks general questions about weather, air, or pollution, respond naturally and informatively.
-    3. If the question is unrelated (like math, technology, sports, jokes, etc.), respond with:
-       "Sorry, I can only answer questions related to weather, pollution, or health impacts."
-    4. Keep responses concise (1–2 sentences) and empathetic.
-
-    User: {user_input}
-    """
-
-    # Run Gemini call asynchronously in a thread (non-blocking)
-    response = await asyncio.to_thread(
-        client.models.generate_content,
-        model="gemini-2.5-flash",
-        contents=chat_prompt
+    # Native async Gemini call on the shared client (no worker thread held)
+    response = await generate_with_static_prefix(
+        "agent", STATIC_PREFIX, task_header(CHAT_TASK) + f"User: {user_input}\n"
     )
 
-    ai_reply = response.text.strip() if response.text else (
-        "Sorry, I can only answer questions related to weather, pollution, or health impacts."
-    )
+    ai_reply = (response.text or "").strip()
+    if ai_reply:
+        chat_cache.set(user_input, ai_reply)
 
     return {
         "type": "chat",
-        "message": ai_reply,
+        "message": ai_reply or FALLBACK_REPLY,
+        "source": "ai" if ai_reply else "fallback",
     }
 
 
+def cached_chat(user_input: str):
+    """
+    Reply to the same (or a near-duplicate) general question from the chat cache.
+    Only chat answers are ever stored, and personal or discomfort messages are
+    skipped. Callers look up only once routing has settled on chat, so a hit
+    never stands in for a recommendation.
+    """
+    reply = chat_cache.get(user_input)
+    if reply is None:
+        return None
+    return {"type": "chat", "message": reply, "source": "cache"}
+
+
 
 def get_recommendation(user_input: str):
     return {
@@ -171,41 +199,139 @@ def get_recommendation(user_input: str):
 # ----------------------------
 # 🧠 Agentic AI logic
 # ----------------------------
-async def get_agentic_response(user_input: str):
+async def route_with_llm(user_input: str) -> str:
+    """Ask Gemini to classify the intent (used only when the local classifier is unsure)."""
+    response = await generate_with_static_prefix(
+        "agent", STATIC_PREFIX, task_header(ROUTE_TASK) + f"User: {user_input}\n"
+    )
+    return (response.text or "").strip().upper()
+
+
+async def get_two_step_response(user_input: str):
     """
     Determines whether the user input requires normal chat or a recommendation.
-    Uses Gemini 2.5 Flash model to classify intent.
+    A local classifier decides in microseconds; Gemini 2.5 Flash is only
+    consulted when its confidence is below INTENT_CONFIDENCE_THRESHOLD.
     """
 
-    system_prompt = """
-        You are an intelligent intent classifier for an environmental health assistant.
+    intent, _confidence = classify_intent(user_input)
+    if intent is None:
+        record_llm_fallback()
+        intent = await route_with_llm(user_input)
+
+    if "RECOMMENDATION" in intent:
+        return get_recommendation(user_input)
+    cached = cached_chat(user_input)
+    if cached is not None:
+        return cached
+    return await get_normal_chat(user_input)
+
 
-        Your job is to decide whether to call:
-        - CALL_NORMAL_CHAT → for general questions, greetings, or informational topics
-        (like weather, air quality, pollution, health improvement, or environment)
-        - CALL_RECOMMENDATION → only if the user expresses physical discomfort or illness
-        (e.g., "I feel dizzy", "I have a headache", "my room feels suffocating")
+async def get_single_call_response(user_input: str):
+    """
+    One structured Gemini call returns both the intent and the chat reply.
+    The chat cache is only consulted when the local classifier is sure it is chat.
+    """
+    if classify_intent(user_input)[0] == CALL_NORMAL_CHAT:
+        cached = cached_chat(user_input)
+        if cached is not None:
+            return cached
+
+    response = await generate_with_static_prefix(
+        "agent",
+        STATIC_PREFIX,
+        task_header(CHAT_AND_ROUTE_TASK) + f"User: {user_input}\n",
+        config={
+            "response_mime_type": "application/json",
+            "response_json_schema": AGENT_REPLY_JSON_SCHEMA,
+        },
+    )
+    try:
+        reply = AgentReply.model_validate_json(response.text)
+    except (ValidationError, TypeError) as e:
+        # Truncated or empty (None) structured output: answer politely rather than 500
+        print("Single-call reply was not valid AgentReply JSON:", e)
+        return {"type": "chat", "message": FALLBACK_REPLY, "source": "fallback"}
+
+    if reply.intent == "CALL_RECOMMENDATION":
+        return get_recommendation(user_input)
+    message = reply.message.strip()
+    if message:
+        chat_cache.set(user_input, message)
+    return {
+        "type": "chat",
+        "message": message or FALLBACK_REPLY,
+        "source": "ai" if message else "fallback",
+    }
 
-        Rules:
-        1. If the user is simply greeting or asking for advice on health, air, or pollution — CALL_NORMAL_CHAT.
-        2. If the user mentions feeling unwell, cold, tired, or sick — CALL_RECOMMENDATION.
-        3. Always respond with exactly one of these two words:
-        - CALL_NORMAL_CHAT
-        - CALL_RECOMMENDATION
-        """
 
+async def get_agentic_response(user_input: str, mode: str | None = None):
+    """Answer a chat message using the requested routing mode (defaults to AGENT_MODE)."""
+    mode = mode or DEFAULT_AGENT_MODE
+    if mode not in AGENT_MODES:
+        raise ValueError(f"Unknown agent mode '{mode}', expected one of {AGENT_MODES}")
 
-    full_prompt = f"{system_prompt}\n\nUser: {user_input}"
+    started = time.perf_counter()
+    if mode == "single_call":
+        result = await get_single_call_response(user_input)
+    else:
+        result = await get_two_step_response(user_input)
+
+    metrics = mode_metrics[mode]
+    metrics["calls"] += 1
+    metrics[result["type"]] += 1
+    metrics["latencies_ms"].append((time.perf_counter() - started) * 1000)
+    return result
 
-    response = await asyncio.to_thread(
-        client.models.generate_content,
-        model="gemini-2.5-flash",
-        contents=full_prompt
-    )
 
-    intent = (response.text or "").strip().upper()
+# ----------------------------
+# 🌊 Streaming
+# ----------------------------
+async def stream_agentic_response(user_input: str, mode: str | None = None):
+    """
+    Async generator of (event, data) pairs for /ai/agent/stream:
+    one "route" event, then "delta" events as Gemini tokens arrive, then "done".
+    In single_call mode the structured reply arrives whole, so the chat message
+    is sent as one "delta".
+    """
+    mode = mode or DEFAULT_AGENT_MODE
+    if mode not in AGENT_MODES:
+        raise ValueError(f"Unknown agent mode '{mode}', expected one of {AGENT_MODES}")
+    if mode == "single_call":
+        result = await get_single_call_response(user_input)
+        yield "route", {"type": result["type"]}
+        if result["type"] == "chat":
+            yield "delta", {"text": result["message"]}
+        yield "done", result
+        return
+
+    intent, _confidence = classify_intent(user_input)
+    if intent is None:
+        record_llm_fallback()
+        intent = await route_with_llm(user_input)
 
     if "RECOMMENDATION" in intent:
-        return get_recommendation(user_input)
-    else:
-        return await get_normal_chat(user_input)
+        result = get_recommendation(user_input)
+        yield "route", {"type": result["type"]}
+        yield "done", result
+        return
+
+    yield "route", {"type": "chat"}
+    cached = cached_chat(user_input)
+    if cached is not None:
+        yield "delta", {"text": cached["message"]}
+        yield "done", cached
+        return
+
+    parts = []
+    stream = stream_with_static_prefix("agent", STATIC_PREFIX, task_header(CHAT_TASK) + f"User: {user_input}\n")
+    async with aclosing(stream):
+        async for chunk in stream:
+            if chunk.text:
+                parts.append(chunk.text)
+                yield "delta", {"text": chunk.text}
+
+    message = "".join(parts).strip()
+    if message:
+        chat_cache.set(user_input, message)
+    yield "done", {"type": "chat", "message": message or FALLBACK_REPLY, "source": "ai" if message else "fallback"}
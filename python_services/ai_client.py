@@ -1,36 +1,53 @@
 # python_services/ai_client.py
-import os
-from dotenv import load_dotenv
-from google import genai
-from schemas import create_appliance_schema
+from metrics import stage
+from schemas import appliance_json_schema
+from gemini_client import generate
+from resilience import ServiceUnavailableError
+from context_cache import generate_with_static_prefix
 
-load_dotenv()
-
-API_KEY = os.getenv("GEMINI_API_KEY")
-if not API_KEY:
-    raise ValueError("Missing GEMINI_API_KEY in .env file")
-
-# Initialize the Gemini client
-client = genai.Client(api_key=API_KEY)
-
-def get_ai_recommendation(prompt: str, appliances: dict):
+async def get_ai_recommendation(prompt: str, appliances: dict, static_prefix: str | None = None):
     """
     Send prompt to Gemini and return structured JSON response.
-    Schema is dynamically generated based on available appliances.
+    Schema is precomputed once per combination of available appliances.
+    When `static_prefix` is given it is sent as cached content and `prompt`
+    holds only the dynamic sections.
     """
     try:
-        # Dynamically create schema for this user
-        ApplianceSettings = create_appliance_schema(appliances)
+        with stage("schema"):
+            config = {
+                "response_mime_type": "application/json",
+                "response_json_schema": appliance_json_schema(appliances),
+            }
+        with stage("gemini"):
+            if static_prefix:
+                response = await generate_with_static_prefix("recommend", static_prefix, prompt, config)
+            else:
+                response = await generate("recommend", contents=prompt, config=config)
+        return response.text
+    except ServiceUnavailableError:
+        raise
+    except Exception as e:
+        print("AI Recommendation Error:", e)
+        return None
+
 
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
+async def get_ai_batch_recommendation(prompt: str, appliances: dict, count: int):
+    """
+    Send a multi-room prompt to Gemini and return a JSON array with one
+    recommendation per room. All rooms in the prompt share the same appliances.
+    """
+    try:
+        response = await generate(
+            "recommend",
             contents=prompt,
             config={
                 "response_mime_type": "application/json",
-                "response_schema": ApplianceSettings,
+                "response_json_schema": appliance_json_schema(appliances, many=True),
             },
         )
         return response.text
+    except ServiceUnavailableError:
+        raise
     except Exception as e:
-        print("AI Recommendation Error:", e)
+        print(f"AI Batch Recommendation Error ({count} rooms):", e)
         return None
@@ -1,22 +1,91 @@
 # python_services/app.py
 import os
 import json
-import uvicorn
+import time
 import asyncio
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from pydantic import BaseModel
-from fastapi import FastAPI, HTTPException
-from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from contextlib import aclosing
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fast_json import FastJSONResponse
+
+import gemini_client
+import metrics
+from resilience import ServiceUnavailableError
+from recommendation_cache import recommendation_cache
+from context_cache import context_cache
+from semantic_cache import chat_cache
+from room_state import room_states, room_state_key
+from rate_limiter import RATE_LIMIT_BY_IP, current_user, quota
+from recommendation_scheduler import SCHEDULER_ENABLED, recommendation_scheduler
+from trend_features import trend_store
+from prompt_serializer import serializer_stats
+from schemas import prebuild_schemas
+from recommendation_service import (
+    RecommendationError,
+    recommendation_flight,
+    recommend,
+    recommend_batch,
+    BATCH_MAX_CONCURRENCY,
+    BATCH_PACK_SIZE,
+)
+from agent_client import AGENT_MODES, get_agentic_response, agent_mode_stats, stream_agentic_response
+from intent_classifier import classifier_stats, get_model as load_intent_model
+
+
+# /health/ready reports 503 until warm-up has finished (and again while shutting down)
+service_state = {"ready": False, "warmup_seconds": None}
+
+
+def warm_up() -> float:
+    """
+    CPU-bound startup work; idempotent. serve.py runs it once before forking so
+    workers inherit the results, the lifespan runs it again for single-process mode.
+    Nothing that holds sockets, threads or connections belongs here (see connect()).
+    """
+    started = time.perf_counter()
+    # All 32 appliance schemas (and their JSON schemas) are built once up front
+    prebuild_schemas()
+    # Train the local intent router before the first chat message arrives
+    load_intent_model()
+    return time.perf_counter() - started
 
-from ai_client import get_ai_recommendation
-from data_samples import prepare_environment_data
-from prompt_builder import build_prompt
-from agent_client import get_agentic_response
+
+def connect() -> float:
+    """Per-process startup I/O, run in each worker after the fork."""
+    started = time.perf_counter()
+    # Build the Gemini client (and import its SDK) before the first request needs it
+    gemini_client.get_client()
+    # Open the shared cache tier now rather than on the first request
+    if recommendation_cache.disk is not None:
+        recommendation_cache.disk.get("warm-up")
+    return time.perf_counter() - started
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    service_state["warmup_seconds"] = round(warm_up() + connect(), 4)
+    # Compute recommendations for pushed readings in the background (one worker under serve.py)
+    if SCHEDULER_ENABLED and recommendation_scheduler.forward_to is None:
+        recommendation_scheduler.start()
+    service_state["ready"] = True
+    yield
+    service_state["ready"] = False
+    await recommendation_scheduler.stop()
+    # Release the shared Gemini connection pool
+    await gemini_client.aclose()
 
 
 # ✅ Create the FastAPI app
-app = FastAPI(title="Indoor Comfort AI Service", version="1.0")
+app = FastAPI(
+    title="Indoor Comfort AI Service",
+    version="1.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
 
 
 app.add_middleware(
@@ -31,6 +100,38 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
+
+
+# ----------------------------
+# 📊 Scrape-time gauges from the existing component stats
+# ----------------------------
+def _cache_hit_ratios():
+    rooms = room_states.stats()
+    room_lookups = rooms["reused"] + rooms["changed"] + rooms["expired"]
+    context = context_cache.stats()
+    context_lookups = context["hits"] + context["creates"] + context["fallbacks"]
+    return {
+        ("recommendation",): recommendation_cache.stats()["hit_ratio"],
+        ("room_state",): rooms["reused"] / room_lookups if room_lookups else 0.0,
+        ("context",): context["hits"] / context_lookups if context_lookups else 0.0,
+        ("chat",): chat_cache.stats()["hit_ratio"],
+    }
+
+
+metrics.Gauge("ai_cache_hit_ratio", "Hit ratio per cache layer", ("cache",), collect=_cache_hit_ratios)
+metrics.Gauge(
+    "ai_gemini_in_flight", "Gemini calls holding a route slot", ("route",),
+    collect=lambda: {(route,): lim.in_flight for route, lim in gemini_client.limiters.items()},
+)
+metrics.Gauge(
+    "ai_gemini_waiting", "Gemini calls queued for a route slot", ("route",),
+    collect=lambda: {(route,): lim.waiting for route, lim in gemini_client.limiters.items()},
+)
+metrics.Gauge(
+    "ai_single_flight_in_flight", "Distinct recommendation keys being computed",
+    collect=lambda: {(): recommendation_flight.stats()["in_flight"]},
+)
 
 
 # 🧠 Request schema
@@ -40,62 +141,227 @@ class RecommendationRequest(BaseModel):
     indoor: dict | None = None
     outdoor: dict | None = None
     meta: dict | None = None
+    history: list[dict] | None = None   # recent Node readings, oldest first
+
+class BatchRecommendationRequest(BaseModel):
+    items: list[RecommendationRequest]
+    user_id: str | None = None  # quota owner; defaults to the items' user when they all share one
+    max_concurrency: int = Field(BATCH_MAX_CONCURRENCY, ge=1)
+    pack: bool = False          # several rooms per Gemini call
+    pack_size: int = Field(BATCH_PACK_SIZE, ge=1)
 
 class AgentChatRequest(BaseModel):
     user_input: str
+    mode: str | None = None     # "two_step" or "single_call"; defaults to AGENT_MODE
+    user_id: str | None = None  # quota owner, unless an X-User-Id header is sent
+
+
+def bind_user(http_request: Request, raw_user: dict | None = None, user_id: str | None = None):
+    """
+    Attribute Gemini quota to the caller: X-User-Id header, explicit user id,
+    user document id/email. Unidentified callers only count against the model
+    limits, unless RATE_LIMIT_BY_IP keys them by client IP.
+    """
+    raw_user = raw_user or {}
+    user_id = http_request.headers.get("x-user-id") or user_id or raw_user.get("_id") or raw_user.get("email")
+    if not user_id and RATE_LIMIT_BY_IP and http_request.client:
+        user_id = http_request.client.host
+    current_user.set(str(user_id) if user_id else None)
+
+
+def overloaded(error: ServiceUnavailableError) -> HTTPException:
+    """Backpressure response when a route's Gemini queue is full or the breaker is open."""
+    return HTTPException(
+        status_code=error.status_code,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)},
+    )
 
 
 @app.post("/ai/recommend")
-async def get_ai_recommendation_route(request: RecommendationRequest):
+async def get_ai_recommendation_route(request: RecommendationRequest, http_request: Request):
+    bind_user(http_request, request.user)
     try:
-        # Normalize the data
-        room_info, appliances, user_info, indoor_pollutants, outdoor_pollutants = prepare_environment_data(
-            request.user,
-            request.room,
-            request.indoor,
-            request.outdoor
-        )
+        result = await recommend(request.user, request.room, request.indoor, request.outdoor, request.history)
+        metrics.recommendation_sources.inc(result["source"])
+        # Already plain JSON data: skip FastAPI's jsonable_encoder pass
+        return FastJSONResponse(result)
 
-        # Build prompt
-        prompt = build_prompt(
-            room_info=room_info,
-            appliances=appliances,
-            user_info=user_info,
-            indoor_pollutants=indoor_pollutants,
-            outdoor_pollutants=outdoor_pollutants
-        )
+    except ServiceUnavailableError as e:
+        metrics.record_error("/ai/recommend", e)
+        raise overloaded(e)
+    except RecommendationError as e:
+        metrics.record_error("/ai/recommend", e)
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except Exception as e:
+        metrics.record_error("/ai/recommend", e)
+        raise HTTPException(status_code=500, detail=str(e))
 
 
-        # Send to Gemini
-        # ai_response = await get_ai_recommendation(prompt,appliances)
-        ai_response = await run_in_threadpool(get_ai_recommendation, prompt, appliances)
-        if not ai_response:
-            raise HTTPException(status_code=500, detail="AI service returned no response")
-        
+@app.post("/ai/rooms/track")
+async def track_room_readings(request: RecommendationRequest, http_request: Request):
+    """
+    Push new readings of a room (e.g. from the Node scheduler) so its
+    recommendation is computed in the background before the next read.
+    """
+    key = room_state_key(request.user, request.room)
+    if key is None:
+        raise HTTPException(status_code=400, detail="user and room must carry an _id")
+    if not SCHEDULER_ENABLED:
+        raise HTTPException(status_code=503, detail="Recommendation scheduler is disabled")
+    if recommendation_scheduler.forward_to:
+        # Pre-forked: another worker owns the scheduler
         try:
-            ai_data = json.loads(ai_response)
-        except json.JSONDecodeError:
-            ai_data = ai_response  # fallback if already dict
-
+            forwarded = await recommendation_scheduler.forward(await http_request.body())
+        except OSError as e:
+            forwarded = False
+            print("Forwarding room readings to the scheduler worker failed:", e)
+        if not forwarded:
+            raise HTTPException(status_code=503, detail="Recommendation scheduler is unavailable")
+        return {"success": True, "scheduled": True}
+    recommendation_scheduler.track(key, (request.user, request.room, request.indoor, request.outdoor, request.history))
+    return {"success": True, "scheduled": True}
 
-        return {"success": True, "recommendation": ai_data}
 
+@app.post("/ai/recommend/batch")
+async def get_ai_batch_recommendation_route(request: BatchRecommendationRequest, http_request: Request):
+    """
+    Recommendations for many rooms in one round trip.
+    Results (or per-item errors) come back in the same order as `items`.
+    """
+    owners = {item.user.get("_id") or item.user.get("email") for item in request.items}
+    bind_user(http_request, user_id=request.user_id or (owners.pop() if len(owners) == 1 else None))
+    try:
+        results = await recommend_batch(
+            [(item.user, item.room, item.indoor, item.outdoor, item.history) for item in request.items],
+            max_concurrency=min(request.max_concurrency, BATCH_MAX_CONCURRENCY),
+            pack=request.pack,
+            pack_size=request.pack_size,
+        )
+        return {"success": True, "results": results}
+    except ServiceUnavailableError as e:
+        metrics.record_error("/ai/recommend/batch", e)
+        raise overloaded(e)
+    except RecommendationError as e:
+        metrics.record_error("/ai/recommend/batch", e)
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
+        metrics.record_error("/ai/recommend/batch", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/ai/agent")
-async def handle_agent_chat(request: AgentChatRequest):
+async def handle_agent_chat(request: AgentChatRequest, http_request: Request):
     """
     Route incoming user chat messages to Gemini AI router.
     """
+    bind_user(http_request, user_id=request.user_id)
+    if request.mode is not None and request.mode not in AGENT_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {AGENT_MODES}")
     try:
-        result = await get_agentic_response(request.user_input)
+        result = await get_agentic_response(request.user_input, mode=request.mode)
         return {"success": True, "result": result}
+    except ServiceUnavailableError as e:
+        metrics.record_error("/ai/agent", e)
+        raise overloaded(e)
+    except Exception as e:
+        metrics.record_error("/ai/agent", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/ai/agent/stream")
+async def stream_agent_chat(request: AgentChatRequest, http_request: Request):
+    """
+    Server-Sent Events variant of /ai/agent: forwards Gemini tokens as they arrive.
+    If the client disconnects, the generator is closed and the upstream stream aborted.
+    """
+    bind_user(http_request, user_id=request.user_id)
+    if request.mode is not None and request.mode not in AGENT_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {AGENT_MODES}")
+    events = stream_agentic_response(request.user_input, mode=request.mode)
+
+    # Pull the first event before answering so routing/backpressure errors keep their status code
+    try:
+        first = await anext(events)
+    except ServiceUnavailableError as e:
+        await events.aclose()
+        raise overloaded(e)
     except Exception as e:
+        await events.aclose()
         raise HTTPException(status_code=500, detail=str(e))
 
+    async def event_source():
+        async with aclosing(events):
+            yield sse(*first)
+            try:
+                async for event, data in events:
+                    if await http_request.is_disconnected():
+                        break
+                    yield sse(event, data)
+            except Exception as e:
+                yield sse("error", {"detail": str(e)})
 
-# ✅ Local dev entry
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/ai/cache/stats")
+async def get_cache_stats():
+    """Hit/miss/eviction counters of the recommendation cache."""
+    return {
+        "success": True,
+        "cache": recommendation_cache.stats(),
+        "context_cache": context_cache.stats(),
+        "chat_cache": chat_cache.stats(),
+        "single_flight": recommendation_flight.stats(),
+        "room_state": room_states.stats(),
+        "trends": trend_store.stats(),
+        "prompt": serializer_stats.stats(),
+        "scheduler": recommendation_scheduler.stats(),
+        "resilience": {route: policy.stats() for route, policy in gemini_client.policies.items()},
+    }
+
+
+@app.get("/ai/agent/stats")
+async def get_agent_stats():
+    """How often the local intent router decided vs. fell back to Gemini."""
+    return {"success": True, "router": classifier_stats(), "modes": agent_mode_stats()}
+
+
+@app.get("/ai/quota/stats")
+async def get_quota_stats():
+    """Rate-limit decisions and token spend per model and heaviest users."""
+    return {"success": True, "quota": quota.stats()}
+
+
+@app.get("/health/live")
+async def liveness():
+    """The worker's event loop is responsive."""
+    return {"status": "alive", "pid": os.getpid()}
+
+
+@app.get("/health/ready")
+async def readiness():
+    """Ready for traffic only once warm-up has finished; 503 before that and while shutting down."""
+    body = {"status": "ready" if service_state["ready"] else "starting", "pid": os.getpid(), **service_state}
+    return FastJSONResponse(body, status_code=200 if service_state["ready"] else 503)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus text exposition of stage timings, tokens, caches and errors."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# ✅ Local dev entry (production: python serve.py --workers N)
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(app, host="0.0.0.0", port=5000)
@@ -0,0 +1,53 @@
+# python_services/bench_agent_modes.py
+"""
+Compare the agent routing modes on a held-out labeled set.
+
+    python bench_agent_modes.py [limit]
+
+Runs every example of intent_eval.jsonl (none of them are in the classifier's
+training data, intent_examples.jsonl) through each mode of get_agentic_response
+and reports route accuracy and p50/p95 latency. The chat cache is cleared
+before each mode so no mode is served answers another one paid for.
+Calls go to whichever Gemini backend is configured, so this spends quota.
+"""
+import os
+import sys
+import time
+import asyncio
+
+from agent_client import AGENT_MODES, get_agentic_response
+from intent_classifier import load_examples
+from semantic_cache import chat_cache
+
+EVAL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_eval.jsonl")
+
+
+async def evaluate(mode: str, examples: list) -> dict:
+    correct = 0
+    latencies = []
+    for text, label in examples:
+        started = time.perf_counter()
+        result = await get_agentic_response(text, mode=mode)
+        latencies.append((time.perf_counter() - started) * 1000)
+        correct += result["type"] == ("recommendation" if label == "recommendation" else "chat")
+
+    latencies.sort()
+    return {
+        "accuracy": correct / len(examples),
+        "p50_ms": latencies[len(latencies) // 2],
+        "p95_ms": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))],
+    }
+
+
+async def main(limit: int | None):
+    examples = load_examples(EVAL_PATH)
+    examples = examples[:limit] if limit else examples
+    for mode in AGENT_MODES:
+        chat_cache.clear()
+        report = await evaluate(mode, examples)
+        print(f"{mode:>12}: accuracy {report['accuracy']:.1%}  "
+              f"p50 {report['p50_ms']:.0f} ms  p95 {report['p95_ms']:.0f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else None))
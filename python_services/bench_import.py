@@ -0,0 +1,57 @@
+# python_services/bench_import.py
+"""
+Benchmark: import time of the AI service modules, each in a fresh interpreter.
+
+    python bench_import.py [repeats]
+
+Shows whether importing a module pulls in the genai SDK. The last rows time
+`import google.genai` on its own (what every import used to pay) and the first
+get_client() call, where that cost is now paid (at worker startup, in the lifespan).
+"""
+import os
+import sys
+import subprocess
+from statistics import median
+
+MODULES = ["gemini_client", "context_cache", "ai_client", "agent_client", "recommendation_service", "app"]
+
+SNIPPET = """
+import sys, time
+started = time.perf_counter()
+{code}
+print(time.perf_counter() - started, "google.genai" in sys.modules)
+"""
+
+
+def measure(code: str, repeats: int, env: dict):
+    timings, loaded = [], False
+    for _ in range(repeats):
+        out = subprocess.run(
+            [sys.executable, "-c", SNIPPET.format(code=code)],
+            capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        if out.returncode != 0:
+            raise RuntimeError(out.stderr.strip().splitlines()[-1])
+        seconds, genai = out.stdout.split()
+        timings.append(float(seconds))
+        loaded = genai == "True"
+    return median(timings), loaded
+
+
+if __name__ == "__main__":
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    # No API key: importing must work offline
+    env = {k: v for k, v in os.environ.items() if k != "GEMINI_API_KEY"}
+    env.setdefault("GEMINI_BACKEND", "gemini")
+
+    rows = [(f"import {name}", f"import {name}") for name in MODULES]
+    rows += [
+        ("import google.genai", "import google.genai"),
+        ("first get_client() (gemini)",
+         "import os; os.environ['GEMINI_API_KEY'] = 'bench'\n"
+         "import gemini_client; started = time.perf_counter(); gemini_client.get_client()"),
+    ]
+    print(f"{'':<30} {'median ms':>10}  genai loaded")
+    for label, code in rows:
+        seconds, loaded = measure(code, repeats, env)
+        print(f"{label:<30} {seconds * 1e3:10.1f}  {'yes' if loaded else 'no'}")
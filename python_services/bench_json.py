@@ -0,0 +1,103 @@
+# python_services/bench_json.py
+"""
+Micro-benchmark: JSON work on the recommendation response path.
+
+    python bench_json.py [iterations]
+
+- parse: json.loads + model_validate vs model_validate_json on the cached schema
+  (one answer and a packed batch of 5),
+- render: JSONResponse (stdlib json) vs FastJSONResponse for a /ai/recommend result,
+- extract: the old regex extractor (prompts/app.py) vs extract_json on malformed
+  LLM output; "fail" means no (or the wrong) object was recovered.
+"""
+import re
+import sys
+import json
+import timeit
+
+from fastapi.responses import JSONResponse
+
+from fast_json import FastJSONResponse, extract_json, orjson
+from schemas import appliance_list_adapter, create_appliance_schema
+
+APPLIANCES = {"AC": True, "CEILING_FAN": True, "EXHAUST_FAN": True, "WINDOW": True, "DOOR": True}
+ANSWER = {
+    "reason": "CO2 is 1340 ppm and rising with 3 occupants; outdoor PM2.5 is low, so open the window "
+              "and run the exhaust fan while the AC keeps the room at a comfortable 25°C.",
+    "RECHECK_AT": 15,
+    "AC_MODE": "COOL",
+    "AC_TEMPERATURE": 25,
+    "CEILING_FAN": 2,
+    "WINDOW": "OPEN",
+    "DOOR": "CLOSED",
+    "EXHAUST_FAN": "ON",
+}
+ANSWER_TEXT = json.dumps(ANSWER, ensure_ascii=False)
+BATCH_TEXT = json.dumps([ANSWER] * 5, ensure_ascii=False)
+RESULT = {"success": True, "recommendation": ANSWER, "source": "ai"}
+
+MALFORMED = {
+    "fenced": f"```json\n{json.dumps(ANSWER, indent=2, ensure_ascii=False)}\n```",
+    "prose": f"Sure! Based on the readings, here is my advice:\n{ANSWER_TEXT}\nLet me know if {{anything}} changes.",
+    "nested": 'Result: {"recommendation": ' + ANSWER_TEXT + ', "confidence": {"level": "high"}}',
+    "truncated": ANSWER_TEXT[: len(ANSWER_TEXT) - 25],
+    "unclosed": "{ " * 2000 + "no json here",
+}
+
+
+def extract_first_json(text: str):
+    """Regex fallback used by prompts/app.py."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        match = re.search(r'\{.*?\}', text, flags=re.DOTALL)
+        if match:
+            return json.loads(match.group())
+        raise ValueError("No JSON content found")
+
+
+def per_call(fn, iterations: int) -> float:
+    return min(timeit.repeat(fn, number=iterations, repeat=3)) / iterations * 1e6
+
+
+def recovered(extract, name: str, text: str) -> bool:
+    try:
+        data = extract(text)
+    except ValueError:
+        return False
+    if name == "truncated":
+        return isinstance(data, dict) and data.get("RECHECK_AT") == ANSWER["RECHECK_AT"]
+    if name == "nested":
+        return isinstance(data, dict) and data.get("recommendation") == ANSWER
+    return data == ANSWER
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    model = create_appliance_schema(APPLIANCES)
+    adapter = appliance_list_adapter(APPLIANCES)
+    print(f"orjson: {'yes' if orjson is not None else 'no (stdlib fallback)'}")
+
+    print("\nparse + validate")
+    cases = [
+        ("answer  loads+validate", lambda: model.model_validate(json.loads(ANSWER_TEXT))),
+        ("answer  validate_json", lambda: model.model_validate_json(ANSWER_TEXT)),
+        ("batch5  loads+validate", lambda: adapter.validate_python(json.loads(BATCH_TEXT))),
+        ("batch5  validate_json", lambda: adapter.validate_json(BATCH_TEXT)),
+    ]
+    for name, fn in cases:
+        print(f"  {name:<24} {per_call(fn, iterations):8.2f} µs")
+
+    print("\nrender /ai/recommend result")
+    for name, response_class in (("JSONResponse", JSONResponse), ("FastJSONResponse", FastJSONResponse)):
+        fn = lambda: response_class(RESULT)  # noqa: E731
+        print(f"  {name:<24} {per_call(fn, iterations):8.2f} µs")
+
+    print("\nextract from malformed output")
+    for name, text in MALFORMED.items():
+        row = []
+        for label, extract in (("regex", extract_first_json), ("extract_json", extract_json)):
+            fn = lambda: recovered(extract, name, text)  # noqa: E731
+            status = "ok  " if fn() else "fail"
+            row.append(f"{label} {status} {per_call(fn, max(1, iterations // 50)):9.2f} µs")
+        print(f"  {name:<10} " + "   ".join(row))
@@ -0,0 +1,250 @@
+# python_services/bench_load.py
+"""
+Offline load test for the AI service against the fake Gemini backend.
+
+    python bench_load.py --route recommend --rps 50 --duration 20 \
+        --latency lognormal:0.8,0.4 --error-rate 0.01 --out bench_results.json
+
+The FastAPI app runs in-process (ASGI transport, no sockets) with
+GEMINI_BACKEND=fake, so no quota is spent. Requests are sent open-loop at the
+target rate and latency is measured from each request's scheduled start, so a
+backed-up server shows up as latency instead of silently lowering the rate.
+Each run is appended to the --out JSON file so runs can be compared over time.
+
+With --record FILE the run goes to the real Gemini API (GEMINI_RECORD_BACKEND)
+and every call is recorded; --replay FILE reruns the same seeded traffic from
+that recording, with the original upstream timings or --replay-timing fast.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+from datetime import datetime, timezone
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--route", choices=["recommend", "agent", "mixed"], default="mixed")
+    parser.add_argument("--rps", type=float, default=20, help="target requests per second")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of load")
+    parser.add_argument("--latency", default="lognormal:0.8,0.4", help="fake Gemini latency spec")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fake Gemini 503 probability")
+    parser.add_argument("--unique", type=float, default=1.0,
+                        help="fraction of recommend payloads with fresh readings (rest repeat, hitting caches)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", default=None, help="append results to this JSON file")
+    parser.add_argument("--record", default=None, metavar="FILE", help="record real Gemini calls to this store")
+    parser.add_argument("--replay", default=None, metavar="FILE", help="answer from a recorded store")
+    parser.add_argument("--replay-timing", choices=["original", "fast"], default="original")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args):
+    """Must run before the app is imported: select the Gemini backend and its behaviour."""
+    # Every request comes from this host: per-user and model buckets would throttle the load itself
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+    if args.replay or args.record:
+        os.environ["GEMINI_BACKEND"] = "replay" if args.replay else "record"
+        os.environ["GEMINI_REPLAY_FILE"] = args.replay or args.record
+        os.environ["GEMINI_REPLAY_TIMING"] = args.replay_timing
+        # Cached-content handles go through the recorded client so request keys line up
+        os.environ.setdefault("GEMINI_CONTEXT_CACHE", "gemini")
+        return
+    os.environ["GEMINI_BACKEND"] = "fake"
+    os.environ["FAKE_GEMINI_LATENCY"] = args.latency
+    os.environ["FAKE_GEMINI_ERROR_RATE"] = str(args.error_rate)
+    os.environ.setdefault("GEMINI_CONTEXT_CACHE", "stub")
+
+
+# ----------------------------
+# 🧪 Payloads
+# ----------------------------
+USER = {"_id": "bench-user", "name": "bench", "age": 30, "gender": "female", "ethnicity": "indian",
+        "health_issues": ["asthma"],
+        "questionnaire": [{"question": "How comfortable do you currently feel in your environment?", "answer": 3}]}
+
+
+def recommend_payload(rng: random.Random, fresh: bool, index: int) -> dict:
+    # Borderline readings (26–30 °C, moderate CO2) so the rule fast path rarely decides
+    temperature = round(rng.uniform(26.5, 29.5), 2) if fresh else 28.0
+    co2 = rng.randint(900, 1400) if fresh else 1100
+    return {
+        "user": USER,
+        "room": {"_id": f"room-{index if fresh else 0}", "room_name": "Hall", "room_length": 5,
+                 "room_width": 4, "room_height": 3, "occupancy": 2,
+                 "appliances": ["AC", "Ceiling Fan", "Window", "Door"]},
+        "indoor": {"activityData": {"data": {"temperature": temperature, "humidity": 60, "co2": co2,
+                                              "pm2_5": 30, "pm10": 40, "voc": 1.2}}},
+        "outdoor": {"activityData": {"pm2_5": 40, "temperature_2m": 31}},
+    }
+
+
+def agent_payload(rng: random.Random, messages: list) -> dict:
+    return {"user_input": rng.choice(messages)}
+
+
+# ----------------------------
+# 📈 Measurement
+# ----------------------------
+def percentile(ordered: list, q: float):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def sample_saturation(stop: asyncio.Event, samples: list, interval: float = 0.05):
+    """Threadpool tokens in use, route limiter queues and event-loop lag."""
+    import anyio.to_thread
+    import gemini_client
+
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append({
+            "threads_busy": limiter.borrowed_tokens,
+            "threads_total": limiter.total_tokens,
+            "loop_lag_ms": (time.perf_counter() - started - interval) * 1000,
+            **{f"{route}_waiting": lim.waiting for route, lim in gemini_client.limiters.items()},
+            **{f"{route}_in_flight": lim.in_flight for route, lim in gemini_client.limiters.items()},
+        })
+
+
+async def run(args) -> dict:
+    import httpx
+    import app as service
+    from intent_classifier import load_examples
+
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+    messages = [text for text, _label in load_examples()]
+    total = int(args.rps * args.duration)
+    results = []
+
+    async with service.lifespan(service.app):
+        transport = httpx.ASGITransport(app=service.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+
+            async def one(index: int, scheduled: float):
+                route = args.route
+                if route == "mixed":
+                    route = "recommend" if index % 2 == 0 else "agent"
+                if route == "recommend":
+                    path, payload = "/ai/recommend", recommend_payload(rng, rng.random() < args.unique, index)
+                else:
+                    path, payload = "/ai/agent", agent_payload(rng, messages)
+                try:
+                    response = await client.post(path, json=payload)
+                    status = response.status_code
+                    source = None
+                    if status == 200:
+                        body = response.json()
+                        if route == "agent":  # {"success", "result": {"type", "message", "source"?}}
+                            body = body["result"]
+                            source = body.get("source") or body["type"]
+                        else:
+                            source = body.get("source")
+                except Exception as e:
+                    status, source = type(e).__name__, None
+                results.append({
+                    "route": route,
+                    "status": status,
+                    "source": source,
+                    "latency_ms": (time.perf_counter() - scheduled) * 1000,
+                })
+
+            stop = asyncio.Event()
+            samples = []
+            sampler = asyncio.create_task(sample_saturation(stop, samples))
+
+            started = time.perf_counter()
+            tasks = []
+            for index in range(total):
+                scheduled = started + index / args.rps
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(one(index, scheduled)))
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - started
+
+            stop.set()
+            await sampler
+        client = service.gemini_client.get_client()
+        replay = client.stats() if hasattr(client, "stats") else None
+
+    report = summarize(args, results, samples, elapsed)
+    if replay is not None:
+        report["replay"] = replay
+    return report
+
+
+def summarize(args, results: list, samples: list, elapsed: float) -> dict:
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {
+            "route": args.route, "rps": args.rps, "duration": args.duration,
+            "latency": args.latency, "error_rate": args.error_rate, "unique": args.unique,
+            "backend": os.environ["GEMINI_BACKEND"],
+        },
+        "elapsed_s": round(elapsed, 3),
+        "requests": len(results),
+        "throughput_rps": round(len(results) / elapsed, 2) if elapsed else 0,
+        "routes": {},
+        "saturation": {
+            "threads_busy_max": max((s["threads_busy"] for s in samples), default=0),
+            "threads_total": samples[0]["threads_total"] if samples else None,
+            "loop_lag_ms_p99": percentile(sorted(s["loop_lag_ms"] for s in samples), 0.99),
+        },
+    }
+    for key in ("recommend_waiting", "agent_waiting", "recommend_in_flight", "agent_in_flight"):
+        report["saturation"][f"{key}_max"] = max((s[key] for s in samples), default=0)
+
+    for route in sorted({r["route"] for r in results}):
+        rows = [r for r in results if r["route"] == route]
+        ok = sorted(r["latency_ms"] for r in rows if r["status"] == 200)
+        statuses, sources = {}, {}
+        for r in rows:
+            statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+            if r["source"]:
+                sources[r["source"]] = sources.get(r["source"], 0) + 1
+        report["routes"][route] = {
+            "requests": len(rows),
+            "ok": len(ok),
+            "p50_ms": percentile(ok, 0.50),
+            "p95_ms": percentile(ok, 0.95),
+            "p99_ms": percentile(ok, 0.99),
+            "max_ms": ok[-1] if ok else None,
+            "statuses": statuses,
+            "sources": sources,
+        }
+    return report
+
+
+def append_results(path: str, report: dict):
+    runs = []
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            runs = json.load(f)
+    runs.append(report)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(runs, f, indent=2)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_environment(args)
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    if args.out:
+        append_results(args.out, report)
+    return report
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
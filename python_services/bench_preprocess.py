@@ -0,0 +1,92 @@
+# python_services/bench_preprocess.py
+"""
+Benchmark: per-document cost of preprocessing raw sensor documents.
+
+    python bench_preprocess.py [sizes...]      (default: 10000 100000)
+
+"scalar" runs extract_* once per document and then builds the same NumPy
+columns from the resulting dicts; "bulk" uses the bulk_* struct-of-arrays path.
+"""
+import sys
+import time
+import random
+
+import numpy as np
+
+from data_samples import (
+    INDOOR_FIELDS,
+    OUTDOOR_ACTIVITY_FIELDS,
+    OUTDOOR_META_FIELDS,
+    bulk_appliances,
+    bulk_indoor_pollutants,
+    bulk_outdoor_pollutants,
+    extract_appliances,
+    extract_indoor_pollutants,
+    extract_outdoor_pollutants,
+)
+
+APPLIANCE_NAMES = ["AC", "Ceiling Fan", "ceiling_fan", "Exhaust Fan", "Window", "Door", "Heater"]
+
+
+def make_documents(n: int, seed: int = 7):
+    rng = random.Random(seed)
+
+    def maybe(value):
+        return None if rng.random() < 0.05 else value  # some sensors drop readings
+
+    indoor = [
+        {"activityData": {"data": {f: maybe(round(rng.uniform(0, 100), 2)) for f in INDOOR_FIELDS}},
+         "timestamp": "2025-10-27 18:41:27"}
+        for _ in range(n)
+    ]
+    outdoor = [
+        {"activityData": {f: maybe(round(rng.uniform(0, 100), 2)) for f in OUTDOOR_ACTIVITY_FIELDS},
+         "metaData": {f: maybe(rng.randint(0, 50)) for f in OUTDOOR_META_FIELDS},
+         "timestamp": "2025-10-28 12:32:00"}
+        for _ in range(n)
+    ]
+    rooms = [{"appliances": rng.sample(APPLIANCE_NAMES, rng.randint(1, 5))} for _ in range(n)]
+    return indoor, outdoor, rooms
+
+
+def to_columns(rows: list) -> dict:
+    fields = [f for f in rows[0] if f != "timestamp"]
+    return {f: np.array([np.nan if r[f] is None else r[f] for r in rows], dtype=np.float64) for f in fields}
+
+
+def scalar(indoor, outdoor, rooms):
+    indoor_cols = to_columns([extract_indoor_pollutants(d) for d in indoor])
+    outdoor_cols = to_columns([extract_outdoor_pollutants(d) for d in outdoor])
+    appliance_rows = [extract_appliances(r) for r in rooms]
+    appliance_cols = {k: np.array([row[k] for row in appliance_rows]) for k in appliance_rows[0]}
+    return indoor_cols, outdoor_cols, appliance_cols
+
+
+def bulk(indoor, outdoor, rooms):
+    return bulk_indoor_pollutants(indoor), bulk_outdoor_pollutants(outdoor), bulk_appliances(rooms)
+
+
+def best_of(fn, docs, repeat: int = 3) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(*docs)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10_000, 100_000]
+
+    for n in sizes:
+        docs = make_documents(n)
+
+        # Both paths must agree before timing them
+        expected, actual = scalar(*docs), bulk(*docs)
+        for left, right in zip(expected, actual):
+            for field, column in left.items():
+                np.testing.assert_array_equal(column, right[field])
+
+        before, after = best_of(scalar, docs), best_of(bulk, docs)
+        print(f"{n:>7} docs  scalar {before / n * 1e6:6.2f} µs/doc   "
+              f"bulk {after / n * 1e6:6.2f} µs/doc   ({before / after:.1f}x)")
@@ -0,0 +1,42 @@
+# python_services/bench_schemas.py
+"""
+Micro-benchmark: per-request cost of building the appliance schema.
+
+    python bench_schemas.py [iterations]
+
+"before" rebuilds the Pydantic model and its JSON schema on every request
+(the old create_model-per-call behaviour); "after" uses the memoized registry.
+"""
+import sys
+import timeit
+
+from schemas import (
+    _build_appliance_schema,
+    appliance_signature,
+    appliance_json_schema,
+    create_appliance_schema,
+    prebuild_schemas,
+)
+
+APPLIANCES = {"AC": True, "CEILING_FAN": True, "EXHAUST_FAN": False, "WINDOW": True, "DOOR": True}
+
+
+def before():
+    model = _build_appliance_schema.__wrapped__(appliance_signature(APPLIANCES))
+    return model.model_json_schema()
+
+
+def after():
+    create_appliance_schema(APPLIANCES)
+    return appliance_json_schema(APPLIANCES)
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    startup = timeit.timeit(prebuild_schemas, number=1)
+    print(f"prebuild all 32 combinations: {startup * 1e3:.1f} ms (once at startup)")
+
+    for name, fn in (("before", before), ("after", after)):
+        seconds = timeit.timeit(fn, number=iterations)
+        print(f"{name:>6}: {seconds / iterations * 1e6:10.2f} µs/request")
@@ -0,0 +1,241 @@
+# python_services/context_cache.py
+"""
+Gemini explicit context caching for static instruction blocks.
+
+The static prefix shared by all our prompts (prompt_builder.STATIC_PREFIX:
+recommendation, chat and routing instructions in one block) is uploaded once
+as cached content and referenced by handle, so each call only sends the
+dynamic part.
+Handles are refreshed before their TTL runs out; when caching is unavailable
+(disabled, too few tokens, API error) calls fall back to the full prompt.
+Blocks below GEMINI_CONTEXT_CACHE_MIN_TOKENS (Gemini's minimum for cached
+content) are always sent inline, without trying to create a handle.
+
+GEMINI_CONTEXT_CACHE selects the backend: "gemini" (default), "stub" (in-memory,
+no network, for local testing) or "off".
+"""
+import os
+import sys
+import time
+import asyncio
+import hashlib
+import itertools
+
+from gemini_client import MODEL, get_client, generate, generate_stream
+from prompt_serializer import estimate_tokens
+
+CACHE_TTL_SECONDS = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", 3600))
+REFRESH_MARGIN_SECONDS = int(os.getenv("GEMINI_CONTEXT_CACHE_REFRESH_MARGIN", 300))
+# After a failed create we send full prompts for a while instead of retrying every call
+FAILURE_BACKOFF_SECONDS = int(os.getenv("GEMINI_CONTEXT_CACHE_BACKOFF", 600))
+# Gemini rejects cached content smaller than this; estimated with estimate_tokens
+MIN_CACHE_TOKENS = int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_TOKENS", 1024))
+CACHE_ERROR_STATUS = {400, 403, 404}
+
+
+def is_cache_error(error: BaseException) -> bool:
+    """A rejected, expired or evicted cached-content handle, as opposed to a general upstream failure."""
+    genai_errors = sys.modules.get("google.genai.errors")
+    if genai_errors is None or not isinstance(error, genai_errors.ClientError):
+        return False
+    return error.code in CACHE_ERROR_STATUS and "cache" in str(error).lower()
+
+
+# ----------------------------
+# 🔌 Backends
+# ----------------------------
+class GeminiCacheBackend:
+    """Cached-content handles stored by the Gemini API."""
+
+    async def create(self, model: str, text: str, ttl_seconds: int) -> str:
+        from google.genai import types
+
+        cached = await get_client().aio.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                system_instruction=text,
+                ttl=f"{ttl_seconds}s",
+                display_name="indoor-comfort-static-prompt",
+            ),
+        )
+        return cached.name
+
+    async def refresh(self, name: str, ttl_seconds: int):
+        from google.genai import types
+
+        await get_client().aio.caches.update(
+            name=name,
+            config=types.UpdateCachedContentConfig(ttl=f"{ttl_seconds}s"),
+        )
+
+    async def delete(self, name: str):
+        await get_client().aio.caches.delete(name=name)
+
+
+class StubCacheBackend:
+    """In-memory stand-in with the same lifecycle, for offline tests."""
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self.contents = {}   # name -> (model, text)
+        self.expires = {}    # name -> unix time
+        self.created = 0
+        self.refreshed = 0
+
+    async def create(self, model: str, text: str, ttl_seconds: int) -> str:
+        name = f"cachedContents/stub-{next(self._ids)}"
+        self.contents[name] = (model, text)
+        self.expires[name] = time.time() + ttl_seconds
+        self.created += 1
+        return name
+
+    async def refresh(self, name: str, ttl_seconds: int):
+        if name not in self.contents or self.expires[name] <= time.time():
+            raise KeyError(f"{name} not found")
+        self.expires[name] = time.time() + ttl_seconds
+        self.refreshed += 1
+
+    async def delete(self, name: str):
+        self.contents.pop(name, None)
+        self.expires.pop(name, None)
+
+    def resolve(self, name: str) -> str | None:
+        """Return the cached text (lets a fake model rebuild the full prompt)."""
+        entry = self.contents.get(name)
+        return entry[1] if entry else None
+
+
+# ----------------------------
+# 🗂️ Handle manager
+# ----------------------------
+class ContextCacheManager:
+    """Maps static text → live cached-content handle, refreshing before expiry."""
+
+    def __init__(self, backend, ttl_seconds: int = CACHE_TTL_SECONDS,
+                 refresh_margin: int = REFRESH_MARGIN_SECONDS,
+                 failure_backoff: int = FAILURE_BACKOFF_SECONDS,
+                 min_tokens: int = MIN_CACHE_TOKENS):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin = refresh_margin
+        self.failure_backoff = failure_backoff
+        self.min_tokens = min_tokens
+        self._handles = {}        # key -> (name, expires_at)
+        self._failed_until = {}   # key -> unix time
+        self._locks = {}
+        self.hits = 0
+        self.creates = 0
+        self.refreshes = 0
+        self.fallbacks = 0
+        self.too_small = 0
+
+    @staticmethod
+    def key_for(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\n{text}".encode("utf-8")).hexdigest()
+
+    async def handle_for(self, text: str, model: str = MODEL) -> str | None:
+        """Return a usable handle for `text`, or None when the caller should send the full prompt."""
+        if self.backend is None:
+            return None
+        if estimate_tokens(text) < self.min_tokens:
+            self.too_small += 1
+            return None
+
+        key = self.key_for(model, text)
+        now = time.time()
+        handle = self._handles.get(key)
+        if handle and handle[1] - self.refresh_margin > now:
+            self.hits += 1
+            return handle[0]
+        if self._failed_until.get(key, 0) > now:
+            self.fallbacks += 1
+            return None
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            handle = self._handles.get(key)
+            now = time.time()
+            if handle and handle[1] - self.refresh_margin > now:
+                self.hits += 1
+                return handle[0]
+            try:
+                if handle and handle[1] > now:
+                    await self.backend.refresh(handle[0], self.ttl_seconds)
+                    self.refreshes += 1
+                    name = handle[0]
+                else:
+                    name = await self.backend.create(model, text, self.ttl_seconds)
+                    self.creates += 1
+            except Exception as e:
+                if handle:
+                    # Refresh failed: drop the handle and try a fresh create next time
+                    self._handles.pop(key, None)
+                else:
+                    print("Context cache unavailable:", e)
+                    self._failed_until[key] = now + self.failure_backoff
+                self.fallbacks += 1
+                return None
+
+            self._handles[key] = (name, time.time() + self.ttl_seconds)
+            return name
+
+    def invalidate(self, text: str, model: str = MODEL):
+        self._handles.pop(self.key_for(model, text), None)
+
+    def stats(self) -> dict:
+        return {
+            "handles": len(self._handles),
+            "hits": self.hits,
+            "creates": self.creates,
+            "refreshes": self.refreshes,
+            "fallbacks": self.fallbacks,
+            "too_small": self.too_small,
+            "min_tokens": self.min_tokens,
+        }
+
+
+def _make_backend(kind: str):
+    if kind == "off":
+        return None
+    if kind == "stub":
+        return StubCacheBackend()
+    return GeminiCacheBackend()
+
+
+context_cache = ContextCacheManager(_make_backend(os.getenv("GEMINI_CONTEXT_CACHE", "gemini").lower()))
+
+
+async def generate_with_static_prefix(route: str, static_text: str, dynamic_text: str, config=None):
+    """
+    generate() that sends `static_text` as cached content when possible and
+    only `dynamic_text` inline; falls back to the concatenated prompt otherwise.
+    """
+    name = await context_cache.handle_for(static_text)
+    if name:
+        cached_config = dict(config or {})
+        cached_config["cached_content"] = name
+        try:
+            return await generate(route, contents=dynamic_text, config=cached_config)
+        except Exception as e:
+            if not is_cache_error(e):
+                raise  # already retried by the route policy; a second full-prompt round would double it
+            # Handle expired or was evicted upstream: forget it and send the full prompt
+            print("Cached-content call failed, retrying without cache:", e)
+            context_cache.invalidate(static_text)
+            context_cache.fallbacks += 1
+
+    return await generate(route, contents=static_text + dynamic_text, config=config)
+
+
+async def stream_with_static_prefix(route: str, static_text: str, dynamic_text: str, config=None):
+    """Streaming counterpart of generate_with_static_prefix (no mid-stream retry)."""
+    name = await context_cache.handle_for(static_text)
+    if name:
+        cached_config = dict(config or {})
+        cached_config["cached_content"] = name
+        contents, config = dynamic_text, cached_config
+    else:
+        contents = static_text + dynamic_text
+
+    async for chunk in generate_stream(route, contents=contents, config=config):
+        yield chunk
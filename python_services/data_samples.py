@@ -115,7 +115,32 @@
 """
 Data preprocessing utilities for the Indoor Comfort AI system.
 Transforms raw MongoDB-style documents into normalized dictionaries.
+
+The bulk_* functions are the columnar path for batch and history workloads:
+they take lists of raw documents and return one float64 NumPy array per field
+(NaN where a reading is missing or non-numeric), which rules.evaluate_rules
+accepts directly.
 """
+from functools import lru_cache
+
+# Only the bulk_* helpers need NumPy; imported on their first call, not at startup
+np = None
+
+ALL_APPLIANCES = ("AC", "CEILING_FAN", "EXHAUST_FAN", "WINDOW", "DOOR")
+
+INDOOR_FIELDS = ("temperature", "humidity", "pressure", "pm1", "pm2_5", "pm10", "co", "voc", "co2")
+OUTDOOR_ACTIVITY_FIELDS = ("pm10", "pm2_5", "carbon_monoxide", "dust", "temperature_2m", "relative_humidity_2m")
+OUTDOOR_META_FIELDS = ("wind_speed_10m", "wind_direction_10m", "wind_gusts_10m", "rain", "precipitation", "is_day")
+
+# "ceiling fan" / "Ceiling_Fan" → "CEILING_FAN"; anything else maps to None
+_APPLIANCE_BY_NORMALIZED = {key.lower(): key for key in ALL_APPLIANCES}
+
+
+@lru_cache(maxsize=256)
+def normalize_appliance_name(name: str):
+    """Canonical appliance key for a free-text name from the room document."""
+    return _APPLIANCE_BY_NORMALIZED.get(name.lower().replace(" ", "_"))
+
 
 def extract_user_info(raw_user: dict) -> dict:
     """Extract user information in the expected format."""
@@ -154,16 +179,9 @@ def extract_appliances(raw_room: dict) -> dict:
     if not raw_room or "appliances" not in raw_room:
         return {}
     
-    appliance_list = raw_room.get("appliances", [])
-    normalized = {}
-    all_possible = ["AC", "CEILING_FAN", "EXHAUST_FAN", "WINDOW", "DOOR"]
-    
-    for appliance in all_possible:
-        # Check if a close match exists (case-insensitive, with spaces removed)
-        found = any(a.lower().replace(" ", "_") == appliance.lower() for a in appliance_list)
-        normalized[appliance] = found
-    
-    return normalized
+    # Case-insensitive match with spaces treated as underscores, one lookup per listed name
+    found = {normalize_appliance_name(a) for a in raw_room.get("appliances", [])}
+    return {appliance: appliance in found for appliance in ALL_APPLIANCES}
 
 
 def extract_indoor_pollutants(raw_indoor: dict) -> dict:
@@ -221,3 +239,65 @@ def prepare_environment_data(user, room, indoor, outdoor):
     outdoor_pollutants = extract_outdoor_pollutants(outdoor)
     
     return room_info, appliances, user_info, indoor_pollutants, outdoor_pollutants
+
+
+# ----------------------------
+# 📦 Bulk (columnar) preprocessing
+# ----------------------------
+def _require_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("NumPy is required for bulk preprocessing (pip install numpy)") from None
+        np = numpy
+
+
+def _column(rows: list, field: str):
+    """float64 column of one field; None, strings and booleans become NaN."""
+    nan = float("nan")
+    return np.fromiter(
+        (v if type(v) is float or type(v) is int else nan for v in (row.get(field) for row in rows)),
+        dtype=np.float64,
+        count=len(rows),
+    )
+
+
+def bulk_indoor_pollutants(raw_indoor_docs: list) -> dict:
+    """Struct-of-arrays form of extract_indoor_pollutants for many documents."""
+    _require_numpy()
+    rows = []
+    for doc in raw_indoor_docs:
+        doc = doc or {}
+        activity = doc.get("activityData", doc)
+        rows.append(activity.get("data", activity))
+
+    columns = {field: _column(rows, field) for field in INDOOR_FIELDS}
+    columns["timestamp"] = np.array([(doc or {}).get("timestamp") for doc in raw_indoor_docs], dtype=object)
+    return columns
+
+
+def bulk_outdoor_pollutants(raw_outdoor_docs: list) -> dict:
+    """Struct-of-arrays form of extract_outdoor_pollutants for many documents."""
+    _require_numpy()
+    docs = [doc or {} for doc in raw_outdoor_docs]
+    activities = [doc.get("activityData", doc) for doc in docs]
+    metas = [doc.get("metaData", {}) for doc in docs]
+
+    columns = {field: _column(activities, field) for field in OUTDOOR_ACTIVITY_FIELDS}
+    columns.update({field: _column(metas, field) for field in OUTDOOR_META_FIELDS})
+    columns["timestamp"] = np.array([doc.get("timestamp") for doc in docs], dtype=object)
+    return columns
+
+
+def bulk_appliances(raw_rooms: list) -> dict:
+    """One boolean array per appliance key, aligned with `raw_rooms`."""
+    _require_numpy()
+    columns = {key: np.zeros(len(raw_rooms), dtype=bool) for key in ALL_APPLIANCES}
+    for i, room in enumerate(raw_rooms):
+        for name in (room or {}).get("appliances", ()):
+            key = normalize_appliance_name(name)
+            if key is not None:
+                columns[key][i] = True
+    return columns
@@ -0,0 +1,146 @@
+# python_services/fake_gemini.py
+"""
+Local Gemini stand-in for offline testing and benchmarking.
+
+Mimics the parts of genai.Client the service uses (aio.models.generate_content,
+aio.models.generate_content_stream, aio.caches, aio.aclose) with configurable
+latency and error rate, and answers structured requests with schema-valid JSON.
+
+Enable with GEMINI_BACKEND=fake. Tuning:
+    FAKE_GEMINI_LATENCY     "const:0.3" | "uniform:0.2,1.5" | "lognormal:0.8,0.5" (seconds)
+    FAKE_GEMINI_ERROR_RATE  probability of a 503 per call (default 0)
+"""
+import os
+import json
+import math
+import random
+import asyncio
+import itertools
+from types import SimpleNamespace
+
+
+def parse_latency(spec: str):
+    """Turn a latency spec string into a zero-argument sampler (seconds)."""
+    kind, _, args = (spec or "const:0").partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "const":
+        return lambda: values[0] if values else 0.0
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "lognormal":
+        median, sigma = values[0], values[1] if len(values) > 1 else 0.5
+        return lambda: random.lognormvariate(math.log(median), sigma)
+    raise ValueError(f"Unknown latency spec '{spec}'")
+
+
+def sample_from_schema(schema: dict, root: dict | None = None, count: int = 1):
+    """Smallest valid instance of a (Pydantic-generated) JSON schema."""
+    root = root or schema
+    if "$ref" in schema:
+        name = schema["$ref"].rsplit("/", 1)[-1]
+        return sample_from_schema(root.get("$defs", {})[name], root, count)
+    if "enum" in schema:
+        return schema["enum"][0]
+    if "anyOf" in schema:
+        return sample_from_schema(schema["anyOf"][0], root, count)
+
+    kind = schema.get("type")
+    if kind == "object":
+        return {key: sample_from_schema(sub, root) for key, sub in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [sample_from_schema(schema.get("items", {}), root) for _ in range(count)]
+    if kind == "integer":
+        low, high = schema.get("minimum", 5), schema.get("maximum", 15)
+        return (low + high) // 2
+    if kind == "number":
+        return float(schema.get("minimum", 0))
+    if kind == "boolean":
+        return False
+    return "Fake response generated offline."
+
+
+def _usage(prompt: str, text: str):
+    return SimpleNamespace(
+        prompt_token_count=len(prompt) // 4,
+        candidates_token_count=len(text) // 4,
+        cached_content_token_count=0,
+        total_token_count=(len(prompt) + len(text)) // 4,
+    )
+
+
+class _FakeModels:
+    def __init__(self, fake):
+        self._fake = fake
+
+    def _text_for(self, contents, config) -> str:
+        prompt = contents if isinstance(contents, str) else json.dumps(contents, default=str)
+        schema = (config or {}).get("response_json_schema") if isinstance(config, dict) else None
+        if schema:
+            return json.dumps(sample_from_schema(schema, count=max(1, prompt.count("==== ROOM "))))
+        if "REQUESTED TASK: ROUTE\n" in prompt:
+            return "CALL_NORMAL_CHAT"
+        return self._fake.chat_reply
+
+    async def generate_content(self, *, model, contents, config=None):
+        await self._fake.wait_and_maybe_fail()
+        text = self._text_for(contents, config)
+        return SimpleNamespace(text=text, usage_metadata=_usage(str(contents), text))
+
+    async def generate_content_stream(self, *, model, contents, config=None):
+        await self._fake.wait_and_maybe_fail()
+        text = self._text_for(contents, config)
+
+        async def chunks():
+            words = text.split(" ")
+            for i, word in enumerate(words):
+                if i:
+                    await asyncio.sleep(self._fake.chunk_delay)
+                yield SimpleNamespace(text=word if i == 0 else " " + word, usage_metadata=None)
+
+        return chunks()
+
+
+class _FakeCaches:
+    def __init__(self):
+        self._ids = itertools.count(1)
+
+    async def create(self, *, model, config=None):
+        return SimpleNamespace(name=f"cachedContents/fake-{next(self._ids)}")
+
+    async def update(self, *, name, config=None):
+        return SimpleNamespace(name=name)
+
+    async def delete(self, *, name):
+        return None
+
+
+class FakeGeminiClient:
+    """Drop-in for genai.Client in offline runs."""
+
+    def __init__(self, latency=None, error_rate: float | None = None, chunk_delay: float = 0.02,
+                 chat_reply: str = "Fresh air and moderate humidity keep you comfortable; ventilate when CO2 rises."):
+        self.latency = latency or parse_latency(os.getenv("FAKE_GEMINI_LATENCY", "const:0.3"))
+        self.error_rate = float(os.getenv("FAKE_GEMINI_ERROR_RATE", 0)) if error_rate is None else error_rate
+        self.chunk_delay = chunk_delay
+        self.chat_reply = chat_reply
+        self.calls = 0
+        self.failures = 0
+        self.aio = SimpleNamespace(
+            models=_FakeModels(self),
+            caches=_FakeCaches(),
+            aclose=self._aclose,
+        )
+
+    async def wait_and_maybe_fail(self):
+        self.calls += 1
+        await asyncio.sleep(max(0.0, self.latency()))
+        if self.error_rate and random.random() < self.error_rate:
+            self.failures += 1
+            from google.genai import errors as genai_errors  # real SDK error type, loaded on first failure
+
+            raise genai_errors.ServerError(
+                503, {"error": {"code": 503, "message": "Fake upstream overloaded", "status": "UNAVAILABLE"}}
+            )
+
+    async def _aclose(self):
+        return None
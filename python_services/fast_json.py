@@ -0,0 +1,131 @@
+# python_services/fast_json.py
+"""
+Fast JSON helpers for the response path.
+
+- `dumps`/`loads` use orjson when it is installed and fall back to the
+  standard library otherwise (same output shape, just slower).
+- `FastJSONResponse` renders with `dumps`; routes that return it directly
+  also skip FastAPI's jsonable_encoder pass.
+- `extract_json` pulls the first complete JSON object/array out of chatty or
+  truncated LLM output with a single linear scan over the structural characters
+  (no backtracking regex).
+"""
+import re
+import json
+
+from starlette.responses import JSONResponse  # what fastapi.responses re-exports, without importing FastAPI
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+
+if orjson is not None:
+    def dumps(value) -> bytes:
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+    loads = orjson.loads
+    JSONDecodeError = orjson.JSONDecodeError
+else:
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=str)
+
+    def dumps(value) -> bytes:
+        return _encoder.encode(value).encode("utf-8")
+
+    loads = json.loads
+    JSONDecodeError = json.JSONDecodeError
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson (or compact stdlib JSON as a fallback)."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+_CLOSERS = {"{": "}", "[": "]"}
+# Only these characters change the scanner state; everything else is skipped in C
+_STRUCTURAL = re.compile(r'[{}\[\]"\\]')
+# Parse attempts per outermost balanced value (itself plus values nested in it);
+# keeps deeply nested garbage linear instead of one parse per nesting level
+_MAX_NESTED_ATTEMPTS = 16
+
+
+def _first_parsable(text: str, span):
+    """
+    `span` is (start, end, nested spans). Returns the value of the first slice,
+    in document order, that parses: the span itself, else one nested in it.
+    """
+    pending = [span]
+    for _attempt in range(_MAX_NESTED_ATTEMPTS):
+        if not pending:
+            break
+        start, end, nested = pending.pop()
+        try:
+            return loads(text[start:end])
+        except (JSONDecodeError, ValueError):
+            pending.extend(reversed(nested))
+    return None
+
+
+def extract_json(text: str, repair: bool = True):
+    """
+    First JSON object or array embedded in `text` (markdown fences, prose
+    before/after, trailing commentary). With `repair`, output cut off mid-value
+    is closed with the missing quotes and brackets as a last resort.
+    Raises ValueError when nothing parseable is found.
+
+    One pass over the structural characters: every bracket pair that balances
+    is a candidate, tried outermost first and in document order.
+    """
+    if not isinstance(text, str):
+        raise ValueError("No JSON content found")
+    try:
+        return loads(text)
+    except (JSONDecodeError, ValueError):
+        pass
+
+    stack = []  # open brackets: (expected closer, start index, balanced spans closed inside it)
+    in_string = False
+    skip = -1   # index of a character escaped by a backslash
+    for match in _STRUCTURAL.finditer(text):
+        i = match.start()
+        if i == skip:
+            continue
+        ch = text[i]
+        if in_string:
+            if ch == "\\":
+                skip = i + 1
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = bool(stack)  # quotes in prose outside any bracket open no string
+        elif ch in _CLOSERS:
+            stack.append((_CLOSERS[ch], i, []))
+        elif (ch == "}" or ch == "]") and stack:
+            closer, start, nested = stack.pop()
+            if ch != closer:
+                # Mismatched bracket: no open bracket starts a JSON value, but values closed inside them may
+                for span in [span for _closer, _start, spans in stack for span in spans] + nested:
+                    value = _first_parsable(text, span)
+                    if value is not None:
+                        return value
+                stack.clear()
+                continue
+            span = (start, i + 1, nested)
+            if stack:
+                stack[-1][2].append(span)
+                continue
+            value = _first_parsable(text, span)
+            if value is not None:
+                return value
+
+    if stack and repair:
+        # Ran off the end: everything after the outermost open bracket is inside this value
+        missing = ('"' if in_string else "") + "".join(closer for closer, _start, _nested in reversed(stack))
+        try:
+            return loads(text[stack[0][1]:].rstrip().rstrip(",") + missing)
+        except (JSONDecodeError, ValueError):
+            pass
+    raise ValueError("No JSON content found")
@@ -0,0 +1,244 @@
+# python_services/gemini_client.py
+"""
+Shared async Gemini client for the Indoor Comfort AI service.
+Every route goes through one genai.Client (one connection pool) and the SDK's
+native async surface, so in-flight LLM calls no longer hold worker threads.
+Each route has its own limiter, so chat traffic cannot starve recommendations,
+and every call runs under the resilience policy (deadline, retry, hedging,
+circuit breaker).
+
+The client is created lazily by get_client() on first use (or during warm-up),
+so importing this module does not load the genai SDK or need an API key.
+GEMINI_BACKEND picks the backend: "gemini" (default), "fake" (offline
+stand-in), "record" or "replay" (see replay_gemini); register_backend() adds others.
+"""
+import os
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+
+import metrics
+from rate_limiter import quota
+from resilience import CircuitBreaker, ServiceUnavailableError, policy_from_env
+
+load_dotenv()
+
+BACKEND = os.getenv("GEMINI_BACKEND", "gemini").lower()
+MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+
+
+# ----------------------------
+# 🔌 Client backends (one process-wide client, built on first use)
+# ----------------------------
+def _gemini_backend():
+    from google import genai  # the SDK takes ~0.3 s to import; paid here, not at import time
+
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("Missing GEMINI_API_KEY in .env file")
+    return genai.Client(api_key=api_key)
+
+
+def _fake_backend():
+    from fake_gemini import FakeGeminiClient
+    return FakeGeminiClient()
+
+
+def _record_backend():
+    from replay_gemini import RecordingClient, ReplayStore
+    return RecordingClient(BACKENDS[os.getenv("GEMINI_RECORD_BACKEND", "gemini")](), ReplayStore())
+
+
+def _replay_backend():
+    from replay_gemini import ReplayClient, ReplayStore
+    return ReplayClient(ReplayStore())
+
+
+BACKENDS = {"gemini": _gemini_backend, "fake": _fake_backend, "record": _record_backend, "replay": _replay_backend}
+_client = None
+
+
+def register_backend(name: str, factory):
+    """Make `factory() -> client` selectable with GEMINI_BACKEND=name."""
+    BACKENDS[name] = factory
+
+
+def get_client():
+    """Single client shared by /ai/recommend and /ai/agent, created on first call."""
+    global _client
+    if _client is None:
+        factory = BACKENDS.get(BACKEND)
+        if factory is None:
+            raise ValueError(f"Unknown GEMINI_BACKEND '{BACKEND}' (expected one of {sorted(BACKENDS)})")
+        _client = factory()
+    return _client
+
+
+def set_client(client):
+    """Use `client` instead of the configured backend (None: rebuild lazily)."""
+    global _client
+    _client = client
+
+
+class QueueFullError(ServiceUnavailableError):
+    """Raised when a route already has too many calls waiting for a slot."""
+
+    def __init__(self, route: str, status_code: int = 503, retry_after: int = 1):
+        super().__init__(f"Too many pending AI requests for route '{route}'", status_code, retry_after)
+        self.route = route
+
+
+class RouteLimiter:
+    """
+    Bounded concurrency for one route: at most `max_concurrency` calls run at once
+    and at most `max_queue` wait for a slot. Anything beyond that is rejected
+    immediately instead of piling up behind a slow upstream.
+    """
+
+    def __init__(self, route: str, max_concurrency: int, max_queue: int, status_code: int = 503):
+        self.route = route
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.status_code = status_code
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(self.route, self.status_code)
+
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+# ----------------------------
+# ⚙️ Per-route limits (overridable from .env)
+# ----------------------------
+limiters = {
+    "recommend": RouteLimiter(
+        "recommend",
+        max_concurrency=_env_int("GEMINI_RECOMMEND_CONCURRENCY", 32),
+        max_queue=_env_int("GEMINI_RECOMMEND_QUEUE", 64),
+        status_code=_env_int("GEMINI_OVERLOAD_STATUS", 503),
+    ),
+    "agent": RouteLimiter(
+        "agent",
+        max_concurrency=_env_int("GEMINI_AGENT_CONCURRENCY", 16),
+        max_queue=_env_int("GEMINI_AGENT_QUEUE", 32),
+        status_code=_env_int("GEMINI_OVERLOAD_STATUS", 503),
+    ),
+}
+
+
+# ----------------------------
+# 🛡️ Resilience (one breaker for the shared upstream, per-route deadlines/retries)
+# ----------------------------
+breaker = CircuitBreaker(
+    failure_threshold=_env_int("GEMINI_BREAKER_FAILURES", 5),
+    reset_timeout=float(os.getenv("GEMINI_BREAKER_RESET", 30)),
+)
+
+policies = {
+    "recommend": policy_from_env("GEMINI_RECOMMEND", breaker),
+    "agent": policy_from_env("GEMINI_AGENT", breaker),
+}
+
+
+async def generate(route: str, contents, config=None, model: str = MODEL):
+    """
+    Run one generate_content call under the user/model quota, the route limiter
+    and the resilience policy of the given route.
+    """
+    estimate = await quota.acquire(model, contents)
+    try:
+        async with limiters[route].slot():
+            started = time.perf_counter()
+            try:
+                response = await policies[route].call(
+                    lambda: get_client().aio.models.generate_content(
+                        model=model,
+                        contents=contents,
+                        config=config,
+                    )
+                )
+            except Exception as e:
+                metrics.record_error(f"gemini:{route}", e)
+                raise
+    except BaseException:
+        await quota.refund(model, estimate)  # queue full, failed or cancelled: nothing was answered
+        raise
+    metrics.gemini_seconds.observe(time.perf_counter() - started, route)
+    metrics.record_usage(route, contents, response)
+    await quota.record(model, estimate, getattr(response, "usage_metadata", None))
+    return response
+
+
+async def generate_stream(route: str, contents, config=None, model: str = MODEL):
+    """
+    Streaming generate_content under the route limiter. Closing this generator
+    (e.g. because the HTTP client went away) closes the upstream stream too,
+    so abandoned responses stop consuming quota.
+    """
+    estimate = await quota.acquire(model, contents)
+    opened = False
+    try:
+        async with limiters[route].slot():
+            # Opening the stream gets deadline/retry/breaker; once tokens flow there is no retry
+            try:
+                stream = await policies[route].call(
+                    lambda: get_client().aio.models.generate_content_stream(
+                        model=model,
+                        contents=contents,
+                        config=config,
+                    )
+                )
+            except Exception as e:
+                metrics.record_error(f"gemini:{route}", e)
+                raise
+            opened = True
+            usage = None
+            try:
+                async for chunk in stream:
+                    usage = getattr(chunk, "usage_metadata", None) or usage
+                    yield chunk
+            finally:
+                await stream.aclose()
+                await quota.record(model, estimate, usage)
+    except BaseException:
+        if not opened:
+            await quota.refund(model, estimate)  # queue full or the stream never opened
+        raise
+
+
+async def aclose():
+    """Close the shared connection pool (called on app shutdown)."""
+    if _client is not None:
+        await _client.aio.aclose()
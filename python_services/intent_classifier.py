@@ -0,0 +1,161 @@
+# python_services/intent_classifier.py
+"""
+Local intent router for /ai/agent.
+
+Decides between CALL_NORMAL_CHAT and CALL_RECOMMENDATION in microseconds:
+1. a keyword/regex tier for unmistakable greetings and discomfort phrases,
+2. a TF-IDF char-n-gram logistic regression trained at startup from the
+   bundled intent_examples.jsonl.
+Only messages the model is unsure about go to the Gemini router.
+"""
+import os
+import re
+import json
+import math
+from collections import Counter
+
+CALL_NORMAL_CHAT = "CALL_NORMAL_CHAT"
+CALL_RECOMMENDATION = "CALL_RECOMMENDATION"
+
+EXAMPLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_examples.jsonl")
+CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", 0.75))
+
+# ----------------------------
+# 🔑 Keyword tier
+# ----------------------------
+GREETING_RE = re.compile(
+    r"^\s*(hi+|hello+|hey+|yo|good\s+(morning|afternoon|evening|night)|thanks?|thank\s+you|bye)\b[\s!.,?]*$",
+    re.IGNORECASE,
+)
+DISCOMFORT_RE = re.compile(
+    r"\b(i\s*('?m|am)\s+(feeling\s+)?((so|very|really|a\s+bit)\s+)?(sick|unwell|dizzy|nauseous|cold|hot|tired|sweating|shivering)"
+    r"|i\s+feel\s+((so|very|really|a\s+bit)\s+)?(sick|unwell|dizzy|nauseous|cold|hot|tired|weak|feverish|suffocat\w*)"
+    r"|head\s*ache|migraine|can'?t\s+breathe|short\s+of\s+breath|suffocat\w*|wheez\w*)",
+    re.IGNORECASE,
+)
+
+NGRAM_RANGE = (2, 4)
+
+
+def char_ngrams(text: str) -> Counter:
+    text = f" {' '.join(text.lower().split())} "
+    return Counter(
+        text[i:i + n]
+        for n in range(NGRAM_RANGE[0], NGRAM_RANGE[1] + 1)
+        for i in range(len(text) - n + 1)
+    )
+
+
+class IntentClassifier:
+    """TF-IDF weighted char n-grams + binary logistic regression (pure Python)."""
+
+    def __init__(self, examples, epochs: int = 100, learning_rate: float = 8.0, l2: float = 1e-4):
+        docs = [char_ngrams(text) for text, _label in examples]
+        targets = [1.0 if label == "recommendation" else 0.0 for _text, label in examples]
+
+        document_frequency = Counter()
+        for grams in docs:
+            document_frequency.update(grams.keys())
+        total = len(docs)
+        self.index = {g: i for i, g in enumerate(document_frequency)}
+        self.idf = [math.log((1 + total) / (1 + document_frequency[g])) + 1 for g in self.index]
+
+        vectors = [self._vectorize(grams) for grams in docs]
+        weights = [0.0] * len(self.index)
+        bias = 0.0
+
+        # Full-batch gradient descent: deterministic and fast on a few hundred examples
+        for _ in range(epochs):
+            gradient = [0.0] * len(weights)
+            bias_gradient = 0.0
+            for vector, target in zip(vectors, targets):
+                score = bias + sum(weights[i] * v for i, v in vector)
+                error = self._sigmoid(score) - target
+                bias_gradient += error
+                for i, v in vector:
+                    gradient[i] += error * v
+            for i, g in enumerate(gradient):
+                weights[i] -= learning_rate * (g / total + l2 * weights[i])
+            bias -= learning_rate * bias_gradient / total
+
+        self.weights = weights
+        self.bias = bias
+
+    def _vectorize(self, grams: Counter) -> list:
+        index, idf = self.index, self.idf
+        vector = []
+        for g, c in grams.items():
+            i = index.get(g)
+            if i is not None:
+                vector.append((i, (c if c == 1 else 1 + math.log(c)) * idf[i]))
+        norm = math.sqrt(sum(v * v for _i, v in vector)) or 1.0
+        return [(i, v / norm) for i, v in vector]
+
+    @staticmethod
+    def _sigmoid(x: float) -> float:
+        if x < -35:
+            return 0.0
+        return 1.0 / (1.0 + math.exp(-x))
+
+    def predict_proba(self, text: str) -> float:
+        """Probability that `text` needs a recommendation."""
+        weights = self.weights
+        score = self.bias + sum(weights[i] * v for i, v in self._vectorize(char_ngrams(text)))
+        return self._sigmoid(score)
+
+
+def load_examples(path: str = EXAMPLES_PATH) -> list:
+    with open(path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]  # blank lines (e.g. a trailing one) are fine
+    return [(row["text"], row["label"]) for row in rows]
+
+
+_model = None
+
+stats = {
+    "keyword": 0,
+    "model": 0,
+    "llm_fallback": 0,
+}
+
+
+def get_model() -> IntentClassifier:
+    global _model
+    if _model is None:
+        _model = IntentClassifier(load_examples())
+    return _model
+
+
+def classify_intent(user_input: str, threshold: float = CONFIDENCE_THRESHOLD):
+    """
+    Return (intent, confidence). `intent` is None when the local tiers are not
+    confident enough and the caller should fall back to the LLM router.
+    """
+    if GREETING_RE.match(user_input):
+        stats["keyword"] += 1
+        return CALL_NORMAL_CHAT, 1.0
+    if DISCOMFORT_RE.search(user_input):
+        stats["keyword"] += 1
+        return CALL_RECOMMENDATION, 1.0
+
+    probability = get_model().predict_proba(user_input)
+    intent = CALL_RECOMMENDATION if probability >= 0.5 else CALL_NORMAL_CHAT
+    confidence = max(probability, 1 - probability)
+    if confidence < threshold:
+        return None, confidence
+
+    stats["model"] += 1
+    return intent, confidence
+
+
+def record_llm_fallback():
+    stats["llm_fallback"] += 1
+
+
+def classifier_stats() -> dict:
+    decisions = sum(stats.values())
+    return {
+        **stats,
+        "fallback_rate": stats["llm_fallback"] / decisions if decisions else 0.0,
+        "threshold": CONFIDENCE_THRESHOLD,
+    }
@@ -0,0 +1,213 @@
+# python_services/metrics.py
+"""
+Minimal Prometheus-style metrics (text exposition format 0.0.4) without extra
+dependencies. Recording is a dict lookup plus a bisect, well under a
+microsecond, so stages can be timed on every request.
+
+The service runs on one event loop per process, so updates are not locked.
+"""
+import time
+from bisect import bisect_left
+
+# Seconds: from tens of microseconds (prompt building) up to slow Gemini calls
+LATENCY_BUCKETS = (0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Characters: prompt and response sizes
+SIZE_BUCKETS = (64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+_registry = []
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self.values = {}
+        _registry.append(self)
+
+    def inc(self, *label_values, amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for label_values, value in self.values.items():
+            yield f"{self.name}{_labels(self.labels, label_values)} {_number(value)}"
+
+
+class Gauge:
+    """Set directly, or computed at scrape time from `collect() -> {label_values: value}`."""
+
+    def __init__(self, name: str, help: str, labels: tuple = (), collect=None):
+        self.name, self.help, self.labels = name, help, labels
+        self.collect = collect
+        self.values = {}
+        _registry.append(self)
+
+    def inc(self, *label_values, amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def dec(self, *label_values, amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) - amount
+
+    def set(self, value, *label_values):
+        self.values[label_values] = value
+
+    def render(self):
+        values = self.collect() if self.collect else self.values
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        for label_values, value in values.items():
+            yield f"{self.name}{_labels(self.labels, label_values)} {_number(value)}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, labels
+        self.buckets = tuple(buckets)
+        self.series = {}  # label_values -> [per-bucket counts (+Inf last), sum]
+        _registry.append(self)
+
+    def observe(self, value, *label_values):
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for label_values, (counts, total) in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = _labels(self.labels + ("le",), label_values + (bound,))
+                yield f"{self.name}_bucket{le} {cumulative}"
+            labels = _labels(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {_number(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ----------------------------
+# 📊 Service metrics
+# ----------------------------
+stage_seconds = Histogram("ai_stage_duration_seconds", "Time spent in each pipeline stage", ("stage",))
+
+http_requests = Counter("ai_http_requests_total", "HTTP requests by route and status", ("route", "status"))
+http_seconds = Histogram("ai_http_request_duration_seconds", "HTTP request latency", ("route",))
+http_in_flight = Gauge("ai_http_requests_in_flight", "HTTP requests being served", ("route",))
+errors = Counter("ai_errors_total", "Errors by route and exception class", ("route", "error"))
+
+recommendation_sources = Counter("ai_recommendations_total", "Recommendations by answer source", ("source",))
+chat_cache_lookups = Counter("ai_chat_cache_lookups_total", "Agent chat cache lookups by result", ("result",))
+
+gemini_seconds = Histogram("ai_gemini_duration_seconds", "Gemini call latency incl. retries", ("route",))
+gemini_tokens = Counter("ai_gemini_tokens_total", "Tokens reported in usage_metadata", ("route", "kind"))
+prompt_chars = Histogram("ai_gemini_prompt_chars", "Inline prompt size sent to Gemini", ("route",), SIZE_BUCKETS)
+response_chars = Histogram("ai_gemini_response_chars", "Gemini response text size", ("route",), SIZE_BUCKETS)
+prompt_tokens_saved = Histogram(
+    "ai_prompt_tokens_saved", "Estimated tokens saved by compact prompt serialization", (),
+    (0, 25, 50, 100, 200, 400, 800),
+)
+
+
+class stage:
+    """`with stage("build_prompt"): ...` records the block's duration."""
+
+    __slots__ = ("name", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        stage_seconds.observe(time.perf_counter() - self.started, self.name)
+        return False
+
+
+def record_error(route: str, error: BaseException):
+    errors.inc(route, type(error).__name__)
+
+
+def record_usage(route: str, contents, response):
+    """Prompt/response sizes and token counts of one Gemini response."""
+    if isinstance(contents, str):
+        prompt_chars.observe(len(contents), route)
+    text = getattr(response, "text", None)
+    if text:
+        response_chars.observe(len(text), route)
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    for kind, attr in (("prompt", "prompt_token_count"), ("response", "candidates_token_count"),
+                       ("cached", "cached_content_token_count")):
+        count = getattr(usage, attr, None)
+        if count:
+            gemini_tokens.inc(route, kind, amount=count)
+
+
+# ----------------------------
+# 🔌 ASGI middleware
+# ----------------------------
+class MetricsMiddleware:
+    """
+    Per-route request count, status, latency and in-flight gauge.
+    Plain ASGI (not BaseHTTPMiddleware) so streaming responses pass through untouched.
+    Unknown paths are grouped under "other" to keep label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.routes = None
+
+    def route_label(self, scope) -> str:
+        if self.routes is None:
+            self.routes = frozenset(getattr(r, "path", None) for r in scope["app"].routes)
+        path = scope["path"]
+        return path if path in self.routes else "other"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        route = self.route_label(scope)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_flight.inc(route)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception as e:
+            record_error(route, e)
+            raise
+        finally:
+            http_in_flight.dec(route)
+            http_seconds.observe(time.perf_counter() - started, route)
+            http_requests.inc(route, status)
@@ -1,92 +1,91 @@
-def build_prompt(room_info, appliances, user_info, indoor_pollutants, outdoor_pollutants):
-    """
-    Builds a natural-language prompt for the Gemini model.
-    Dynamically includes only available appliances in constraints and output format.
-    """
-
-    # Define possible appliances and their allowed ranges/options
-    appliance_constraints = {
-        "AC": [
-            "- `AC_MODE`: one of ['OFF', 'COOL', 'FAN']",
-            "- `AC_TEMPERATURE`: integer between 16–30°C",
-        ],
-        "CEILING_FAN": ["- `CEILING_FAN`: integer between 0–5"],
-        "WINDOW": ["- `WINDOW`: 'OPEN' or 'CLOSED'"],
-        "DOOR": ["- `DOOR`: 'OPEN' or 'CLOSED'"],
-        "EXHAUST_FAN": ["- `EXHAUST_FAN`: 'ON' or 'OFF'"],
-    }
-
-    # Template examples for output JSON
-    appliance_output_examples = {
-        "AC": ['  "AC_MODE": "COOL",', '  "AC_TEMPERATURE": 23,'],
-        "CEILING_FAN": ['  "CEILING_FAN": 3,'],
-        "WINDOW": ['  "WINDOW": "CLOSED",'],
-        "DOOR": ['  "DOOR": "CLOSED",'],
-        "EXHAUST_FAN": ['  "EXHAUST_FAN": "ON",'],
-    }
+# python_services/prompt_builder.py
+"""
+Prompt templates for every Gemini call.
 
-    # Filter active constraints & outputs
-    active_constraints = []
-    active_output_lines = ['  "reason": "Brief explanation of why each setting was chosen.",']
+Gemini only caches blocks of at least 1024 tokens and none of the per-task
+instructions reaches that alone, so they share one static prefix: reference
+values, then one section per task (recommendation, chat, intent routing and
+single-call chat). It is compiled once and byte-identical for every request,
+so all routes reuse a single cached-content handle. Each dynamic part opens
+with `task_header()` naming the section that applies, followed by the room,
+user and sensor sections or the user's message. The response schema, not
+the prefix, limits a recommendation to the room's appliances.
+"""
+import metrics
+from schemas import APPLIANCE_KEYS
+from prompt_serializer import (
+    INDOOR_PRECISION,
+    OUTDOOR_PRECISION,
+    PROMPT_TOKEN_BUDGET,
+    QUESTION_LEGEND,
+    compact,
+    estimate_tokens,
+    feedback_section,
+    fit_budget,
+    readings_section,
+    room_section,
+    serializer_stats,
+    user_section,
+)
+from trend_features import SAMPLE_INTERVAL_MINUTES
 
-    for key, is_present in appliances.items():
-        if is_present:
-            if key in appliance_constraints:
-                active_constraints.extend(appliance_constraints[key])
-            if key in appliance_output_examples:
-                active_output_lines.extend(appliance_output_examples[key])
+# Possible appliances and their allowed ranges/options
+APPLIANCE_CONSTRAINTS = {
+    "AC": [
+        "- `AC_MODE`: one of ['OFF', 'COOL', 'FAN']",
+        "- `AC_TEMPERATURE`: integer between 16–30°C",
+    ],
+    "CEILING_FAN": ["- `CEILING_FAN`: integer between 0–5"],
+    "WINDOW": ["- `WINDOW`: 'OPEN' or 'CLOSED'"],
+    "DOOR": ["- `DOOR`: 'OPEN' or 'CLOSED'"],
+    "EXHAUST_FAN": ["- `EXHAUST_FAN`: 'ON' or 'OFF'"],
+}
 
-    # Always include recheck field
-    active_constraints.append("- `RECHECK_AT`: integer number of minutes to re-evaluate the environment")
-    active_output_lines.append('  "RECHECK_AT": 15')
+# Template examples for output JSON
+APPLIANCE_OUTPUT_EXAMPLES = {
+    "AC": ['  "AC_MODE": "COOL",', '  "AC_TEMPERATURE": 23,'],
+    "CEILING_FAN": ['  "CEILING_FAN": 3,'],
+    "WINDOW": ['  "WINDOW": "CLOSED",'],
+    "DOOR": ['  "DOOR": "CLOSED",'],
+    "EXHAUST_FAN": ['  "EXHAUST_FAN": "ON",'],
+}
 
-    # Format sections
-    constraints_text = "\n".join(active_constraints)
-    output_example = "{\n" + "\n".join(active_output_lines) + "\n}"
+# Tasks of the shared prefix; the dynamic part names one with task_header()
+RECOMMEND_TASK = "RECOMMEND"
+CHAT_TASK = "CHAT"
+ROUTE_TASK = "ROUTE"
+CHAT_AND_ROUTE_TASK = "CHAT_AND_ROUTE"
 
-    # Build final prompt
-    return f"""
+STATIC_TEMPLATE = """
 You are an advanced **Indoor Environmental Comfort & Air Quality AI Assistant**.
-Your goal is to provide *personalized appliance recommendations* to optimize
-comfort, air quality, and energy efficiency — based on **indoor/outdoor conditions**,
-**user feedback**, and **room configuration**.
-
----
-
-###  ROOM INFORMATION
-- Name: {room_info.get('room_name')}
-- Dimensions (Length × Width × Height): {room_info.get('length')}m × {room_info.get('width')}m × {room_info.get('height')}m
-- Occupancy: {room_info.get('occupancy')}
-- Number of Doors: {room_info.get('num_doors')}
-- Number of Windows: {room_info.get('num_windows')}
-
-###  AVAILABLE APPLIANCES
-{appliances}
+You serve several tasks. Each request starts with a line `REQUESTED TASK: <name>`;
+follow only the section for that task below and answer in the format it asks for.
 
 ---
 
-###  USER INFORMATION
-- Name: {user_info.get('username')}
-- Age: {user_info.get('age')}
-- Gender: {user_info.get('gender')}
-- Ethnicity: {user_info.get('ethnicity')}
-- Health Issues: {user_info.get('health_issues')}
-
-**Recent Comfort Feedback:**
-{user_info.get('questionnaire')}
+##  REFERENCE VALUES (all tasks)
+- CO2: below 800 ppm is good, 800–1000 ppm acceptable; above 1000 ppm ventilate
+  (stuffiness, headaches, drowsiness), above 1500 ppm is poor.
+- PM2.5: WHO 24-hour guideline 15 µg/m³; above 35 µg/m³ is unhealthy for sensitive
+  groups (asthma, allergies, elderly, children).
+- PM10: WHO 24-hour guideline 45 µg/m³.
+- CO: above 9 ppm indoors is a concern, above 35 ppm is dangerous; ventilate and
+  find the source.
+- VOC index: 100 is the typical baseline; above 150 is elevated, above 250 high
+  (cooking, cleaning products, paint).
+- Relative humidity: 40–60 % is comfortable; above 60 % favours mold and dust mites,
+  below 30 % dries eyes and airways.
+- Temperature: about 22–26 °C is comfortable indoors; a ceiling fan makes a room feel
+  about 2 °C cooler, so the AC setpoint can be raised.
+- Outdoor air: keep windows closed while outdoor PM2.5 is high or higher than indoors;
+  open them for ventilation when outdoor air is cleaner and the temperature is mild.
 
 ---
 
-###  INDOOR ENVIRONMENT AND POLLUTANT DATA
-{indoor_pollutants}
-
-###  OUTDOOR ENVIRONMENT AND POLLUTANT DATA
-{outdoor_pollutants}
-
----
+##  TASK RECOMMEND: appliance settings for one room
 
 ###  GOAL
-You must analyze all the above data and **recommend appliance settings** that:
+You must analyze the room, user and environment data in the request and **recommend appliance settings** that:
 1. Improve thermal comfort (temperature & humidity balance, air movement).
 2. Maintain healthy indoor air quality (minimize pollutants like CO₂, VOC, PM2.5).
 3. Respect user health conditions (e.g., asthma → avoid dust or VOCs).
@@ -97,12 +96,186 @@ You must analyze all the above data and **recommend appliance settings** that:
 
 ###  CONSTRAINTS
 Your response must strictly follow these constraints:
+Only set the appliances listed under AVAILABLE APPLIANCES in the request.
 Stay within valid ranges and allowed values:
 {constraints_text}
 
----
-
 ###  OUTPUT FORMAT
-Return your output **strictly in valid JSON**, following this schema:
+Return your output **strictly in valid JSON**, following this schema
+(keys of appliances the room does not have are left out):
 {output_example}
+
+###  INPUT NOTES
+{input_notes}
+Trends: mean/ewma in sensor units, slope_h = change per hour, above_min = minutes above threshold (CO2 1000 ppm, PM2.5 35 µg/m³, temperature 28 °C).
+
+---
+
+##  TASK CHAT: environmental and health assistant
+You are a friendly and knowledgeable environmental and health assistant.
+You specialize in:
+- Weather and air quality
+- Pollutants (PM2.5, CO2, NOx, etc.)
+- Health effects of pollution and poor air quality
+- Ways to stay healthy and comfortable in polluted environments
+
+Behavior guidelines:
+1. If the user greets you (like "hi", "hello", "hey", "good morning"), respond with a friendly short greeting and invite them to ask about weather, air quality, or health.
+2. If the user asks general questions about weather, air, or pollution, respond naturally and informatively.
+3. If the question is unrelated (like math, technology, sports, jokes, etc.), respond with:
+   "Sorry, I can only answer questions related to weather, pollution, or health impacts."
+4. Keep responses concise (1–2 sentences) and empathetic.
+
+---
+
+##  TASK ROUTE: intent classifier
+Decide whether the user's message needs:
+- CALL_NORMAL_CHAT → general questions, greetings, or informational topics
+  (like weather, air quality, pollution, health improvement, or environment)
+- CALL_RECOMMENDATION → only if the user expresses physical discomfort or illness
+  (e.g., "I feel dizzy", "I have a headache", "my room feels suffocating")
+
+Rules:
+1. If the user is simply greeting or asking for advice on health, air, or pollution — CALL_NORMAL_CHAT.
+2. If the user mentions feeling unwell, cold, tired, or sick — CALL_RECOMMENDATION.
+3. Always respond with exactly one of these two words:
+   - CALL_NORMAL_CHAT
+   - CALL_RECOMMENDATION
+
+---
+
+##  TASK CHAT_AND_ROUTE: routing and chat in one structured answer
+Follow the CHAT guidelines, then route with the ROUTE rules:
+- Set `intent` to CALL_RECOMMENDATION only if the user expresses physical discomfort or illness
+  (e.g., "I feel dizzy", "I have a headache", "my room feels suffocating"); leave `message` empty.
+- Otherwise set `intent` to CALL_NORMAL_CHAT and put your reply in `message`.
+
+---
 """
+
+# Dynamic sections are compact JSON from prompt_serializer; see INPUT NOTES for the short keys
+DYNAMIC_TEMPLATE = """
+###  ROOM
+{room}
+
+###  AVAILABLE APPLIANCES
+{appliances}
+
+###  USER
+{user}
+
+###  COMFORT FEEDBACK
+{feedback}
+
+###  INDOOR READINGS
+{indoor}
+
+###  OUTDOOR READINGS
+{outdoor}
+"""
+
+TREND_TEMPLATE = """
+###  RECENT INDOOR TRENDS (last {minutes} min)
+{trends}
+"""
+
+def _compile_static_prefix() -> str:
+    """Shared preamble, reference values and the instructions of every task."""
+    active_constraints = []
+    active_output_lines = ['  "reason": "Brief explanation of why each setting was chosen.",']
+
+    # Fixed appliance order keeps the prefix byte-identical across processes
+    for key in APPLIANCE_KEYS:
+        active_constraints.extend(APPLIANCE_CONSTRAINTS[key])
+        active_output_lines.extend(APPLIANCE_OUTPUT_EXAMPLES[key])
+
+    # Always include recheck field
+    active_constraints.append("- `RECHECK_AT`: integer number of minutes to re-evaluate the environment")
+    active_output_lines.append('  "RECHECK_AT": 15')
+
+    return STATIC_TEMPLATE.format(
+        constraints_text="\n".join(active_constraints),
+        output_example="{\n" + "\n".join(active_output_lines) + "\n}",
+        input_notes=QUESTION_LEGEND,
+    )
+
+
+STATIC_PREFIX = _compile_static_prefix()
+
+
+def task_header(task: str) -> str:
+    """First line of every dynamic part: which section of STATIC_PREFIX applies."""
+    return f"\nREQUESTED TASK: {task}\n"
+
+
+def dynamic_sections(room_info, appliances, user_info, indoor_pollutants, outdoor_pollutants, trends=None) -> dict:
+    """Per-request sections with empty, zero-information and over-precise values stripped."""
+    return {
+        "room": room_section(room_info),
+        "appliances": [key for key in APPLIANCE_KEYS if appliances.get(key)],
+        "user": user_section(user_info),
+        "feedback": feedback_section((user_info or {}).get("questionnaire")),
+        "indoor": readings_section(indoor_pollutants, INDOOR_PRECISION),
+        "outdoor": readings_section(outdoor_pollutants, OUTDOOR_PRECISION),
+        "trends": trends or None,
+    }
+
+
+def render_dynamic(room_info, appliances, user_info, indoor_pollutants, outdoor_pollutants, trends=None,
+                   budget: int = PROMPT_TOKEN_BUDGET) -> str:
+    """Per-request room, user and sensor sections (plus recent trends), fitted to the token budget."""
+    sections = dynamic_sections(room_info, appliances, user_info, indoor_pollutants, outdoor_pollutants, trends)
+    rendered, _dropped = fit_budget(sections, budget)
+    text = DYNAMIC_TEMPLATE.format(**{name: rendered[name] for name in rendered if name != "trends"})
+    if trends:
+        samples = max(features["n"] for features in trends.values())
+        text += TREND_TEMPLATE.format(minutes=samples * SAMPLE_INTERVAL_MINUTES, trends=rendered["trends"])
+
+    # Savings against the same inputs serialized in full
+    before = estimate_tokens(compact([room_info, appliances, user_info, indoor_pollutants, outdoor_pollutants, trends]))
+    after = sum(estimate_tokens(rendered[name]) for name in rendered)
+    serializer_stats.record(before, after, budget)
+    metrics.prompt_tokens_saved.observe(before - after)
+    return text
+
+
+def build_prompt_parts(room_info, appliances, user_info, indoor_pollutants, outdoor_pollutants, trends=None):
+    """Return (static_prefix, dynamic_sections) so callers can cache the prefix upstream."""
+    return (
+        STATIC_PREFIX,
+        task_header(RECOMMEND_TASK)
+        + render_dynamic(room_info, appliances, user_info, indoor_pollutants, outdoor_pollutants, trends),
+    )
+
+
+def build_prompt(room_info, appliances, user_info, indoor_pollutants, outdoor_pollutants):
+    """
+    Builds a natural-language prompt for the Gemini model.
+    Dynamically includes only available appliances in constraints and output format.
+    """
+    prefix, dynamic = build_prompt_parts(room_info, appliances, user_info, indoor_pollutants, outdoor_pollutants)
+    return prefix + dynamic
+
+
+def build_batch_prompt(environments, trends=None):
+    """
+    Packs several rooms with the same appliance set into one prompt.
+    `environments` is a list of prepare_environment_data() tuples and `trends`
+    an optional parallel list of trend summaries; the model must answer with
+    a JSON array holding one recommendation per room, in order.
+    The static prefix is included once for the whole batch.
+    """
+    trends = trends or [None] * len(environments)
+    sections = []
+    for index, (env, room_trends) in enumerate(zip(environments, trends), 1):
+        sections.append(
+            f"==================== ROOM {index} of {len(environments)} ====================\n"
+            + render_dynamic(*env, trends=room_trends)
+        )
+
+    return STATIC_PREFIX + task_header(RECOMMEND_TASK) + f"""
+You will receive {len(environments)} independent room scenarios.
+Analyze each one on its own and return a JSON array with exactly {len(environments)} objects
+(each following the schema above), one recommendation per room, in the same order as the rooms below.
+
+""" + "\n".join(sections)
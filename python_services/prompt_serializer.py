@@ -0,0 +1,196 @@
+# python_services/prompt_serializer.py
+"""
+Compact, token-budgeted serialization of the dynamic prompt sections.
+
+- drops None, empty and zero-information fields (e.g. pressure 0 from a sensor
+  that has no barometer, rain 0),
+- rounds readings to sensor precision,
+- replaces the known questionnaire texts with short ids (Q1…Q5, explained once
+  in the cached static prefix),
+- trims low-value fields in a fixed order until the estimated token count fits
+  PROMPT_TOKEN_BUDGET.
+"""
+import os
+import re
+import json
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 400))
+
+# Decimal places worth sending per reading
+INDOOR_PRECISION = {
+    "temperature": 1, "humidity": 0, "pressure": 0, "pm1": 0, "pm2_5": 0,
+    "pm10": 0, "co": 1, "voc": 2, "co2": 0,
+}
+OUTDOOR_PRECISION = {
+    "pm10": 0, "pm2_5": 0, "carbon_monoxide": 0, "dust": 0, "temperature_2m": 1,
+    "relative_humidity_2m": 0, "wind_speed_10m": 1, "wind_direction_10m": 0,
+    "wind_gusts_10m": 1, "rain": 1, "precipitation": 1, "is_day": 0,
+}
+
+# A zero here means "not measured" (no barometer) or "nothing happening"
+ZERO_IS_EMPTY = {"pressure", "rain", "precipitation"}
+# Volatile fields that carry nothing the model can act on
+DROPPED_FIELDS = {"timestamp"}
+
+# Question ids as defined in client/src/data/questionnaire.js
+QUESTION_IDS = {
+    "how comfortable do you currently feel in your environment": "Q1",
+    "how would you rate the air quality around you": "Q2",
+    "how satisfied are you with the current temperature and humidity": "Q3",
+    "if you feel discomfort, what do you think is the main reason": "Q4",
+    "what could improve your comfort in this environment": "Q5",
+}
+QUESTION_LEGEND = (
+    "Comfort feedback uses question ids: Q1 overall comfort, Q2 air quality rating, "
+    "Q3 temperature/humidity satisfaction (Q1–Q3 are Likert ratings), "
+    "Q4 main reason for discomfort, Q5 what would improve comfort. "
+    "Readings that are unavailable are omitted; rain and precipitation are omitted when zero."
+)
+
+# Fields removed, in order, while the dynamic sections exceed the budget
+BUDGET_DROPS = [
+    ("user", "username"),
+    ("outdoor", "wind_direction_10m"),
+    ("outdoor", "wind_gusts_10m"),
+    ("outdoor", "dust"),
+    ("outdoor", "carbon_monoxide"),
+    ("indoor", "pm1"),
+    ("user", "ethnicity"),
+]
+FREE_TEXT_LIMIT = 60  # characters kept of free-text answers once over budget
+
+_PARENTHETICAL = re.compile(r"\s*\(.*?\)\s*")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough Gemini token estimate (~4 characters per token)."""
+    return (len(text) + 3) // 4
+
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def compact(value) -> str:
+    """Compact, stable JSON rendering of a dynamic section."""
+    return _encoder.encode(value)
+
+
+def _is_empty(field, value) -> bool:
+    return value is None or value == "" or value == [] or value == {} or \
+        (field in ZERO_IS_EMPTY and value == 0)
+
+
+def _round(value, places):
+    if isinstance(value, bool) or not isinstance(value, float) or places is None:
+        return value
+    return int(round(value)) if places == 0 else round(value, places)
+
+
+def readings_section(readings: dict, precision: dict) -> dict:
+    return {
+        field: _round(value, precision.get(field))
+        for field, value in (readings or {}).items()
+        if field not in DROPPED_FIELDS and not _is_empty(field, value)
+    }
+
+
+def room_section(room_info: dict) -> dict:
+    room = room_info or {}
+    section = {
+        "name": room.get("room_name"),
+        "size_m": [room.get("length"), room.get("width"), room.get("height")],
+        "occupancy": room.get("occupancy"),
+        "doors": room.get("num_doors"),
+        "windows": room.get("num_windows"),
+    }
+    if all(v is None for v in section["size_m"]):
+        section["size_m"] = None
+    return {k: v for k, v in section.items() if not _is_empty(k, v)}
+
+
+def question_id(text: str) -> str:
+    key = _PARENTHETICAL.sub(" ", str(text)).strip().rstrip("?").strip().lower()
+    return QUESTION_IDS.get(key, text)
+
+
+def feedback_section(questionnaire: list) -> dict:
+    feedback = {}
+    for entry in questionnaire or []:
+        if not isinstance(entry, dict) or _is_empty("answer", entry.get("answer")):
+            continue
+        feedback[question_id(entry.get("question", ""))] = entry["answer"]
+    return feedback
+
+
+def user_section(user_info: dict) -> dict:
+    user = user_info or {}
+    section = {
+        "username": user.get("username"),
+        "age": user.get("age"),
+        "gender": user.get("gender"),
+        "ethnicity": user.get("ethnicity"),
+        "health_issues": user.get("health_issues"),
+    }
+    return {k: v for k, v in section.items() if not _is_empty(k, v)}
+
+
+def render_sections(sections: dict) -> dict:
+    """Section name -> compact JSON text ("none" for empty sections)."""
+    return {name: compact(value) if value else "none" for name, value in sections.items()}
+
+
+def fit_budget(sections: dict, budget: int = PROMPT_TOKEN_BUDGET):
+    """
+    Trim BUDGET_DROPS (and then long free-text answers) until the rendered
+    sections fit `budget` tokens. Returns (rendered sections, dropped field names).
+    """
+    rendered = render_sections(sections)
+    dropped = []
+
+    def size():
+        return sum(estimate_tokens(text) for text in rendered.values())
+
+    for section, field in BUDGET_DROPS:
+        if size() <= budget:
+            return rendered, dropped
+        if field in (sections.get(section) or {}):
+            sections[section] = {k: v for k, v in sections[section].items() if k != field}
+            rendered[section] = compact(sections[section]) if sections[section] else "none"
+            dropped.append(f"{section}.{field}")
+
+    if size() > budget and sections.get("feedback"):
+        sections["feedback"] = {
+            k: v[:FREE_TEXT_LIMIT] if isinstance(v, str) else v for k, v in sections["feedback"].items()
+        }
+        rendered["feedback"] = compact(sections["feedback"])
+        dropped.append("feedback.free_text")
+    return rendered, dropped
+
+
+# ----------------------------
+# 📉 Savings accounting
+# ----------------------------
+class SerializerStats:
+    def __init__(self):
+        self.requests = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.over_budget = 0
+
+    def record(self, before: int, after: int, budget: int):
+        self.requests += 1
+        self.tokens_before += before
+        self.tokens_after += after
+        self.over_budget += after > budget
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "tokens_saved": self.tokens_before - self.tokens_after,
+            "avg_tokens_saved": (self.tokens_before - self.tokens_after) / self.requests if self.requests else 0.0,
+            "over_budget": self.over_budget,
+            "budget": PROMPT_TOKEN_BUDGET,
+        }
+
+
+serializer_stats = SerializerStats()
@@ -0,0 +1,250 @@
+# python_services/rate_limiter.py
+"""
+Token-bucket rate limiting and quota accounting for Gemini calls.
+
+Every generate call is checked against two scopes before it may queue:
+- the calling user (requests/min and tokens/min),
+- the upstream model (requests/min and tokens/min, shared by all users).
+Token buckets are charged an estimate of the prompt up front and reconciled
+with usage_metadata once the response arrives (or refunded when the call is
+rejected or fails without one), so heavy users run into debt and are
+throttled on their next call. A refused call fails fast with
+RateLimitedError (HTTP 429 + Retry-After) instead of waiting for capacity.
+
+Buckets live in memory by default; set RATE_LIMIT_REDIS_URL to share them
+between workers through any Redis-compatible server (needs the `redis` package).
+"""
+import os
+import math
+import time
+import contextvars
+from collections import OrderedDict
+
+from resilience import ServiceUnavailableError
+from prompt_serializer import estimate_tokens
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") != "0"
+USER_RPM = float(os.getenv("RATE_LIMIT_USER_RPM", 30))
+USER_TPM = float(os.getenv("RATE_LIMIT_USER_TPM", 60000))
+MODEL_RPM = float(os.getenv("RATE_LIMIT_MODEL_RPM", 1000))
+MODEL_TPM = float(os.getenv("RATE_LIMIT_MODEL_TPM", 1000000))
+REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+# Key unidentified HTTP callers by client IP. Off by default: behind the Node
+# backend every chat user would share the Node host's bucket.
+RATE_LIMIT_BY_IP = os.getenv("RATE_LIMIT_BY_IP", "0") == "1"
+# Upper bounds for the in-memory per-key state (least recently used goes first)
+MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", 100000))
+MAX_TRACKED_USERS = int(os.getenv("RATE_LIMIT_MAX_TRACKED_USERS", 10000))
+
+# Who the current request is on behalf of; set by the HTTP routes.
+# None (unidentified callers, background work such as the scheduler, direct
+# module callers) is only subject to the model limits.
+current_user = contextvars.ContextVar("current_user", default=None)
+
+
+class RateLimitedError(ServiceUnavailableError):
+    """A user or model bucket is empty; maps onto 429 with Retry-After."""
+
+    def __init__(self, scope: str, retry_after: float):
+        super().__init__(f"Rate limit exceeded for {scope}", status_code=429,
+                         retry_after=max(1, math.ceil(retry_after)))
+        self.scope = scope
+
+
+# ----------------------------
+# 🪣 Bucket backends
+# ----------------------------
+class MemoryBucketBackend:
+    """
+    Per-process buckets: key -> [level, last refill time, seconds until full],
+    in least recently used order. A bucket idle long enough to refill is
+    the same as a missing one, so those are swept; beyond `max_buckets`
+    the least recently used are dropped as well.
+    """
+
+    def __init__(self, max_buckets: int = MAX_BUCKETS):
+        self._buckets = OrderedDict()
+        self.max_buckets = max_buckets
+        self.evicted = 0
+
+    def _sweep(self, now: float):
+        while self._buckets:
+            _level, last, until_full = next(iter(self._buckets.values()))
+            if now - last < until_full and len(self._buckets) < self.max_buckets:
+                break
+            self._buckets.popitem(last=False)
+            self.evicted += 1
+
+    def _refill(self, key: str, rate: float, burst: float, now: float):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            self._sweep(now)
+            bucket = self._buckets[key] = [burst, now, 0.0]
+        else:
+            self._buckets.move_to_end(key)
+        bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        return bucket
+
+    @staticmethod
+    def _settle(bucket, rate: float, burst: float):
+        bucket[2] = (burst - bucket[0]) / rate
+
+    async def take(self, key: str, rate: float, burst: float, cost: float) -> float:
+        """Consume `cost` if the bucket is not in debt; else return seconds until it is."""
+        bucket = self._refill(key, rate, burst, time.monotonic())
+        if bucket[0] < min(cost, burst):
+            return (min(cost, burst) - bucket[0]) / rate
+        bucket[0] -= cost
+        self._settle(bucket, rate, burst)
+        return 0.0
+
+    async def charge(self, key: str, rate: float, burst: float, amount: float):
+        """Adjust the level without checking (reconciliation; negative amounts refund)."""
+        bucket = self._refill(key, rate, burst, time.monotonic())
+        bucket[0] = min(burst, bucket[0] - amount)
+        self._settle(bucket, rate, burst)
+
+
+# KEYS[1] bucket; ARGV rate, burst, cost, now, check (1 = refuse when short)
+_REDIS_BUCKET_SCRIPT = """
+local rate, burst, cost, now, check = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4]), ARGV[5]
+local state = redis.call('HMGET', KEYS[1], 'level', 'ts')
+local level = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+level = math.min(burst, level + math.max(0, now - ts) * rate)
+local need = math.min(cost, burst)
+local wait = 0
+if check == '1' and level < need then
+  wait = (need - level) / rate
+else
+  level = math.min(burst, level - cost)
+end
+redis.call('HSET', KEYS[1], 'level', level, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 60)
+return tostring(wait)
+"""
+
+
+class RedisBucketBackend:
+    """Buckets shared between workers; updated atomically by a Lua script."""
+
+    def __init__(self, client, prefix: str = "ai:ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def _run(self, key, rate, burst, cost, check: bool) -> float:
+        wait = await self.client.eval(
+            _REDIS_BUCKET_SCRIPT, 1, self.prefix + key, rate, burst, cost, time.time(), "1" if check else "0"
+        )
+        return float(wait)
+
+    async def take(self, key: str, rate: float, burst: float, cost: float) -> float:
+        return await self._run(key, rate, burst, cost, check=True)
+
+    async def charge(self, key: str, rate: float, burst: float, amount: float):
+        await self._run(key, rate, burst, amount, check=False)
+
+
+def _make_backend():
+    if not REDIS_URL:
+        return MemoryBucketBackend()
+    import redis.asyncio as redis  # optional dependency, only for shared buckets
+    return RedisBucketBackend(redis.from_url(REDIS_URL))
+
+
+# ----------------------------
+# 🚦 Limiter
+# ----------------------------
+class QuotaLimiter:
+    def __init__(self, backend=None, user_rpm: float = USER_RPM, user_tpm: float = USER_TPM,
+                 model_rpm: float = MODEL_RPM, model_tpm: float = MODEL_TPM, enabled: bool = RATE_LIMIT_ENABLED,
+                 max_tracked_users: int = MAX_TRACKED_USERS):
+        self.backend = backend or _make_backend()
+        self.enabled = enabled
+        # scope -> (requests per second, request burst, tokens per second, token burst)
+        self.limits = {
+            "user": (user_rpm / 60, max(1.0, user_rpm), user_tpm / 60, user_tpm),
+            "model": (model_rpm / 60, max(1.0, model_rpm), model_tpm / 60, model_tpm),
+        }
+        self.usage = {"user": OrderedDict(), "model": {}}   # scope -> key -> token counters
+        self.max_tracked_users = max_tracked_users
+        self.allowed = 0
+        self.limited = {"user": 0, "model": 0}
+
+    @staticmethod
+    def _scopes(model: str):
+        user = current_user.get()
+        return ((("user", user),) if user is not None else ()) + (("model", model),)
+
+    async def acquire(self, model: str, contents) -> int:
+        """
+        Reserve one request and the estimated prompt tokens for the current user
+        and `model`. Returns the estimate, to be passed to `record()`.
+        """
+        estimate = estimate_tokens(contents if isinstance(contents, str) else str(contents))
+        if not self.enabled:
+            return estimate
+
+        for scope, key in self._scopes(model):
+            rps, request_burst, tps, token_burst = self.limits[scope]
+            wait = await self.backend.take(f"{scope}:{key}:req", rps, request_burst, 1)
+            if not wait:
+                wait = await self.backend.take(f"{scope}:{key}:tok", tps, token_burst, estimate)
+                if wait:
+                    await self.backend.charge(f"{scope}:{key}:req", rps, request_burst, -1)  # give the request back
+            if wait:
+                if scope == "model" and current_user.get() is not None:
+                    await self.refund(model, estimate, scopes=self._scopes(model)[:1])
+                self.limited[scope] += 1
+                raise RateLimitedError(f"{scope} '{key}'", wait)
+        self.allowed += 1
+        return estimate
+
+    async def refund(self, model: str, estimate: int, scopes=None):
+        """Give back a reservation whose call never got a response (refused, queue full, failed)."""
+        if not self.enabled:
+            return
+        for scope, key in scopes or self._scopes(model):
+            rps, request_burst, tps, token_burst = self.limits[scope]
+            await self.backend.charge(f"{scope}:{key}:req", rps, request_burst, -1)
+            await self.backend.charge(f"{scope}:{key}:tok", tps, token_burst, -estimate)
+
+    async def record(self, model: str, estimate: int, usage_metadata):
+        """Reconcile the token buckets with the tokens Gemini actually reported."""
+        if usage_metadata is None:
+            return
+        prompt = getattr(usage_metadata, "prompt_token_count", None) or 0
+        response = getattr(usage_metadata, "candidates_token_count", None) or 0
+        cached = getattr(usage_metadata, "cached_content_token_count", None) or 0
+        total = getattr(usage_metadata, "total_token_count", None) or prompt + response
+
+        for scope, key in self._scopes(model):
+            spent = self.usage[scope].setdefault(key, {"requests": 0, "prompt": 0, "response": 0, "cached": 0})
+            spent["requests"] += 1
+            spent["prompt"] += prompt
+            spent["response"] += response
+            spent["cached"] += cached
+            if scope == "user":
+                self.usage["user"].move_to_end(key)
+                if len(self.usage["user"]) > self.max_tracked_users:
+                    self.usage["user"].popitem(last=False)  # least recently active user
+            if self.enabled:
+                _rps, _burst, tps, token_burst = self.limits[scope]
+                await self.backend.charge(f"{scope}:{key}:tok", tps, token_burst, total - estimate)
+
+    def stats(self, top: int = 10) -> dict:
+        heaviest = sorted(self.usage["user"].items(), key=lambda kv: kv[1]["prompt"] + kv[1]["response"], reverse=True)
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__,
+            "allowed": self.allowed,
+            "limited": dict(self.limited),
+            "tracked_users": len(self.usage["user"]),
+            "evicted_buckets": getattr(self.backend, "evicted", None),
+            "models": self.usage["model"],
+            "top_users": dict(heaviest[:top]),
+        }
+
+
+quota = QuotaLimiter()
@@ -0,0 +1,299 @@
+# python_services/recommendation_cache.py
+"""
+Content-addressed cache for appliance recommendations.
+Keys are a canonical hash of the normalized room, appliances and user data plus
+pollutant readings quantized into buckets, so readings that barely moved since
+the last call reuse the previous Gemini answer.
+
+The shared tiers (SQLite, Redis) use blocking clients: code on the event loop
+goes through aget()/aset(), which run tier I/O in a worker thread.
+"""
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+# ----------------------------
+# 📏 Quantization buckets (same unit as the sensor reading)
+# ----------------------------
+INDOOR_BUCKETS = {
+    "temperature": 0.5,   # °C
+    "humidity": 5,        # %
+    "pressure": 5,        # hPa
+    "pm1": 5,             # µg/m³
+    "pm2_5": 5,           # µg/m³
+    "pm10": 5,            # µg/m³
+    "co": 1,              # ppm
+    "voc": 0.5,           # index
+    "co2": 50,            # ppm
+}
+
+OUTDOOR_BUCKETS = {
+    "pm10": 5,
+    "pm2_5": 5,
+    "carbon_monoxide": 10,
+    "dust": 5,
+    "temperature_2m": 0.5,
+    "relative_humidity_2m": 5,
+    "wind_speed_10m": 2,
+    "wind_direction_10m": 45,
+    "wind_gusts_10m": 5,
+    "rain": 0.5,
+    "precipitation": 0.5,
+    "is_day": 1,
+}
+
+# Fields that change on every reading but carry no signal for the recommendation
+IGNORED_FIELDS = {"timestamp"}
+
+
+def quantize(value, step):
+    """Snap a numeric reading to the lower edge of its bucket."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not step:
+        return value
+    return round((value // step) * step, 6)
+
+
+def bucket_readings(readings: dict, buckets: dict) -> dict:
+    """Quantize every known pollutant field and drop volatile ones."""
+    return {
+        key: quantize(value, buckets.get(key))
+        for key, value in (readings or {}).items()
+        if key not in IGNORED_FIELDS
+    }
+
+
+def make_cache_key(room_info, appliances, user_info, indoor_pollutants, outdoor_pollutants,
+                   indoor_buckets=None, outdoor_buckets=None, trends=None) -> str:
+    """
+    Canonical SHA-256 of the normalized inputs with bucketed pollutant values.
+    `trends` is the coarse trend signature, if history was supplied.
+    """
+    payload = {
+        "room": room_info or {},
+        "appliances": appliances or {},
+        "user": user_info or {},
+        "indoor": bucket_readings(indoor_pollutants, indoor_buckets or INDOOR_BUCKETS),
+        "outdoor": bucket_readings(outdoor_pollutants, outdoor_buckets or OUTDOOR_BUCKETS),
+    }
+    if trends:
+        payload["trends"] = trends
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+# ----------------------------
+# 🗄️ Shared tiers (behind the in-process LRU)
+# ----------------------------
+class SQLiteTier:
+    """
+    On-disk tier: cached answers survive restarts and, in WAL mode, are shared by
+    every worker process pointing at the same file. The connection is opened
+    lazily per process, so a tier created before forking is safe to inherit.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def _connection(self):
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS recommendations ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.commit()
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT value, expires_at FROM recommendations WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None, None
+        value, expires_at = row
+        if expires_at <= time.time():
+            self.delete(key)
+            return None, None
+        return json.loads(value), expires_at
+
+    def set(self, key: str, value, expires_at: float):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO recommendations (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at),
+            )
+            conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM recommendations WHERE key = ?", (key,))
+            conn.commit()
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM recommendations")
+            conn.commit()
+
+
+class RedisTier:
+    """Tier shared by workers on several hosts through a Redis-compatible server."""
+
+    def __init__(self, client, prefix: str = "ai:recommendation:"):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None, None
+        entry = json.loads(raw)
+        return entry["value"], entry["expires_at"]
+
+    def set(self, key: str, value, expires_at: float):
+        ttl = max(1, int(expires_at - time.time()))
+        self.client.set(self.prefix + key, json.dumps({"value": value, "expires_at": expires_at}), ex=ttl)
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+
+def _make_tier():
+    """RECOMMENDATION_CACHE_REDIS_URL, else RECOMMENDATION_CACHE_DB (SQLite file), else none."""
+    redis_url = os.getenv("RECOMMENDATION_CACHE_REDIS_URL")
+    if redis_url:
+        import redis  # optional dependency, only for a Redis tier
+        return RedisTier(redis.Redis.from_url(redis_url))
+    db_path = os.getenv("RECOMMENDATION_CACHE_DB")
+    return SQLiteTier(db_path) if db_path else None
+
+
+class RecommendationCache:
+    """In-process LRU with per-entry TTL and an optional shared tier (SQLite or Redis) behind it."""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 900, db_path: str | None = None,
+                 tier=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk = tier or (SQLiteTier(db_path) if db_path else None)
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _get_local(self, key: str):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                # Expired entries stay until evicted so get_stale() can serve them in degraded mode
+                self.expirations += 1
+        return None
+
+    def _from_tier(self, key: str, value, expires_at):
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, value, expires_at)
+        return value
+
+    def get(self, key: str):
+        value = self._get_local(key)
+        if value is not None:
+            return value
+        if self.disk is None:
+            return self._from_tier(key, None, None)
+        return self._from_tier(key, *self.disk.get(key))
+
+    async def aget(self, key: str):
+        """get() for coroutines: a shared tier is read in a worker thread, not on the event loop."""
+        value = self._get_local(key)
+        if value is not None:
+            return value
+        if self.disk is None:
+            return self._from_tier(key, None, None)
+        return self._from_tier(key, *await asyncio.to_thread(self.disk.get, key))
+
+    def get_stale(self, key: str):
+        """Return an entry even if its TTL has passed (used when Gemini is unavailable)."""
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def _set_local(self, key: str, value, ttl_seconds: float | None) -> float:
+        expires_at = time.time() + (ttl_seconds if ttl_seconds is not None else self.ttl_seconds)
+        with self._lock:
+            self._store(key, value, expires_at)
+        return expires_at
+
+    def set(self, key: str, value, ttl_seconds: float | None = None):
+        expires_at = self._set_local(key, value, ttl_seconds)
+        if self.disk is not None:
+            self.disk.set(key, value, expires_at)
+
+    async def aset(self, key: str, value, ttl_seconds: float | None = None):
+        """set() for coroutines: the shared tier is written in a worker thread."""
+        expires_at = self._set_local(key, value, ttl_seconds)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, value, expires_at)
+
+    def _store(self, key, value, expires_at):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "tier": type(self.disk).__name__ if self.disk is not None else None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+
+# Shared cache used by the /ai/recommend route
+recommendation_cache = RecommendationCache(
+    max_entries=int(os.getenv("RECOMMENDATION_CACHE_SIZE", 1024)),
+    ttl_seconds=float(os.getenv("RECOMMENDATION_CACHE_TTL", 900)),
+    tier=_make_tier(),
+)
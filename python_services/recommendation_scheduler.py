@@ -0,0 +1,211 @@
+# python_services/recommendation_scheduler.py
+"""
+Background refresh of recommendations for actively reported rooms.
+
+Off by default (RECOMMENDATION_SCHEDULER=1 enables it). Rooms are tracked while
+fresh readings keep being pushed to /ai/rooms/track (the Node scheduler pushes
+every stored sensor reading). A push is computed in the background right away,
+so the next /ai/recommend for those readings is served from room state or the
+cache instead of waiting for Gemini. After each refresh the room is scheduled
+again for when its recommendation's RECHECK_AT comes due, using the newest
+pushed readings. A single asyncio task pops rooms from a min-heap ordered by
+due time; due times get random jitter and dispatch is paced by a global rate
+limit. Rooms without a push for SCHEDULER_ROOM_TTL seconds stop being tracked,
+so nothing is re-asked on readings that stopped arriving.
+
+Under serve.py only one worker runs the scheduler; the others forward their
+pushes to it (see `forward_to`).
+"""
+import os
+import time
+import heapq
+import random
+import asyncio
+import itertools
+
+from rate_limiter import current_user
+from recommendation_service import recommend
+
+SCHEDULER_ENABLED = os.getenv("RECOMMENDATION_SCHEDULER", "0") == "1"
+SCHEDULER_RATE = float(os.getenv("SCHEDULER_RATE", 2))                  # refreshes per second
+SCHEDULER_CONCURRENCY = int(os.getenv("SCHEDULER_CONCURRENCY", 4))
+SCHEDULER_JITTER = float(os.getenv("SCHEDULER_JITTER", 0.1))            # fraction of the interval
+SCHEDULER_ROOM_TTL = float(os.getenv("SCHEDULER_ROOM_TTL", 1800))       # seconds since the last push
+SCHEDULER_RETRY_SECONDS = float(os.getenv("SCHEDULER_RETRY_SECONDS", 120))
+DEFAULT_RECHECK_MINUTES = 5    # the Node side assumes the same when RECHECK_AT is missing
+
+
+class RecommendationScheduler:
+    def __init__(self, rate: float = SCHEDULER_RATE, concurrency: int = SCHEDULER_CONCURRENCY,
+                 jitter: float = SCHEDULER_JITTER, room_ttl: float = SCHEDULER_ROOM_TTL,
+                 retry_seconds: float = SCHEDULER_RETRY_SECONDS, refresh=recommend):
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self.jitter = jitter
+        self.room_ttl = room_ttl
+        self.retry_seconds = retry_seconds
+        self.refresh = refresh
+        self._rooms = {}     # key -> {"inputs", "due", "last_seen", "refreshing"}
+        self._heap = []      # (due, seq, key); entries whose due no longer matches are stale
+        self._seq = itertools.count()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._workers = set()
+        self._next_slot = 0.0
+        self.forward_to = None   # Unix socket of the worker running the scheduler, in the other workers
+        self.refreshed = 0
+        self.failed = 0
+        self.expired = 0
+
+    # ----------------------------
+    # 📌 Tracking
+    # ----------------------------
+    def _schedule(self, key, delay: float):
+        due = time.time() + delay + random.uniform(0, self.jitter * max(delay, 60))
+        self._rooms[key]["due"] = due
+        heapq.heappush(self._heap, (due, next(self._seq), key))
+        self._wakeup.set()
+
+    def track(self, key, inputs: tuple, due_in: float = 0.0):
+        """
+        Remember freshly pushed raw inputs of a room and refresh it within
+        `due_in` seconds. A room already due sooner keeps its due time; a room
+        being refreshed right now is rescheduled once that refresh finishes.
+        """
+        if key is None:
+            return
+        room = self._rooms.setdefault(key, {"due": None, "refreshing": False})
+        room["inputs"] = inputs
+        room["last_seen"] = time.time()
+        if room["refreshing"]:
+            room["pushed"] = True
+        elif room["due"] is None or room["due"] > time.time() + due_in:
+            self._schedule(key, due_in)
+
+    async def forward(self, payload: bytes) -> bool:
+        """Hand a /ai/rooms/track body to the worker that runs the scheduler."""
+        reader, writer = await asyncio.open_unix_connection(self.forward_to)
+        try:
+            writer.write(
+                b"POST /ai/rooms/track HTTP/1.1\r\nHost: scheduler\r\nContent-Type: application/json\r\n"
+                b"Content-Length: %d\r\nConnection: close\r\n\r\n" % len(payload) + payload
+            )
+            await writer.drain()
+            status = await reader.readline()
+        finally:
+            writer.close()
+        return status.split(b" ")[1:2] == [b"200"]
+
+    def forget(self, key):
+        self._rooms.pop(key, None)
+
+    # ----------------------------
+    # 🔁 Loop
+    # ----------------------------
+    async def _pace(self):
+        """Global rate limit: dispatches are at least `interval` seconds apart."""
+        now = time.monotonic()
+        wait = self._next_slot - now
+        self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    @staticmethod
+    def recheck_in(result) -> float:
+        """Seconds until the model wants the room re-evaluated, minus the age of a reused answer."""
+        result = result or {}
+        recommendation = result.get("recommendation")
+        minutes = recommendation.get("RECHECK_AT") if isinstance(recommendation, dict) else None
+        if isinstance(minutes, bool) or not isinstance(minutes, (int, float)) or minutes <= 0:
+            minutes = DEFAULT_RECHECK_MINUTES
+        return max(0.0, minutes * 60 - result.get("stale_age", 0))
+
+    async def _refresh(self, key, room, inputs: tuple):
+        try:
+            result = await self.refresh(*inputs)
+        except Exception as e:
+            self.failed += 1
+            print(f"Scheduled recommendation for {key} failed:", e)
+            delay = self.retry_seconds
+        else:
+            self.refreshed += 1
+            delay = self.recheck_in(result)
+        finally:
+            room["refreshing"] = False
+            self._semaphore.release()
+
+        if self._rooms.get(key) is room:
+            # Readings pushed mid-refresh are computed now, otherwise at RECHECK_AT
+            self._schedule(key, 0.0 if room.pop("pushed", False) else delay)
+
+    async def _next_due(self):
+        """Pop the earliest live heap entry once it is due; None when woken early."""
+        while self._heap:
+            due, _seq, key = self._heap[0]
+            room = self._rooms.get(key)
+            if room is None or room["due"] != due:
+                heapq.heappop(self._heap)  # superseded or forgotten
+                continue
+            delay = due - time.time()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                return None
+            heapq.heappop(self._heap)
+            return key
+        self._wakeup.clear()
+        await self._wakeup.wait()
+        return None
+
+    async def run(self):
+        current_user.set(None)  # background refreshes only count against the model quota
+        while True:
+            key = await self._next_due()
+            if key is None:
+                continue
+            room = self._rooms[key]
+            if time.time() - room["last_seen"] > self.room_ttl:
+                self.expired += 1
+                self.forget(key)
+                continue
+
+            room["due"] = None
+            room["refreshing"] = True
+            await self._pace()
+            await self._semaphore.acquire()
+            worker = asyncio.create_task(self._refresh(key, room, room["inputs"]))
+            self._workers.add(worker)
+            worker.add_done_callback(self._workers.discard)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        tasks = [t for t in [self._task, *self._workers] if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    def stats(self) -> dict:
+        now = time.time()
+        dues = [room["due"] for room in self._rooms.values() if room["due"] is not None]
+        return {
+            "enabled": SCHEDULER_ENABLED,
+            "running_here": self._task is not None,
+            "rooms": len(self._rooms),
+            "queued": len(dues),
+            "refreshing": sum(room["refreshing"] for room in self._rooms.values()),
+            "running": len(self._workers),
+            "next_due_in": round(min(dues) - now, 1) if dues else None,
+            "refreshed": self.refreshed,
+            "failed": self.failed,
+            "expired_rooms": self.expired,
+        }
+
+
+recommendation_scheduler = RecommendationScheduler()
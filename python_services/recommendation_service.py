@@ -0,0 +1,315 @@
+# python_services/recommendation_service.py
+"""
+Recommendation pipeline shared by /ai/recommend and /ai/recommend/batch:
+normalize → rules → cache → prompt → Gemini → parse → cache.
+"""
+import os
+import asyncio
+
+from pydantic import TypeAdapter, ValidationError
+
+from ai_client import get_ai_recommendation, get_ai_batch_recommendation
+from data_samples import prepare_environment_data
+from fast_json import extract_json
+from metrics import stage
+from prompt_builder import build_prompt_parts, build_batch_prompt
+from recommendation_cache import recommendation_cache, make_cache_key
+from rules import rule_based_recommendation
+from schemas import create_appliance_schema, appliance_list_adapter
+from resilience import CircuitOpenError, ServiceUnavailableError
+from single_flight import SingleFlight
+from room_state import room_states, room_state_key
+from trend_features import trend_store, trend_signature
+
+# Deterministic rules answer clear-cut readings without calling Gemini
+RULES_FAST_PATH = os.getenv("RULES_FAST_PATH", "1") != "0"
+
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", 8))
+BATCH_PACK_SIZE = int(os.getenv("BATCH_PACK_SIZE", 5))
+
+
+# Identical in-flight recommendation calls share one Gemini request
+recommendation_flight = SingleFlight()
+
+
+class RecommendationError(Exception):
+    """Pipeline failure that maps onto an HTTP status."""
+
+    def __init__(self, message: str, status_code: int = 500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def answer(recommendation, source: str) -> dict:
+    return {"success": True, "recommendation": recommendation, "source": source}
+
+
+def error_result(error: Exception) -> dict:
+    """Per-item error payload used by the batch endpoint; statuses match /ai/recommend."""
+    result = {
+        "success": False,
+        "error": str(error),
+        "status_code": getattr(error, "status_code", 500),
+    }
+    if isinstance(error, ServiceUnavailableError):
+        result["retry_after"] = error.retry_after
+    return result
+
+
+def _validate(validator, data, from_json: bool):
+    """Validate with the cached appliance model (one answer) or list adapter (batch)."""
+    if isinstance(validator, TypeAdapter):
+        value = validator.validate_json(data) if from_json else validator.validate_python(data)
+        return validator.dump_python(value, mode="json")
+    value = validator.model_validate_json(data) if from_json else validator.model_validate(data)
+    return value.model_dump(mode="json")
+
+
+def parse_ai_response(ai_response, validator=None):
+    """
+    Structured answer from Gemini's JSON text. With a `validator` the text is
+    parsed and validated in one pass (model_validate_json); output that is not
+    clean JSON (fences, prose, truncation) goes through extract_json first.
+    Answers that fail validation are returned unvalidated, unparseable text as-is.
+    """
+    if not ai_response:
+        raise RecommendationError("AI service returned no response")
+    with stage("parse"):
+        if not isinstance(ai_response, str):
+            return ai_response  # already structured
+        if validator is not None:
+            try:
+                return _validate(validator, ai_response, from_json=True)
+            except ValidationError:
+                pass
+        try:
+            data = extract_json(ai_response)
+        except ValueError:
+            return ai_response
+        if validator is not None:
+            try:
+                return _validate(validator, data, from_json=False)
+            except ValidationError:
+                pass
+        return data
+
+
+async def remember(cache_key: str, ai_data):
+    """Only structured answers are cached; never outlive the model's own RECHECK_AT."""
+    if not isinstance(ai_data, dict):
+        return
+    ttl = None
+    if isinstance(ai_data.get("RECHECK_AT"), int) and ai_data["RECHECK_AT"] > 0:
+        ttl = min(ai_data["RECHECK_AT"] * 60, recommendation_cache.ttl_seconds)
+    await recommendation_cache.aset(cache_key, ai_data, ttl_seconds=ttl)
+
+
+def degraded_answer(env: tuple, cache_key: str):
+    """
+    Best answer available without Gemini: an expired cache entry for the same
+    bucketed readings, otherwise a best-effort rule-based recommendation.
+    """
+    room_info, appliances, user_info, indoor_pollutants, outdoor_pollutants = env
+
+    stale = recommendation_cache.get_stale(cache_key)
+    if stale is not None:
+        result = answer(stale, "stale_cache")
+    else:
+        rule_data = rule_based_recommendation(
+            appliances, indoor_pollutants, outdoor_pollutants, best_effort=True
+        )
+        if rule_data is None:
+            return None
+        result = answer(rule_data, "rules_fallback")
+    result["degraded"] = True
+    return result
+
+
+async def fast_answer(env: tuple, cache_key: str):
+    """Rule engine first, then the cache. Returns None when Gemini is needed."""
+    room_info, appliances, user_info, indoor_pollutants, outdoor_pollutants = env
+
+    if RULES_FAST_PATH:
+        rule_data = rule_based_recommendation(appliances, indoor_pollutants, outdoor_pollutants)
+        if rule_data is not None:
+            return answer(rule_data, "rules")
+
+    cached = await recommendation_cache.aget(cache_key)
+    if cached is not None:
+        return answer(cached, "cache")
+    return None
+
+
+async def recommend_env(env: tuple, cache_key: str, trends: dict | None = None) -> dict:
+    """Full pipeline for one already-normalized input."""
+    fast = await fast_answer(env, cache_key)
+    if fast is not None:
+        return fast
+
+    return await recommendation_flight.do(cache_key, lambda: _ask_ai(env, cache_key, trends))
+
+
+async def _ask_ai(env: tuple, cache_key: str, trends: dict | None = None) -> dict:
+    room_info, appliances, user_info, indoor_pollutants, outdoor_pollutants = env
+
+    # Build prompt (static prefix is reused through Gemini context caching)
+    with stage("build_prompt"):
+        static_prefix, prompt = build_prompt_parts(
+            room_info=room_info,
+            appliances=appliances,
+            user_info=user_info,
+            indoor_pollutants=indoor_pollutants,
+            outdoor_pollutants=outdoor_pollutants,
+            trends=trends,
+        )
+
+    # Send to Gemini; while the breaker is open or after retries are exhausted, degrade gracefully
+    try:
+        ai_response = await get_ai_recommendation(prompt, appliances, static_prefix=static_prefix)
+    except CircuitOpenError:
+        degraded = degraded_answer(env, cache_key)
+        if degraded is None:
+            raise
+        return degraded
+    if not ai_response:
+        degraded = degraded_answer(env, cache_key)
+        if degraded is not None:
+            return degraded
+
+    ai_data = parse_ai_response(ai_response, create_appliance_schema(appliances))
+    await remember(cache_key, ai_data)
+    return answer(ai_data, "ai")
+
+
+def normalize(user, room, indoor, outdoor, trends=None):
+    """Normalize raw documents and compute their content-addressed key."""
+    with stage("prepare_environment_data"):
+        try:
+            env = prepare_environment_data(user, room, indoor, outdoor)
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            raise RecommendationError(f"Invalid room or reading data: {e}", 422) from e
+    with stage("cache_key"):
+        return env, make_cache_key(*env, trends=trend_signature(trends))
+
+
+def summarize_trends(state_key, history, indoor):
+    """Compact trend summary of recent raw Node documents (oldest first), or None."""
+    if not history:
+        return None
+    with stage("trends"):
+        return trend_store.summarize(state_key, history, indoor)
+
+
+async def recommend(user, room, indoor, outdoor, history=None) -> dict:
+    """
+    `history` is an optional list of recent raw Node documents (oldest first);
+    it is reduced to a compact trend summary for the prompt.
+    """
+    state_key = room_state_key(user, room)
+    trends = summarize_trends(state_key, history, indoor)
+
+    env, cache_key = normalize(user, room, indoor, outdoor, trends)
+    signature = trend_signature(trends)
+
+    # Nothing meaningful changed for this room since the last answer → reuse it
+    if state_key:
+        stored = room_states.lookup(state_key, env, signature)
+        if stored is not None:
+            recommendation, stale_age, delta = stored
+            result = answer(recommendation, "state")
+            result["stale_age"] = round(stale_age, 1)
+            result["delta"] = round(delta, 3)
+            return result
+
+    result = await recommend_env(env, cache_key, trends)
+    if state_key and not result.get("degraded"):  # a fallback answer must not be reused as state
+        room_states.update(state_key, env, result["recommendation"], signature)
+    return result
+
+
+# ----------------------------
+# 📦 Batch
+# ----------------------------
+async def _packed(group: list, results: dict):
+    """One Gemini call for several rooms sharing the same appliance set."""
+    envs = [env for _key, env, _trends in group]
+    appliances = envs[0][1]
+    prompt = build_batch_prompt(envs, [trends for _key, _env, trends in group])
+    ai_response = await get_ai_batch_recommendation(prompt, appliances, len(envs))
+    ai_data = parse_ai_response(ai_response, appliance_list_adapter(appliances))
+
+    if not isinstance(ai_data, list) or len(ai_data) != len(envs):
+        raise RecommendationError("AI service returned a malformed batch response", 502)
+
+    for (cache_key, _env, _trends), item in zip(group, ai_data):
+        await remember(cache_key, item)
+        results[cache_key] = answer(item, "ai")
+
+
+async def recommend_batch(items: list, max_concurrency: int = BATCH_MAX_CONCURRENCY,
+                          pack: bool = False, pack_size: int = BATCH_PACK_SIZE) -> list:
+    """
+    Recommendations for many rooms, returned in request order. Items are
+    (user, room, indoor, outdoor[, history]) like the arguments of recommend().
+    Identical normalized inputs share one result; the rest run concurrently
+    (or packed several rooms per Gemini call) under `max_concurrency`.
+    """
+    max_concurrency = max(1, max_concurrency)
+    pack_size = max(1, pack_size)
+    keys = []
+    unique = {}  # cache_key -> (env, trends), in first-seen order
+    failures = {}
+
+    for index, (user, room, indoor, outdoor, *history) in enumerate(items):
+        try:
+            trends = summarize_trends(room_state_key(user, room), history[0] if history else None, indoor)
+            env, cache_key = normalize(user, room, indoor, outdoor, trends)
+        except Exception as e:
+            keys.append(None)
+            failures[index] = error_result(e)
+            continue
+        keys.append(cache_key)
+        unique.setdefault(cache_key, (env, trends))
+
+    results = {}
+    pending = {}
+    for cache_key, (env, trends) in unique.items():
+        fast = await fast_answer(env, cache_key)
+        if fast is not None:
+            results[cache_key] = fast
+        else:
+            pending[cache_key] = (env, trends)
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(job, job_keys):
+        async with semaphore:
+            try:
+                await job
+            except Exception as e:  # quota/overload keep their 429/503 and Retry-After
+                for cache_key in job_keys:
+                    results[cache_key] = error_result(e)
+
+    async def single(cache_key, env, trends):
+        results[cache_key] = await recommend_env(env, cache_key, trends)
+
+    jobs = []
+    if pack:
+        groups = {}
+        for cache_key, (env, trends) in pending.items():
+            signature = tuple(sorted(k for k, v in env[1].items() if v))
+            groups.setdefault(signature, []).append((cache_key, env, trends))
+        for group in groups.values():
+            for start in range(0, len(group), pack_size):
+                chunk = group[start:start + pack_size]
+                jobs.append(run(_packed(chunk, results), [k for k, _env, _trends in chunk]))
+    else:
+        for cache_key, (env, trends) in pending.items():
+            jobs.append(run(single(cache_key, env, trends), [cache_key]))
+
+    await asyncio.gather(*jobs)
+
+    return [
+        failures[index] if cache_key is None else results[cache_key]
+        for index, cache_key in enumerate(keys)
+    ]
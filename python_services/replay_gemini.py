@@ -0,0 +1,362 @@
+# python_services/replay_gemini.py
+"""
+Record/replay Gemini backend for deterministic offline benchmarks and regression runs.
+
+    GEMINI_BACKEND=record   wraps the real client and appends every call
+                            (prompt key, response text or stream chunks,
+                            latency, usage_metadata, API errors) to the store
+    GEMINI_BACKEND=replay   answers from the store without network or quota
+
+The store is an append-only JSONL file (GEMINI_REPLAY_FILE) plus a JSON index
+sidecar (<file>.idx: key -> byte offsets), so replay seeks straight to the
+recorded lines instead of loading every response. Several workers may record
+into the same file; each rebuilds the sidecar from the whole file when it
+closes, and a sidecar that does not cover the file exactly is ignored.
+
+Requests are keyed by model, config and the full prompt text. A cached-content
+handle is resolved to the static prefix it was created from, so a call sent as
+cached prefix + dynamic part and the same call sent inline get the same key.
+Calls repeated with the same key replay their recordings in order (wrapping
+around). Tuning:
+    GEMINI_REPLAY_TIMING   "original" (sleep recorded latencies) | "fast"
+    GEMINI_REPLAY_MISS     "error" (ReplayMissError) | "fake" (FakeGeminiClient answers)
+    GEMINI_RECORD_BACKEND  backend being recorded (default "gemini")
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import itertools
+from types import SimpleNamespace
+
+from fast_json import dumps, loads
+
+REPLAY_FILE = os.getenv("GEMINI_REPLAY_FILE", "recordings/gemini.jsonl")
+REPLAY_TIMING = os.getenv("GEMINI_REPLAY_TIMING", "original").lower()
+REPLAY_MISS = os.getenv("GEMINI_REPLAY_MISS", "error").lower()
+
+USAGE_FIELDS = ("prompt_token_count", "candidates_token_count", "cached_content_token_count", "total_token_count")
+
+
+class ReplayMissError(LookupError):
+    """No recording exists for this request."""
+
+
+# ----------------------------
+# 🗃️ Store
+# ----------------------------
+class ReplayStore:
+    """Append-only JSONL of call records with a key -> byte offsets index."""
+
+    def __init__(self, path: str = REPLAY_FILE):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.index = {}
+        self._cursors = {}
+        self._reader = None
+        self._writer = None
+        self._load_index()
+
+    def _scan(self):
+        """Index every complete line of the log; returns (offsets, bytes covered)."""
+        index = {}
+        offset = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # another worker is still writing this record
+                if line.strip():
+                    index.setdefault(loads(line)["key"], []).append(offset)
+                offset += len(line)
+        return index, offset
+
+    def _load_index(self):
+        if not os.path.exists(self.path):
+            return
+        size = os.path.getsize(self.path)
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "rb") as f:
+                saved = loads(f.read())
+            if saved.get("size") == size:
+                self.index = saved["offsets"]
+                return
+        # Missing or stale sidecar (interrupted recording, or a worker still appending): rebuild from the log
+        self.index, _size = self._scan()
+
+    def append(self, record: dict):
+        if self._writer is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._writer = open(self.path, "ab")
+        offset = self._writer.tell()
+        self._writer.write(dumps(record) + b"\n")
+        self._writer.flush()
+        self.index.setdefault(record["key"], []).append(offset)
+
+    def next(self, key: str):
+        """Next recording for `key` (cycling through repeats), or None."""
+        offsets = self.index.get(key)
+        if not offsets:
+            return None
+        position = self._cursors.get(key, 0)
+        self._cursors[key] = position + 1
+        if self._reader is None:
+            self._reader = open(self.path, "rb")
+        self._reader.seek(offsets[position % len(offsets)])
+        return loads(self._reader.readline())
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            # Other workers may have appended to the same file: index all of it, not just our records
+            self.index, size = self._scan()
+            partial = f"{self.index_path}.{os.getpid()}"
+            with open(partial, "wb") as f:
+                f.write(dumps({"size": size, "offsets": self.index}))
+            os.replace(partial, self.index_path)
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def stats(self) -> dict:
+        return {"path": self.path, "keys": len(self.index), "records": sum(map(len, self.index.values()))}
+
+
+# ----------------------------
+# 🔑 Request keys
+# ----------------------------
+def _system_text(config) -> str:
+    text = config.get("system_instruction") if isinstance(config, dict) else getattr(config, "system_instruction", None)
+    return text if isinstance(text, str) else ""
+
+
+class _Handles:
+    """Cached-content handle -> the static text it was created from."""
+
+    def __init__(self):
+        self.texts = {}
+
+    def request_key(self, model: str, contents, config) -> str:
+        config = dict(config or {})
+        handle = config.pop("cached_content", None)
+        prefix = self.texts.get(handle, "") if handle else ""
+        prompt = contents if isinstance(contents, str) else json.dumps(contents, sort_keys=True, default=str)
+        canonical = json.dumps([model, config, prefix + prompt], sort_keys=True, default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _usage_dict(usage):
+    if usage is None:
+        return None
+    return {field: getattr(usage, field, None) for field in USAGE_FIELDS}
+
+
+def _usage(recorded):
+    return SimpleNamespace(**recorded) if recorded else None
+
+
+def _error_dict(error: BaseException):
+    code = getattr(error, "code", None)
+    if not isinstance(code, int):
+        return None  # transport errors and timeouts are not replayed
+    return {"code": code, "message": getattr(error, "message", None) or str(error)}
+
+
+def _raise_recorded(error: dict):
+    from google.genai import errors as genai_errors  # the SDK's own error types, as upstream raises them
+
+    cls = genai_errors.ServerError if error["code"] >= 500 else genai_errors.ClientError
+    raise cls(error["code"], {"error": {"code": error["code"], "message": error["message"], "status": "REPLAYED"}})
+
+
+# ----------------------------
+# ⏺️ Recording
+# ----------------------------
+class _RecordingModels:
+    def __init__(self, recorder):
+        self._recorder = recorder
+
+    async def generate_content(self, *, model, contents, config=None):
+        recorder = self._recorder
+        key = recorder.handles.request_key(model, contents, config)
+        started = time.perf_counter()
+        try:
+            response = await recorder.inner.aio.models.generate_content(model=model, contents=contents, config=config)
+        except Exception as e:
+            if _error_dict(e) is not None:
+                recorder.record(key, model, "generate", time.perf_counter() - started, error=_error_dict(e))
+            raise
+        recorder.record(key, model, "generate", time.perf_counter() - started,
+                        text=response.text, usage=_usage_dict(getattr(response, "usage_metadata", None)))
+        return response
+
+    async def generate_content_stream(self, *, model, contents, config=None):
+        recorder = self._recorder
+        key = recorder.handles.request_key(model, contents, config)
+        started = time.perf_counter()
+        try:
+            stream = await recorder.inner.aio.models.generate_content_stream(model=model, contents=contents, config=config)
+        except Exception as e:
+            if _error_dict(e) is not None:
+                recorder.record(key, model, "stream", time.perf_counter() - started, error=_error_dict(e))
+            raise
+        latency = time.perf_counter() - started
+
+        async def chunks():
+            recorded, usage, complete = [], None, False
+            try:
+                async for chunk in stream:
+                    recorded.append([round(time.perf_counter() - started - latency, 4), chunk.text or ""])
+                    usage = getattr(chunk, "usage_metadata", None) or usage
+                    yield chunk
+                complete = True
+            finally:
+                await stream.aclose()
+                if complete:  # abandoned streams would replay as truncated answers
+                    recorder.record(key, model, "stream", latency, chunks=recorded, usage=_usage_dict(usage))
+
+        return chunks()
+
+
+class _RecordingCaches:
+    def __init__(self, recorder):
+        self._recorder = recorder
+
+    async def create(self, *, model, config=None):
+        cached = await self._recorder.inner.aio.caches.create(model=model, config=config)
+        self._recorder.handles.texts[cached.name] = _system_text(config)
+        return cached
+
+    async def update(self, *, name, config=None):
+        return await self._recorder.inner.aio.caches.update(name=name, config=config)
+
+    async def delete(self, *, name):
+        self._recorder.handles.texts.pop(name, None)
+        return await self._recorder.inner.aio.caches.delete(name=name)
+
+
+class RecordingClient:
+    """Wraps a genai.Client-compatible client and records every generate call."""
+
+    def __init__(self, inner, store: ReplayStore):
+        self.inner = inner
+        self.store = store
+        self.handles = _Handles()
+        self.recorded = 0
+        self.aio = SimpleNamespace(models=_RecordingModels(self), caches=_RecordingCaches(self), aclose=self._aclose)
+
+    def record(self, key, model, kind, latency, text=None, chunks=None, usage=None, error=None):
+        record = {"key": key, "model": model, "kind": kind, "latency": round(latency, 4)}
+        for name, value in (("text", text), ("chunks", chunks), ("usage", usage), ("error", error)):
+            if value is not None:
+                record[name] = value
+        self.store.append(record)
+        self.recorded += 1
+
+    async def _aclose(self):
+        self.store.close()
+        await self.inner.aio.aclose()
+
+    def stats(self) -> dict:
+        return {**self.store.stats(), "recorded": self.recorded}
+
+
+# ----------------------------
+# ▶️ Replay
+# ----------------------------
+class _ReplayModels:
+    def __init__(self, replay):
+        self._replay = replay
+
+    async def generate_content(self, *, model, contents, config=None):
+        replay = self._replay
+        record = replay.lookup(model, contents, config)
+        if record is None:
+            return await replay.fallback().aio.models.generate_content(model=model, contents=contents, config=config)
+        await replay.sleep(record["latency"])
+        if "error" in record:
+            _raise_recorded(record["error"])
+        text = record.get("text")
+        if text is None:  # recorded as a stream
+            text = "".join(part for _offset, part in record.get("chunks", []))
+        return SimpleNamespace(text=text, usage_metadata=_usage(record.get("usage")))
+
+    async def generate_content_stream(self, *, model, contents, config=None):
+        replay = self._replay
+        record = replay.lookup(model, contents, config)
+        if record is None:
+            return await replay.fallback().aio.models.generate_content_stream(model=model, contents=contents, config=config)
+        await replay.sleep(record["latency"])
+        if "error" in record:
+            _raise_recorded(record["error"])
+        parts = record.get("chunks") or [[0.0, record.get("text") or ""]]
+
+        async def chunks():
+            previous = 0.0
+            for i, (offset, text) in enumerate(parts):
+                await replay.sleep(offset - previous)
+                previous = offset
+                last = i == len(parts) - 1
+                yield SimpleNamespace(text=text, usage_metadata=_usage(record.get("usage")) if last else None)
+
+        return chunks()
+
+
+class _ReplayCaches:
+    def __init__(self, replay):
+        self._replay = replay
+        self._ids = itertools.count(1)
+
+    async def create(self, *, model, config=None):
+        name = f"cachedContents/replay-{next(self._ids)}"
+        self._replay.handles.texts[name] = _system_text(config)
+        return SimpleNamespace(name=name)
+
+    async def update(self, *, name, config=None):
+        return SimpleNamespace(name=name)
+
+    async def delete(self, *, name):
+        self._replay.handles.texts.pop(name, None)
+
+
+class ReplayClient:
+    """Drop-in for genai.Client that answers from a ReplayStore."""
+
+    def __init__(self, store: ReplayStore, timing: str = REPLAY_TIMING, miss: str = REPLAY_MISS):
+        if timing not in ("original", "fast"):
+            raise ValueError(f"Unknown GEMINI_REPLAY_TIMING '{timing}', expected 'original' or 'fast'")
+        self.store = store
+        self.timing = timing
+        self.miss = miss
+        self.handles = _Handles()
+        self.hits = 0
+        self.misses = 0
+        self._fake = None
+        self.aio = SimpleNamespace(models=_ReplayModels(self), caches=_ReplayCaches(self), aclose=self._aclose)
+
+    def lookup(self, model, contents, config):
+        record = self.store.next(self.handles.request_key(model, contents, config))
+        if record is not None:
+            self.hits += 1
+            return record
+        self.misses += 1
+        if self.miss != "fake":
+            raise ReplayMissError(f"No recording for this {model} request in {self.store.path}")
+        return None
+
+    def fallback(self):
+        if self._fake is None:
+            from fake_gemini import FakeGeminiClient
+            self._fake = FakeGeminiClient()
+        return self._fake
+
+    async def sleep(self, seconds: float):
+        if self.timing == "original" and seconds > 0:
+            await asyncio.sleep(seconds)
+
+    async def _aclose(self):
+        self.store.close()
+
+    def stats(self) -> dict:
+        return {**self.store.stats(), "timing": self.timing, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,230 @@
+# python_services/resilience.py
+"""
+Resilience layer around Gemini calls:
+- per-call deadline,
+- jittered exponential retry on retryable errors (timeouts, 429, 5xx, network),
+- optional hedged second request once the first is slower than the observed p95,
+- a circuit breaker that fails fast while the upstream is unhealthy; only
+  retryable errors count as failures, so bad requests cannot trip it.
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+from collections import deque
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class ServiceUnavailableError(Exception):
+    """Upstream cannot take the call right now; maps onto an HTTP status with Retry-After."""
+
+    def __init__(self, message: str, status_code: int = 503, retry_after: int = 1):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(ServiceUnavailableError):
+    """Raised without calling upstream while the breaker is open."""
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    # Only a loaded SDK can have raised its own errors; avoids importing it here
+    genai_errors = sys.modules.get("google.genai.errors")
+    if genai_errors is not None and isinstance(error, genai_errors.APIError):
+        return error.code in RETRYABLE_STATUS
+    # httpx/aiohttp transport errors surface as OSError subclasses or carry a status code
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS
+    return isinstance(error, OSError)
+
+
+class CircuitBreaker:
+    """
+    closed → open after `failure_threshold` consecutive failures;
+    open → half-open after `reset_timeout` seconds, letting one probe through;
+    half-open → closed on success, open again on failure.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self.trips = 0
+        self._probe_in_flight = False
+
+    def before_call(self):
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                raise CircuitOpenError("Gemini circuit breaker is open", retry_after=self.retry_after())
+            self.state = "half_open"
+            self._probe_in_flight = False
+        if self.state == "half_open":
+            if self._probe_in_flight:
+                self.rejected += 1
+                raise CircuitOpenError("Gemini circuit breaker is probing", retry_after=1)
+            self._probe_in_flight = True
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def release(self):
+        """The call ended without telling anything about upstream health (cancelled, rejected as invalid)."""
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.trips += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def retry_after(self) -> int:
+        remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+        return max(1, int(remaining + 0.999))
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
+
+
+class LatencyTracker:
+    """Sliding window of successful call latencies, used to pick the hedging delay."""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, q: float):
+        if len(self._samples) < 20:
+            return None  # not enough data to hedge sensibly
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ResiliencePolicy:
+    def __init__(self, deadline: float = 30.0, max_retries: int = 2, backoff_base: float = 0.5,
+                 backoff_max: float = 8.0, hedge: bool = False, hedge_quantile: float = 0.95,
+                 breaker: CircuitBreaker | None = None):
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.timeouts = 0
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def _attempt(self, fn):
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(fn(), timeout=self.deadline)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        self.latency.add(time.monotonic() - started)
+        return result
+
+    async def _hedged(self, fn):
+        delay = self.latency.percentile(self.hedge_quantile) if self.hedge else None
+        if delay is None:
+            return await self._attempt(fn)
+
+        first = asyncio.ensure_future(self._attempt(fn))
+        attempts = [first]
+        try:
+            done, _ = await asyncio.wait({first}, timeout=delay)
+            if done:
+                return first.result()
+
+            self.hedges += 1
+            second = asyncio.ensure_future(self._attempt(fn))
+            attempts.append(second)
+            pending = {first, second}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # The loser, or every attempt when our caller is cancelled
+            for task in attempts:
+                if not task.done():
+                    task.cancel()
+
+    async def call(self, fn):
+        """Run `fn()` (a coroutine factory) with deadline, retries, hedging and the breaker."""
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            try:
+                result = await self._hedged(fn)
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    # The upstream answered (4xx) or the call never reached it: not a health signal
+                    self.breaker.release()
+                    raise
+                self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    raise
+                self.retries += 1
+                await asyncio.sleep(self.backoff(attempt))
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+    def stats(self) -> dict:
+        return {
+            "breaker": self.breaker.stats(),
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "p95_ms": (self.latency.percentile(0.95) or 0) * 1000,
+        }
+
+
+def policy_from_env(prefix: str, breaker: CircuitBreaker) -> ResiliencePolicy:
+    return ResiliencePolicy(
+        deadline=float(os.getenv(f"{prefix}_DEADLINE", 30)),
+        max_retries=int(os.getenv(f"{prefix}_MAX_RETRIES", 2)),
+        backoff_base=float(os.getenv("GEMINI_RETRY_BACKOFF", 0.5)),
+        hedge=os.getenv(f"{prefix}_HEDGE", "0") == "1",
+        breaker=breaker,
+    )
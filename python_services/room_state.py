@@ -0,0 +1,152 @@
+# python_services/room_state.py
+"""
+Per-(user, room) recommendation state with change detection.
+
+Keeps the last normalized inputs and recommendation for each room. When the
+new readings are within a small delta of the stored ones, the trend signature
+is unchanged and the model's RECHECK_AT has not elapsed yet, the stored
+recommendation is reused as is.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Change in each reading that counts as "one unit" of delta
+INDOOR_SCALES = {
+    "temperature": 1.0,   # °C
+    "humidity": 10,       # %
+    "pm1": 10,            # µg/m³
+    "pm2_5": 10,          # µg/m³
+    "pm10": 15,           # µg/m³
+    "co": 2,              # ppm
+    "voc": 1.0,           # index
+    "co2": 150,           # ppm
+}
+
+OUTDOOR_SCALES = {
+    "pm2_5": 15,
+    "pm10": 20,
+    "temperature_2m": 2.0,
+    "relative_humidity_2m": 15,
+    "wind_speed_10m": 5,
+    "rain": 1.0,
+    "is_day": 1,
+}
+
+DELTA_THRESHOLD = float(os.getenv("ROOM_STATE_DELTA_THRESHOLD", 1.0))
+MAX_ROOMS = int(os.getenv("ROOM_STATE_MAX_ROOMS", 10000))
+
+
+def room_state_key(raw_user: dict, raw_room: dict):
+    """(user id, room id) from the raw Mongo documents, or None if either is unknown."""
+    user_id = (raw_user or {}).get("_id") or (raw_user or {}).get("email")
+    room_id = (raw_room or {}).get("_id")
+    if not user_id or not room_id:
+        return None
+    return str(user_id), str(room_id)
+
+
+def _fingerprint(room_info, appliances, user_info, trends=None) -> str:
+    """
+    Hash of everything except sensor readings (trends as their coarse signature);
+    any change forces a fresh recommendation.
+    """
+    payload = json.dumps([room_info, appliances, user_info, trends or {}], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return value
+
+
+def delta_score(old: dict, new: dict, scales: dict) -> float:
+    """Largest scaled change across the tracked readings (appearing/disappearing counts as a change)."""
+    score = 0.0
+    for field, scale in scales.items():
+        before, after = _number((old or {}).get(field)), _number((new or {}).get(field))
+        if before is None and after is None:
+            continue
+        if before is None or after is None:
+            return float("inf")
+        score = max(score, abs(after - before) / scale)
+    return score
+
+
+class RoomStateStore:
+    def __init__(self, threshold: float = DELTA_THRESHOLD, max_rooms: int = MAX_ROOMS):
+        self.threshold = threshold
+        self.max_rooms = max_rooms
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.changed = 0
+        self.expired = 0
+
+    def lookup(self, key, env: tuple, trends: dict | None = None):
+        """
+        Return (recommendation, stale_age_seconds, delta) when nothing meaningful
+        changed, else None. `trends` is the trend_signature of the request.
+        """
+        room_info, appliances, user_info, indoor_pollutants, outdoor_pollutants = env
+        with self._lock:
+            state = self._states.get(key)
+        if state is None:
+            return None
+
+        now = time.time()
+        if now >= state["recheck_at"]:
+            self.expired += 1
+            return None
+        if state["fingerprint"] != _fingerprint(room_info, appliances, user_info, trends):
+            self.changed += 1
+            return None
+
+        delta = max(
+            delta_score(state["indoor"], indoor_pollutants, INDOOR_SCALES),
+            delta_score(state["outdoor"], outdoor_pollutants, OUTDOOR_SCALES),
+        )
+        if delta >= self.threshold:
+            self.changed += 1
+            return None
+
+        self.reused += 1
+        return state["recommendation"], now - state["updated_at"], delta
+
+    def update(self, key, env: tuple, recommendation, trends: dict | None = None):
+        if not isinstance(recommendation, dict):
+            return
+        room_info, appliances, user_info, indoor_pollutants, outdoor_pollutants = env
+        now = time.time()
+        recheck_minutes = recommendation.get("RECHECK_AT")
+        if not isinstance(recheck_minutes, int) or recheck_minutes <= 0:
+            recheck_minutes = 5
+        state = {
+            "fingerprint": _fingerprint(room_info, appliances, user_info, trends),
+            "indoor": dict(indoor_pollutants or {}),
+            "outdoor": dict(outdoor_pollutants or {}),
+            "recommendation": recommendation,
+            "updated_at": now,
+            "recheck_at": now + recheck_minutes * 60,
+        }
+        with self._lock:
+            self._states[key] = state
+            self._states.move_to_end(key)
+            while len(self._states) > self.max_rooms:
+                self._states.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "rooms": len(self._states),
+            "reused": self.reused,
+            "changed": self.changed,
+            "expired": self.expired,
+            "threshold": self.threshold,
+        }
+
+
+room_states = RoomStateStore()
@@ -0,0 +1,181 @@
+# python_services/rules.py
+"""
+Deterministic threshold rules for clear-cut readings.
+When the rules are decisive the service answers without calling Gemini;
+anything borderline or conflicting is left to the LLM.
+
+Rules are plain threshold tables evaluated with element-wise operators and `&`,
+with missing readings mapped to NaN, so the same tables work on scalars from
+`prepare_environment_data` or on NumPy columns for batch evaluation.
+"""
+import operator
+from schemas import APPLIANCE_KEYS, create_appliance_schema
+
+NAN = float("nan")
+
+OPS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+# Schema fields controlled by each appliance
+APPLIANCE_FIELDS = {
+    "AC": ("AC_MODE", "AC_TEMPERATURE"),
+    "CEILING_FAN": ("CEILING_FAN",),
+    "EXHAUST_FAN": ("EXHAUST_FAN",),
+    "WINDOW": ("WINDOW",),
+    "DOOR": ("DOOR",),
+}
+
+# Each axis owns a set of appliances; exactly one rule per relevant axis must fire
+AXES = {
+    "thermal": ("AC", "CEILING_FAN"),
+    "air": ("WINDOW", "DOOR", "EXHAUST_FAN"),
+}
+
+# ----------------------------
+# 📋 Rule tables
+# (name, axis, conditions [(source, field, op, threshold)], actions, recheck minutes, reason)
+# ----------------------------
+RULES = [
+    (
+        "hot", "thermal",
+        [("indoor", "temperature", ">=", 30)],
+        {"AC_MODE": "COOL", "AC_TEMPERATURE": 24, "CEILING_FAN": 3},
+        10, "Indoor temperature is very high, so cooling is needed.",
+    ),
+    (
+        "comfortable", "thermal",
+        [("indoor", "temperature", ">=", 21), ("indoor", "temperature", "<=", 26),
+         ("indoor", "humidity", "<=", 70)],
+        {"AC_MODE": "OFF", "AC_TEMPERATURE": 24, "CEILING_FAN": 1},
+        30, "Temperature and humidity are already comfortable, so the AC stays off.",
+    ),
+    (
+        "cold", "thermal",
+        [("indoor", "temperature", "<=", 18)],
+        {"AC_MODE": "OFF", "AC_TEMPERATURE": 24, "CEILING_FAN": 0},
+        20, "The room is cold, so cooling and fans are switched off.",
+    ),
+    (
+        "ventilate", "air",
+        [("indoor", "co2", ">=", 1500), ("outdoor", "pm2_5", "<", 35)],
+        {"WINDOW": "OPEN", "EXHAUST_FAN": "ON", "DOOR": "CLOSED"},
+        10, "CO2 is high and outdoor air is clean, so the room is ventilated.",
+    ),
+    (
+        "seal", "air",
+        [("outdoor", "pm2_5", ">=", 55), ("indoor", "co2", "<", 1000)],
+        {"WINDOW": "CLOSED", "EXHAUST_FAN": "OFF", "DOOR": "CLOSED"},
+        15, "Outdoor PM2.5 is poor while indoor CO2 is fine, so the room is kept closed.",
+    ),
+    (
+        "fresh", "air",
+        [("indoor", "co2", "<", 800), ("indoor", "pm2_5", "<", 25), ("outdoor", "pm2_5", "<", 55)],
+        {"WINDOW": "CLOSED", "EXHAUST_FAN": "OFF", "DOOR": "CLOSED"},
+        30, "Indoor air quality is good, so no extra ventilation is needed.",
+    ),
+]
+
+# Conservative per-axis settings used only by the degraded (upstream unavailable) path
+SAFE_DEFAULTS = {
+    "thermal": (
+        {"AC_MODE": "FAN", "AC_TEMPERATURE": 26, "CEILING_FAN": 2},
+        10, "Gentle air movement is kept while conditions are re-checked soon.",
+    ),
+    "air": (
+        {"WINDOW": "CLOSED", "EXHAUST_FAN": "ON", "DOOR": "CLOSED"},
+        10, "The exhaust fan keeps air moving without letting outdoor pollutants in.",
+    ),
+}
+
+# Action combinations the rules must never emit together
+CONFLICTS = [
+    ({"AC_MODE": "COOL"}, {"WINDOW": "OPEN"}),
+]
+
+
+def _reading(readings: dict, field: str):
+    """Missing or non-numeric readings become NaN so every comparison is False."""
+    value = (readings or {}).get(field)
+    if value is None or isinstance(value, (bool, str)):
+        return NAN
+    return value
+
+
+def evaluate_rules(indoor_pollutants: dict, outdoor_pollutants: dict, rules=RULES):
+    """
+    Return a {rule_name: fired} map. Works element-wise, so readings may be
+    scalars or equally sized NumPy arrays.
+    """
+    sources = {"indoor": indoor_pollutants, "outdoor": outdoor_pollutants}
+    fired = {}
+    for name, _axis, conditions, _actions, _recheck, _reason in rules:
+        result = True
+        for source, field, op, threshold in conditions:
+            result = result & OPS[op](_reading(sources[source], field), threshold)
+        fired[name] = result
+    return fired
+
+
+def _conflicts(recommendation: dict) -> bool:
+    for left, right in CONFLICTS:
+        if all(recommendation.get(k) == v for k, v in left.items()) and \
+                all(recommendation.get(k) == v for k, v in right.items()):
+            return True
+    return False
+
+
+def rule_based_recommendation(appliances: dict, indoor_pollutants: dict, outdoor_pollutants: dict,
+                              rules=RULES, best_effort: bool = False):
+    """
+    Return a schema-valid recommendation dict when the rules are decisive,
+    otherwise None so the caller falls back to Gemini.
+    With `best_effort` (Gemini unavailable) an answer is always produced:
+    ambiguous axes use the first matching rule or SAFE_DEFAULTS, and
+    conflicting actions are resolved by keeping the window closed.
+    """
+    present = [key for key in APPLIANCE_KEYS if appliances.get(key)]
+    if not present:
+        return None
+
+    fired = evaluate_rules(indoor_pollutants, outdoor_pollutants, rules)
+    recommendation = {}
+    reasons = []
+    recheck = []
+
+    for axis, axis_appliances in AXES.items():
+        axis_present = [a for a in axis_appliances if a in present]
+        if not axis_present:
+            continue  # nothing to control on this axis
+
+        matches = [rule for rule in rules if rule[1] == axis and bool(fired[rule[0]])]
+        if len(matches) == 1 or (best_effort and matches):
+            _name, _axis, _conditions, actions, recheck_minutes, reason = matches[0]
+        elif best_effort:
+            actions, recheck_minutes, reason = SAFE_DEFAULTS[axis]
+        else:
+            return None  # borderline or ambiguous → let the LLM decide
+
+        for appliance in axis_present:
+            for field in APPLIANCE_FIELDS[appliance]:
+                if field not in actions:
+                    if not best_effort:
+                        return None
+                    actions = SAFE_DEFAULTS[axis][0]
+                recommendation[field] = actions[field]
+        reasons.append(reason)
+        recheck.append(recheck_minutes)
+
+    if _conflicts(recommendation):
+        if not best_effort:
+            return None
+        recommendation["WINDOW"] = "CLOSED"
+
+    recommendation["reason"] = " ".join(reasons)
+    recommendation["RECHECK_AT"] = min(recheck)
+
+    ApplianceSettings = create_appliance_schema(appliances)
+    return ApplianceSettings.model_validate(recommendation).model_dump(mode="json")
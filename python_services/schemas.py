@@ -1,8 +1,13 @@
 # python_services/schemas.py
 from enum import Enum
-from pydantic import BaseModel, Field, create_model
+from functools import lru_cache
+from itertools import combinations
+from pydantic import BaseModel, Field, TypeAdapter, create_model
 from typing import Type
 
+# Every appliance the recommendation schema knows about
+APPLIANCE_KEYS = ("AC", "CEILING_FAN", "EXHAUST_FAN", "WINDOW", "DOOR")
+
 class ACMode(str, Enum):
     OFF = "OFF"
     COOL = "COOL"
@@ -16,34 +21,87 @@ class ExhaustFanState(str, Enum):
     ON = "ON"
     OFF = "OFF"
 
-def create_appliance_schema(appliances: dict) -> Type[BaseModel]:
-    """Dynamically generate schema fields based on available appliances."""
+class AgentIntent(str, Enum):
+    CALL_NORMAL_CHAT = "CALL_NORMAL_CHAT"
+    CALL_RECOMMENDATION = "CALL_RECOMMENDATION"
+
+class AgentReply(BaseModel):
+    """Single-call agent answer: routing decision plus the chat reply."""
+    intent: AgentIntent
+    message: str = Field(description="Chat reply (empty when a recommendation is needed)")
+
+AGENT_REPLY_JSON_SCHEMA = AgentReply.model_json_schema()
+
+def appliance_signature(appliances: dict) -> frozenset:
+    """Frozen set of the appliances present in a room (one of 2^5 combinations)."""
+    return frozenset(key for key in APPLIANCE_KEYS if (appliances or {}).get(key))
+
+@lru_cache(maxsize=None)
+def _build_appliance_schema(present: frozenset) -> Type[BaseModel]:
+    """Generate schema fields for one combination of appliances."""
 
     fields = {
         "reason": (str, ...),
         "RECHECK_AT": (int, Field(description="Minutes to recheck recommendation")),
     }
 
-    if appliances.get("AC"):
+    if "AC" in present:
         fields["AC_MODE"] = (ACMode, ...)
         fields["AC_TEMPERATURE"] = (
             int,
             Field(ge=16, le=30, description="Valid range: 16–30°C"),
         )
 
-    if appliances.get("CEILING_FAN"):
+    if "CEILING_FAN" in present:
         fields["CEILING_FAN"] = (
             int,
             Field(ge=0, le=5, description="Valid speed: 0–5"),
         )
 
-    if appliances.get("WINDOW"):
+    if "WINDOW" in present:
         fields["WINDOW"] = (DoorWindowState, ...)
 
-    if appliances.get("DOOR"):
+    if "DOOR" in present:
         fields["DOOR"] = (DoorWindowState, ...)
 
-    if appliances.get("EXHAUST_FAN"):
+    if "EXHAUST_FAN" in present:
         fields["EXHAUST_FAN"] = (ExhaustFanState, ...)
 
     return create_model("DynamicApplianceSettings", **fields)
+
+@lru_cache(maxsize=None)
+def _build_json_schema(present: frozenset, many: bool) -> dict:
+    """JSON schema sent to Gemini, computed once per combination."""
+    model = _build_appliance_schema(present)
+    if many:
+        return TypeAdapter(list[model]).json_schema()
+    return model.model_json_schema()
+
+@lru_cache(maxsize=None)
+def _build_list_adapter(present: frozenset) -> TypeAdapter:
+    """Validator for packed batch answers (a JSON array of recommendations)."""
+    return TypeAdapter(list[_build_appliance_schema(present)])
+
+def create_appliance_schema(appliances: dict) -> Type[BaseModel]:
+    """Memoized schema for the available appliances (built at most once per combination)."""
+    return _build_appliance_schema(appliance_signature(appliances))
+
+def appliance_json_schema(appliances: dict, many: bool = False) -> dict:
+    """Precomputed JSON schema for one recommendation, or a list of them when `many`."""
+    return _build_json_schema(appliance_signature(appliances), many)
+
+def appliance_list_adapter(appliances: dict) -> TypeAdapter:
+    return _build_list_adapter(appliance_signature(appliances))
+
+def prebuild_schemas() -> int:
+    """Build every appliance combination up front (called at startup)."""
+    count = 0
+    for size in range(len(APPLIANCE_KEYS) + 1):
+        for present in combinations(APPLIANCE_KEYS, size):
+            present = frozenset(present)
+            _build_appliance_schema(present)
+            _build_json_schema(present, False)
+            _build_json_schema(present, True)
+            _build_list_adapter(present)
+            count += 1
+    return count
@@ -0,0 +1,263 @@
+# python_services/semantic_cache.py
+"""
+Semantic response cache for general /ai/agent chat questions.
+
+"what is PM2.5?", "What's PM 2.5" and "what is pm2.5 exactly" get the same
+Gemini answer. A lookup goes through two tiers:
+1. exact: the normalized text (lowercase, no punctuation, no stopwords) as a dict key,
+2. near-duplicate: cosine similarity of hashed word + char-n-gram embeddings,
+   brute-force over a NumPy matrix of all live entries (a few thousand rows,
+   well under a millisecond), accepted above SEMANTIC_CACHE_THRESHOLD when
+   numbers, negations and comparison/cause words match exactly ("is co2 of
+   800 ok" ≠ "... 1800 ok", "is a fan better ..." ≠ "is a fan worse ...") and,
+   if such a word is present, the shared words appear in the same order
+   ("is indoor air worse than outdoor air" ≠ "is outdoor air worse than
+   indoor air"). Bags of n-grams alone do not see word order.
+
+Only general questions are cached: messages about the user themselves (first
+person, contact details) or describing discomfort are never looked up or
+stored, and callers store chat answers only, never recommendation routes.
+Entries expire after SEMANTIC_CACHE_TTL and are evicted LRU. Without NumPy
+only the exact tier is used.
+"""
+import os
+import re
+import time
+import zlib
+from collections import OrderedDict
+
+import metrics
+from intent_classifier import DISCOMFORT_RE
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "1") != "0"
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", 2048))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", 6 * 3600))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.82))
+EMBEDDING_DIM = 256
+CHAR_NGRAM = 3
+
+STOPWORDS = frozenset(
+    "a an the is are was were be been am do does did of to in on at for by with about as "
+    "what whats what's which who how why when where can could would should will shall may might "
+    "tell me please explain exactly really just there it its it's this that these those and or "
+    "any some much many so".split()
+)
+NEGATIONS = frozenset("no not never nor without isnt isn't dont don't doesnt doesn't cant can't".split())
+# Words that give a question a direction: swapping what stands around them changes its meaning
+DIRECTIONAL = frozenset(
+    "than vs versus better worse more less higher lower safer healthier prefer instead over from into "
+    "before after cause causes caused causing affect affects affected increase increases reduce reduces "
+    "decrease decreases lead leads trigger triggers worsen worsens".split()
+)
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[.'][a-z0-9]+)*")
+# Messages about the user themselves (or carrying contact details) are not shared across users
+_PERSONAL = re.compile(
+    r"\b(i|i'm|im|i've|i'd|me|my|mine|myself|we|we're|our|us)\b"
+    r"|[\w.+-]+@[\w-]+\.\w+"
+    r"|\+?\d[\d\s-]{7,}\d",
+    re.IGNORECASE,
+)
+
+
+def tokenize(text: str) -> list:
+    tokens = _TOKEN.findall(text.lower())
+    # "pm 2.5" and "pm2.5" are the same pollutant
+    merged = []
+    for token in tokens:
+        if merged and merged[-1] in ("pm", "co", "no", "so") and token[0].isdigit():
+            merged[-1] += token
+        else:
+            merged.append(token)
+    return merged
+
+
+def normalize(text: str) -> str:
+    """Lowercase, punctuation-free, stopword-free form used as the exact-match key."""
+    tokens = [t for t in tokenize(text) if t not in STOPWORDS]
+    return " ".join(tokens) if tokens else " ".join(tokenize(text))
+
+
+def guard_tokens(normalized: str) -> frozenset:
+    """Tokens that must match exactly for a near-duplicate hit."""
+    return frozenset(
+        t for t in normalized.split() if t in NEGATIONS or t in DIRECTIONAL or any(c.isdigit() for c in t)
+    )
+
+
+def same_direction(a: str, b: str) -> bool:
+    """
+    For normalized texts with a directional word, the words both share must come
+    in the same order ("humidity causes mold" vs "mold causes humidity").
+    """
+    words_a, words_b = a.split(), b.split()
+    if DIRECTIONAL.isdisjoint(words_a) and DIRECTIONAL.isdisjoint(words_b):
+        return True
+    shared = set(words_a) & set(words_b)
+    return list(dict.fromkeys(t for t in words_a if t in shared)) == \
+        list(dict.fromkeys(t for t in words_b if t in shared))
+
+
+def is_cacheable(text: str) -> bool:
+    return bool(text and text.strip()) and not _PERSONAL.search(text) and not DISCOMFORT_RE.search(text)
+
+
+def _features(normalized: str):
+    words = normalized.split()
+    yield from words
+    yield from (f"{a} {b}" for a, b in zip(words, words[1:]))
+    padded = f" {normalized} "
+    yield from (padded[i:i + CHAR_NGRAM] for i in range(len(padded) - CHAR_NGRAM + 1))
+
+
+class SemanticCache:
+    def __init__(self, max_entries: int = SEMANTIC_CACHE_SIZE, ttl_seconds: float = SEMANTIC_CACHE_TTL,
+                 threshold: float = SEMANTIC_CACHE_THRESHOLD, dim: int = EMBEDDING_DIM,
+                 enabled: bool = SEMANTIC_CACHE_ENABLED):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self.dim = dim
+        self.enabled = enabled
+        self._entries = OrderedDict()  # normalized text -> [reply, expires_at, slot, guard]
+        self._np = None
+        self._matrix = None            # (max_entries, dim) unit vectors; row `slot` belongs to _slot_keys[slot]
+        self._slot_keys = [None] * max_entries
+        self._free = list(range(max_entries - 1, -1, -1))  # lowest slots first, so live rows stay packed
+        self._rows = 0                 # rows [0, _rows) may be in use; only they are scored
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.rejected = 0              # similar enough, but a guard (numbers, negation, direction) differed
+        self.skipped = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    # ----------------------------
+    # 🧮 Embeddings
+    # ----------------------------
+    def _index(self):
+        """NumPy matrix, allocated on first use; None when NumPy is unavailable."""
+        if self._matrix is None and self._np is None:
+            try:
+                import numpy
+            except ImportError:
+                self._np = False
+                return None
+            self._np = numpy
+            self._matrix = numpy.zeros((self.max_entries, self.dim), dtype=numpy.float32)
+        return self._matrix
+
+    def embed(self, normalized: str):
+        """Signed feature hashing into `dim` buckets, L2-normalized."""
+        np = self._np
+        hashes = [zlib.crc32(feature.encode("utf-8")) for feature in _features(normalized)]
+        vector = np.bincount(
+            [h % self.dim for h in hashes], [1.0 if h & 0x80000000 else -1.0 for h in hashes], minlength=self.dim
+        ).astype(np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    # ----------------------------
+    # 🔍 Lookup / store
+    # ----------------------------
+    def _drop(self, key: str):
+        entry = self._entries.pop(key)
+        slot = entry[2]
+        if slot is not None:
+            self._matrix[slot] = 0.0
+            self._slot_keys[slot] = None
+            self._free.append(slot)
+
+    def _live(self, key: str, now: float):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= now:
+            self.expirations += 1
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def get(self, text: str):
+        """Cached reply for `text` (or a near-duplicate of it), else None."""
+        if not self.enabled or not is_cacheable(text):
+            self.skipped += 1
+            metrics.chat_cache_lookups.inc("skipped")
+            return None
+        now = time.time()
+        key = normalize(text)
+
+        reply = self._live(key, now)
+        if reply is not None:
+            self.exact_hits += 1
+            metrics.chat_cache_lookups.inc("exact")
+            return reply
+
+        matrix = self._index()
+        if matrix is not None and self._entries:
+            scores = matrix[:self._rows] @ self.embed(key)
+            slot = int(scores.argmax())
+            match = self._slot_keys[slot]
+            if match is not None and scores[slot] >= self.threshold:
+                if self._entries[match][3] == guard_tokens(key) and same_direction(match, key):
+                    reply = self._live(match, now)
+                    if reply is not None:
+                        self.semantic_hits += 1
+                        metrics.chat_cache_lookups.inc("semantic")
+                        return reply
+                else:
+                    self.rejected += 1
+
+        self.misses += 1
+        metrics.chat_cache_lookups.inc("miss")
+        return None
+
+    def set(self, text: str, reply: str):
+        if not self.enabled or not reply or not is_cacheable(text):
+            return
+        key = normalize(text)
+        if key in self._entries:
+            self._drop(key)
+        while len(self._entries) >= self.max_entries:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+        slot = None
+        matrix = self._index()
+        if matrix is not None:
+            slot = self._free.pop()
+            self._rows = max(self._rows, slot + 1)
+            matrix[slot] = self.embed(key)
+            self._slot_keys[slot] = key
+        self._entries[key] = [reply, time.time() + self.ttl_seconds, slot, guard_tokens(key)]
+        self.stores += 1
+
+    def clear(self):
+        for key in list(self._entries):
+            self._drop(key)
+
+    def stats(self) -> dict:
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "rejected": self.rejected,
+            "skipped": self.skipped,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "threshold": self.threshold,
+            "vector_index": bool(self._np),
+        }
+
+
+# Shared by /ai/agent and /ai/agent/stream
+chat_cache = SemanticCache()
@@ -0,0 +1,177 @@
+# python_services/serve.py
+"""
+Production launcher: N pre-forked uvicorn workers sharing one listening socket.
+
+    python serve.py [--workers N] [--host 0.0.0.0] [--port 5000]
+
+The parent imports the app and runs warm-up (schemas, intent model) once before
+forking, so every worker starts with them built and shares that memory
+copy-on-write. Clients and connections (Gemini, cache tier) are created in
+each worker after the fork. With more than one worker the recommendation cache gets a shared
+SQLite tier (RECOMMENDATION_CACHE_DB, defaulting to a file in AI_CACHE_DIR,
+./.cache next to this script) or Redis (RECOMMENDATION_CACHE_REDIS_URL), so an
+answer computed by one worker is a cache hit in all of them. Workers that die are restarted; SIGTERM/SIGINT
+drain all workers. Each worker serves /health/live and /health/ready.
+
+Other state (room state, single-flight, metrics) stays per worker; set
+RATE_LIMIT_REDIS_URL to enforce rate limits across workers. With
+RECOMMENDATION_SCHEDULER=1 only worker 0 runs the scheduler: it also listens on
+a private Unix socket, and the other workers forward /ai/rooms/track pushes there.
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import signal
+import socket
+import argparse
+import tempfile
+
+WORKERS = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", 5000))
+RESTART_BACKOFF = 1.0  # seconds between restarts of a worker that died right after starting
+CACHE_DIR = os.getenv("AI_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the AI service with pre-forked workers")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="worker processes (default: CPU cores)")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--log-level", default="info")
+    return parser.parse_args(argv)
+
+
+def configure_environment(workers: int):
+    """Must run before the app is imported: the cache singleton reads these at import."""
+    if workers > 1 and not os.getenv("RECOMMENDATION_CACHE_REDIS_URL") and not os.getenv("RECOMMENDATION_CACHE_DB"):
+        # App-owned directory, not a predictable path in the world-writable temp dir
+        os.makedirs(CACHE_DIR, mode=0o700, exist_ok=True)
+        os.environ["RECOMMENDATION_CACHE_DB"] = os.path.join(CACHE_DIR, "ai_recommendations.sqlite3")
+    if workers > 1 and not os.getenv("RATE_LIMIT_REDIS_URL"):
+        print("serve: RATE_LIMIT_REDIS_URL not set, rate limits apply per worker", file=sys.stderr)
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def bind_scheduler_socket() -> socket.socket:
+    """Unix socket in a private directory; only the scheduler worker listens on it."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(os.path.join(tempfile.mkdtemp(prefix="ai-scheduler-"), "scheduler.sock"))
+    sock.listen(128)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sockets: list, log_level: str):
+    import uvicorn
+
+    random.seed()  # forked workers would otherwise share the scheduler's jitter sequence
+    config = uvicorn.Config(app, log_level=log_level, timeout_graceful_shutdown=30)
+    uvicorn.Server(config).run(sockets=sockets)
+
+
+class Supervisor:
+    def __init__(self, app, sock: socket.socket, workers: int, log_level: str,
+                 scheduler_sock: socket.socket | None = None):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.log_level = log_level
+        self.scheduler_sock = scheduler_sock
+        self.children = {}  # pid -> (worker index, start time)
+        self.stopping = False
+
+    def worker_sockets(self, index: int) -> list:
+        if self.scheduler_sock is None:
+            return [self.sock]
+        if index == 0:
+            return [self.sock, self.scheduler_sock]
+        from recommendation_scheduler import recommendation_scheduler
+
+        recommendation_scheduler.forward_to = self.scheduler_sock.getsockname()
+        return [self.sock]
+
+    def spawn(self, index: int):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                run_worker(self.app, self.worker_sockets(index), self.log_level)
+            except BaseException as e:
+                print(f"serve: worker {os.getpid()} crashed:", e, file=sys.stderr)
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = (index, time.monotonic())
+
+    def stop(self, signum, _frame):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for index in range(self.workers):
+            self.spawn(index)
+        print(f"serve: {self.workers} workers on {self.sock.getsockname()} (parent {os.getpid()})")
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            child = self.children.pop(pid, None)
+            if child is None or self.stopping:
+                continue
+            index, started = child
+            print(f"serve: worker {pid} exited ({os.waitstatus_to_exitcode(status)}), restarting", file=sys.stderr)
+            if time.monotonic() - started < 5:
+                time.sleep(RESTART_BACKOFF)
+            self.spawn(index)
+
+        if self.scheduler_sock is not None:
+            shutil.rmtree(os.path.dirname(self.scheduler_sock.getsockname()), ignore_errors=True)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workers = max(1, args.workers)
+    if not hasattr(os, "fork"):
+        workers = 1  # no pre-forking on this platform
+    configure_environment(workers)
+
+    # Preload: import everything and warm up once, before forking
+    import app as service
+    print(f"serve: warm-up took {service.warm_up() * 1e3:.0f} ms")
+
+    if workers == 1:
+        import uvicorn
+        uvicorn.run(service.app, host=args.host, port=args.port, log_level=args.log_level)
+        return
+
+    sock = bind_socket(args.host, args.port)
+    scheduler_sock = bind_scheduler_socket() if service.SCHEDULER_ENABLED else None
+    Supervisor(service.app, sock, workers, args.log_level, scheduler_sock).run()
+
+
+if __name__ == "__main__":
+    main()
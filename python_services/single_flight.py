@@ -0,0 +1,49 @@
+# python_services/single_flight.py
+"""
+Request coalescing: concurrent calls with the same key share one in-flight task.
+
+The shared task is shielded from its waiters, so a waiter that disconnects
+(its request task is cancelled) never cancels the call the others are awaiting.
+"""
+import asyncio
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight = {}   # key -> asyncio.Task
+        self.leaders = 0      # calls that actually ran
+        self.waiters = 0      # calls that joined an in-flight one
+        self.cancelled_waiters = 0
+
+    async def do(self, key: str, fn):
+        """Run `fn()` once per key at a time; everyone else awaits the same result."""
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t, key=key: self._forget(key, _t))
+        else:
+            self.waiters += 1
+
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # Only this waiter goes away; the shared call keeps running for the others
+            if not task.done():
+                self.cancelled_waiters += 1
+            raise
+
+    def _forget(self, key: str, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark as retrieved when nobody is left waiting
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "leaders": self.leaders,
+            "coalesced_waiters": self.waiters,
+            "cancelled_waiters": self.cancelled_waiters,
+        }
@@ -0,0 +1,16 @@
+# python_services/tests/conftest.py
+"""
+Test setup: modules are imported flat from python_services, Gemini is the
+offline fake backend and no limiter or persistent cache tier is involved.
+"""
+import os
+import sys
+
+os.environ.setdefault("GEMINI_BACKEND", "fake")
+os.environ.setdefault("FAKE_GEMINI_LATENCY", "const:0")
+os.environ.setdefault("GEMINI_CONTEXT_CACHE", "stub")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+os.environ.pop("RECOMMENDATION_CACHE_DB", None)
+os.environ.pop("RECOMMENDATION_CACHE_REDIS_URL", None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,101 @@
+# python_services/tests/test_agent_client.py
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import agent_client
+from agent_client import FALLBACK_REPLY, get_single_call_response
+
+
+@pytest.mark.parametrize("text", [None, "", '{"intent": "CALL_NORMAL_CHAT", "message": "Fresh a', '{"intent": 3}'])
+def test_single_call_invalid_reply_falls_back(monkeypatch, text):
+    async def generate(*args, **kwargs):
+        return SimpleNamespace(text=text)
+
+    monkeypatch.setattr(agent_client, "generate_with_static_prefix", generate)
+    result = asyncio.run(get_single_call_response("what does the humidity number mean on the dashboard?"))
+    assert result == {"type": "chat", "message": FALLBACK_REPLY, "source": "fallback"}
+
+
+@pytest.mark.parametrize("text, source", [("Open a window.", "ai"), ("  ", "fallback"), (None, "fallback")])
+def test_streamed_reply_reports_its_source(monkeypatch, text, source):
+    async def stream_with_static_prefix(*args, **kwargs):
+        yield SimpleNamespace(text=text)
+
+    monkeypatch.setattr(agent_client, "classify_intent", lambda text: ("CALL_NORMAL_CHAT", 1.0))
+    monkeypatch.setattr(agent_client, "stream_with_static_prefix", stream_with_static_prefix)
+
+    async def events():
+        return [event async for event in agent_client.stream_agentic_response("how do plants affect indoor air?")]
+
+    agent_client.chat_cache.clear()
+    *_, (event, done) = asyncio.run(events())
+    agent_client.chat_cache.clear()
+    assert event == "done" and done["source"] == source
+    assert done["message"] == (text.strip() if source == "ai" else FALLBACK_REPLY)
+
+
+QUESTION = "what does stuffy air do to concentration?"
+
+
+@pytest.fixture
+def cached_question(monkeypatch):
+    """QUESTION has a cached chat answer, but the local classifier is unsure about it."""
+    monkeypatch.setattr(agent_client, "classify_intent", lambda text: (None, 0.5))
+    agent_client.chat_cache.clear()
+    agent_client.chat_cache.set(QUESTION, "cached chat answer")
+    yield
+    agent_client.chat_cache.clear()
+
+
+def test_two_step_routes_before_using_the_cache(monkeypatch, cached_question):
+    async def route_with_llm(text):
+        return "CALL_RECOMMENDATION"
+
+    monkeypatch.setattr(agent_client, "route_with_llm", route_with_llm)
+    result = asyncio.run(agent_client.get_two_step_response(QUESTION))
+    assert result["type"] == "recommendation"
+
+
+def test_two_step_serves_the_cache_once_routed_to_chat(monkeypatch, cached_question):
+    async def route_with_llm(text):
+        return "CALL_NORMAL_CHAT"
+
+    monkeypatch.setattr(agent_client, "route_with_llm", route_with_llm)
+    result = asyncio.run(agent_client.get_two_step_response(QUESTION))
+    assert result == {"type": "chat", "message": "cached chat answer", "source": "cache"}
+
+
+def test_single_call_skips_the_cache_when_unsure(monkeypatch, cached_question):
+    async def generate(*args, **kwargs):
+        return SimpleNamespace(text='{"intent": "CALL_RECOMMENDATION", "message": ""}')
+
+    monkeypatch.setattr(agent_client, "generate_with_static_prefix", generate)
+    result = asyncio.run(get_single_call_response(QUESTION))
+    assert result["type"] == "recommendation"
+
+
+def test_stream_honors_single_call_mode(monkeypatch):
+    import app
+
+    async def get_single_call_response(text):
+        return {"type": "chat", "message": "Ventilate for ten minutes.", "source": "ai"}
+
+    async def route_with_llm(text):
+        raise AssertionError("single_call mode must not route separately")
+
+    monkeypatch.setattr(agent_client, "get_single_call_response", get_single_call_response)
+    monkeypatch.setattr(agent_client, "route_with_llm", route_with_llm)
+    client = TestClient(app.app)
+
+    response = client.post("/ai/agent/stream", json={"user_input": "hello there", "mode": "single_call"})
+    assert response.status_code == 200
+    assert [line for line in response.text.splitlines() if line.startswith("event:")] == [
+        "event: route", "event: delta", "event: done",
+    ]
+    assert "Ventilate for ten minutes." in response.text
+
+    response = client.post("/ai/agent/stream", json={"user_input": "hello there", "mode": "three_step"})
+    assert response.status_code == 400
@@ -0,0 +1,99 @@
+# python_services/tests/test_batch.py
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import recommendation_service
+from recommendation_service import recommend_batch
+
+USER = {"_id": "test-user", "age": 30, "health_issues": []}
+
+
+def item(name: str, temperature: float = 28.0):
+    room = {"_id": name, "room_name": name, "room_length": 5, "room_width": 4, "room_height": 3,
+            "occupancy": 2, "appliances": ["AC", "Ceiling Fan", "Window", "Door"]}
+    indoor = {"activityData": {"data": {"temperature": temperature, "humidity": 60, "co2": 1100,
+                                         "pm2_5": 30, "pm10": 40, "voc": 1.2}}}
+    outdoor = {"activityData": {"pm2_5": 40, "temperature_2m": 31}}
+    return USER, room, indoor, outdoor
+
+
+@pytest.fixture
+def answered_by_room(monkeypatch):
+    """Answer each room with its name; earlier rooms finish last."""
+    calls = []
+
+    async def recommend_env(env, cache_key, trends=None):
+        calls.append(env[0]["room_name"])
+        await asyncio.sleep(0.01 * (5 - len(calls)))
+        return {"success": True, "recommendation": {"room": env[0]["room_name"]}, "source": "ai"}
+
+    async def packed(group, results):
+        calls.append([env[0]["room_name"] for _key, env, _trends in group])
+        for cache_key, env, _trends in group:
+            results[cache_key] = {"success": True, "recommendation": {"room": env[0]["room_name"]}, "source": "ai"}
+
+    monkeypatch.setattr(recommendation_service, "RULES_FAST_PATH", False)
+    monkeypatch.setattr(recommendation_service, "recommend_env", recommend_env)
+    monkeypatch.setattr(recommendation_service, "_packed", packed)
+    return calls
+
+
+def rooms(results):
+    return [result["recommendation"]["room"] for result in results]
+
+
+def test_results_keep_request_order(answered_by_room):
+    items = [item("a"), item("b"), item("c"), item("a")]
+    results = asyncio.run(recommend_batch(items, max_concurrency=4))
+    assert rooms(results) == ["a", "b", "c", "a"]
+    assert sorted(answered_by_room) == ["a", "b", "c"]  # the duplicate is computed once
+
+
+@pytest.mark.parametrize("pack_size, chunks", [(2, [["a", "b"], ["c"]]), (0, [["a"], ["b"], ["c"]])])
+def test_pack_size_chunks(answered_by_room, pack_size, chunks):
+    results = asyncio.run(recommend_batch([item("a"), item("b"), item("c")], pack=True, pack_size=pack_size))
+    assert rooms(results) == ["a", "b", "c"]
+    assert answered_by_room == chunks
+
+
+@pytest.mark.parametrize("field", ["pack_size", "max_concurrency"])
+def test_batch_route_rejects_non_positive_sizes(field):
+    import app
+
+    user, room, indoor, outdoor = item("a")
+    body = {"items": [{"user": user, "room": room, "indoor": indoor, "outdoor": outdoor}], "pack": True, field: 0}
+    response = TestClient(app.app).post("/ai/recommend/batch", json=body)
+    assert response.status_code == 422
+
+
+def test_item_history_reaches_the_prompt_like_single_recommend(monkeypatch):
+    seen = {}
+
+    async def recommend_env(env, cache_key, trends=None):
+        seen[env[0]["room_name"]] = trends
+        return {"success": True, "recommendation": {}, "source": "ai"}
+
+    monkeypatch.setattr(recommendation_service, "RULES_FAST_PATH", False)
+    monkeypatch.setattr(recommendation_service, "recommend_env", recommend_env)
+    user, room, indoor, outdoor = item("with-history")
+    history = [{"activityData": {"data": {"co2": co2}}} for co2 in (800, 900, 1000)]
+
+    asyncio.run(recommend_batch([(user, room, indoor, outdoor, history), item("without")]))
+    assert seen["with-history"] and seen["without"] is None
+
+
+def test_item_errors_keep_their_status(monkeypatch):
+    from rate_limiter import RateLimitedError
+
+    async def recommend_env(env, cache_key, trends=None):
+        raise RateLimitedError("user 'test-user'", 7)
+
+    monkeypatch.setattr(recommendation_service, "RULES_FAST_PATH", False)
+    monkeypatch.setattr(recommendation_service, "recommend_env", recommend_env)
+    user, room, indoor, outdoor = item("a")
+
+    invalid, limited = asyncio.run(recommend_batch([(user, {**room, "appliances": 5}, indoor, outdoor), item("b")]))
+    assert invalid["success"] is False and invalid["status_code"] == 422
+    assert limited["status_code"] == 429 and limited["retry_after"] == 7
@@ -0,0 +1,111 @@
+# python_services/tests/test_context_cache.py
+import asyncio
+
+import pytest
+from google.genai import errors as genai_errors
+
+import agent_client
+import context_cache
+from ai_client import get_ai_recommendation
+from context_cache import ContextCacheManager, StubCacheBackend, generate_with_static_prefix
+from data_samples import prepare_environment_data
+from prompt_builder import build_prompt_parts
+
+STATIC = "static instructions " * 300   # ~1500 tokens
+DYNAMIC = "dynamic part"
+
+
+def api_error(code: int, message: str):
+    cls = genai_errors.ServerError if code >= 500 else genai_errors.ClientError
+    return cls(code, {"error": {"code": code, "message": message, "status": "TEST"}})
+
+
+class FailingBackend(StubCacheBackend):
+    async def create(self, model, text, ttl_seconds):
+        self.created += 1
+        raise api_error(400, "Cached content is too small")
+
+
+def test_small_blocks_are_not_cached():
+    backend = StubCacheBackend()
+    manager = ContextCacheManager(backend, min_tokens=1024)
+    assert asyncio.run(manager.handle_for("short prompt")) is None
+    assert backend.created == 0
+    assert manager.stats()["too_small"] == 1
+
+
+def test_failed_create_backs_off():
+    backend = FailingBackend()
+    manager = ContextCacheManager(backend, failure_backoff=600, min_tokens=0)
+    assert asyncio.run(manager.handle_for(STATIC)) is None
+    assert asyncio.run(manager.handle_for(STATIC)) is None
+    assert backend.created == 1
+    assert manager.fallbacks == 2
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Record generate() calls; `errors` lists what the next calls raise."""
+    recorded = {"calls": [], "errors": []}
+
+    async def generate(route, contents, config=None):
+        recorded["calls"].append((contents, (config or {}).get("cached_content")))
+        if recorded["errors"]:
+            raise recorded["errors"].pop(0)
+        return "ok"
+
+    monkeypatch.setattr(context_cache, "context_cache", ContextCacheManager(StubCacheBackend(), min_tokens=0))
+    monkeypatch.setattr(context_cache, "generate", generate)
+    return recorded
+
+
+def test_cached_call_sends_only_dynamic_part(calls):
+    assert asyncio.run(generate_with_static_prefix("chat", STATIC, DYNAMIC)) == "ok"
+    [(contents, handle)] = calls["calls"]
+    assert contents == DYNAMIC and handle.startswith("cachedContents/stub-")
+
+
+def test_cache_error_falls_back_to_full_prompt(calls):
+    calls["errors"].append(api_error(404, "CachedContent not found (or permission denied)"))
+    assert asyncio.run(generate_with_static_prefix("chat", STATIC, DYNAMIC)) == "ok"
+    (_, handle), (contents, no_handle) = calls["calls"]
+    assert handle and no_handle is None
+    assert contents == STATIC + DYNAMIC
+    assert context_cache.context_cache.stats()["handles"] == 0   # invalidated
+
+
+@pytest.mark.parametrize("error", [api_error(503, "overloaded"), api_error(400, "invalid argument"), ValueError("bad")])
+def test_other_errors_are_not_retried_inline(calls, error):
+    calls["errors"].append(error)
+    with pytest.raises(type(error)):
+        asyncio.run(generate_with_static_prefix("chat", STATIC, DYNAMIC))
+    assert len(calls["calls"]) == 1
+
+
+def test_real_prompts_share_one_cached_prefix(monkeypatch):
+    """The merged static prefix clears Gemini's minimum, so every route sends only its dynamic part."""
+    backend = StubCacheBackend()
+    manager = ContextCacheManager(backend)   # default GEMINI_CONTEXT_CACHE_MIN_TOKENS
+    sent = []
+
+    async def generate(route, contents, config=None):
+        sent.append((route, contents, (config or {}).get("cached_content")))
+        return type("Response", (), {"text": '{"RECHECK_AT": 15}' if route == "recommend" else "CALL_NORMAL_CHAT"})()
+
+    monkeypatch.setattr(context_cache, "context_cache", manager)
+    monkeypatch.setattr(context_cache, "generate", generate)
+
+    room = {"room_name": "Hall", "room_length": 5, "room_width": 4, "room_height": 3,
+            "occupancy": 2, "appliances": ["AC", "Ceiling Fan", "Window"]}
+    indoor = {"activityData": {"data": {"temperature": 29.0, "humidity": 65, "co2": 1200}}}
+    env = prepare_environment_data({"age": 30}, room, indoor, {"activityData": {"pm2_5": 40}})
+    static, dynamic = build_prompt_parts(*env)
+
+    asyncio.run(get_ai_recommendation(dynamic, env[1], static_prefix=static))
+    asyncio.run(agent_client.route_with_llm("is it safe to go for a run today?"))
+
+    assert backend.created == 1 and manager.stats()["too_small"] == 0
+    [(_, recommend_prompt, first), (_, route_prompt, second)] = sent
+    assert first == second and first.startswith("cachedContents/stub-")
+    assert recommend_prompt == dynamic and "REQUESTED TASK: RECOMMEND" in recommend_prompt
+    assert route_prompt.startswith("\nREQUESTED TASK: ROUTE\n")
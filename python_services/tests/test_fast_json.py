@@ -0,0 +1,71 @@
+# python_services/tests/test_fast_json.py
+import sys
+import datetime
+import importlib.util
+
+import pytest
+
+import fast_json
+from fast_json import dumps, extract_json, loads
+
+PAYLOAD = {
+    "recommendation": {"AC_MODE": "COOL", "AC_TEMPERATURE": 24, "reason": "CO₂ is high — ventilate"},
+    "history": [{"co2": 1100.5, "ok": True, "note": None}],
+    1: datetime.date(2024, 1, 2),
+}
+
+
+@pytest.fixture
+def stdlib_fast_json(monkeypatch):
+    """A second copy of fast_json imported as if orjson were not installed."""
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    spec = importlib.util.spec_from_file_location("fast_json_stdlib", fast_json.__file__)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    assert module.orjson is None
+    return module
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('```json\n{"a": 1}\n```', {"a": 1}),
+    ('Sure! {"a": [1, 2]} Let me know if {anything} changes.', {"a": [1, 2]}),
+    ('x {"a": [1, 2} y {"ok": 1}', {"ok": 1}),              # mismatched value is skipped
+    ('{"a": {"b": 1}, ]', {"b": 1}),                        # value nested in a broken one
+    ('note {see: [1]} then {"b": 2}', [1]),                  # first parsable value in document order
+    ('He said "hi" then {"a": "q\\"}"} end', {"a": 'q"}'}),   # brackets and quotes inside strings
+    ('] } {"z": [1, 2]}', {"z": [1, 2]}),                    # stray closers in prose
+    ('{"a": [1, {"b": "c', {"a": [1, {"b": "c"}]}),           # truncated output is repaired
+])
+def test_extracts_first_value(text, expected):
+    assert extract_json(text) == expected
+
+
+@pytest.mark.parametrize("text", ["no json here", '{"a": 1,', None])
+def test_raises_when_nothing_parses(text):
+    with pytest.raises(ValueError):
+        extract_json(text, repair=False)
+
+
+@pytest.mark.parametrize("text", ["{" * 50000 + "]", "{" * 25000 + "}" * 25000, '{"a":' * 10000 + "x" + "}" * 10000])
+def test_pathological_input_makes_bounded_parse_attempts(monkeypatch, text):
+    attempts = []
+
+    def counting_loads(value):
+        attempts.append(len(value))
+        return loads(value)
+
+    monkeypatch.setattr(fast_json, "loads", counting_loads)
+    with pytest.raises(ValueError):
+        extract_json(text, repair=False)
+    assert len(attempts) <= 1 + fast_json._MAX_NESTED_ATTEMPTS   # whole text, then one capped span
+
+
+def test_dumps_round_trips():
+    assert loads(dumps(PAYLOAD)) == {**{k: v for k, v in PAYLOAD.items() if k != 1}, "1": "2024-01-02"}
+
+
+def test_stdlib_fallback_matches_orjson(stdlib_fast_json):
+    assert stdlib_fast_json.dumps(PAYLOAD) == dumps(PAYLOAD)
+    assert stdlib_fast_json.loads(dumps(PAYLOAD)) == loads(dumps(PAYLOAD))
+    text = 'Sure: ```json\n{"AC_MODE": "FAN", "RECHECK_AT": 10}\n``` hope that helps'
+    assert stdlib_fast_json.extract_json(text) == extract_json(text)
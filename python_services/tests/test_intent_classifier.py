@@ -0,0 +1,9 @@
+# python_services/tests/test_intent_classifier.py
+from intent_classifier import load_examples
+
+
+def test_load_examples_skips_blank_lines(tmp_path):
+    path = tmp_path / "examples.jsonl"
+    path.write_text('{"text": "hi", "label": "chat"}\n\n   \n{"text": "I feel dizzy", "label": "recommendation"}\n\n',
+                    encoding="utf-8")
+    assert load_examples(str(path)) == [("hi", "chat"), ("I feel dizzy", "recommendation")]
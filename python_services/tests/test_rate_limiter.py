@@ -0,0 +1,90 @@
+# python_services/tests/test_rate_limiter.py
+import asyncio
+
+import pytest
+
+import gemini_client
+from gemini_client import QueueFullError, RouteLimiter
+from rate_limiter import MemoryBucketBackend, QuotaLimiter, current_user
+
+
+class FailingPolicy:
+    async def call(self, fn):
+        raise RuntimeError("upstream failed")
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    quota = QuotaLimiter(backend=MemoryBucketBackend(), user_rpm=10, user_tpm=1000,
+                         model_rpm=100, model_tpm=10000, enabled=True)
+    monkeypatch.setattr(gemini_client, "quota", quota)
+    return quota
+
+
+def all_buckets_full(quota) -> bool:
+    buckets = quota.backend._buckets
+    bursts = {
+        f"{scope}:{key}:{kind}": quota.limits[scope][1 if kind == "req" else 3]
+        for scope, key, kind in (k.split(":") for k in buckets)
+    }
+    return bool(buckets) and all(round(level) == bursts[key] for key, (level, *_) in buckets.items())
+
+
+def run_as_user(coro):
+    async def scenario():
+        current_user.set("alice")
+        return await coro
+    return asyncio.run(scenario())
+
+
+def test_full_queue_refunds_the_reservation(limiter, monkeypatch):
+    full = RouteLimiter("recommend", max_concurrency=1, max_queue=0)
+    full._semaphore = asyncio.Semaphore(0)
+    monkeypatch.setitem(gemini_client.limiters, "recommend", full)
+
+    with pytest.raises(QueueFullError):
+        run_as_user(gemini_client.generate("recommend", "hello there"))
+    assert all_buckets_full(limiter)
+
+
+def test_failed_upstream_call_refunds_the_reservation(limiter, monkeypatch):
+    monkeypatch.setitem(gemini_client.policies, "recommend", FailingPolicy())
+
+    with pytest.raises(RuntimeError):
+        run_as_user(gemini_client.generate("recommend", "hello there"))
+    assert all_buckets_full(limiter)
+    assert len(limiter.backend._buckets) == 4  # user and model, requests and tokens
+
+
+def test_idle_buckets_are_swept_once_refilled(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("rate_limiter.time.monotonic", lambda: clock[0])
+    backend = MemoryBucketBackend()
+
+    async def scenario():
+        await backend.take("user:alice:req", 1.0, 10, 5)
+        clock[0] += 4   # alice is still refilling
+        await backend.take("user:bob:req", 1.0, 10, 5)
+        assert list(backend._buckets) == ["user:alice:req", "user:bob:req"]
+        clock[0] += 2   # alice is full again, bob is not
+        await backend.take("user:carol:req", 1.0, 10, 5)
+
+    asyncio.run(scenario())
+    assert list(backend._buckets) == ["user:bob:req", "user:carol:req"]
+    assert backend.evicted == 1
+
+
+def test_bucket_and_usage_maps_stay_bounded():
+    backend = MemoryBucketBackend(max_buckets=3)
+    quota = QuotaLimiter(backend=backend, enabled=True, max_tracked_users=2)
+    usage = type("Usage", (), {"prompt_token_count": 10, "candidates_token_count": 5})()
+
+    async def scenario():
+        for user in ["alice", "bob", "carol"]:
+            current_user.set(user)
+            estimate = await quota.acquire("gemini-x", "hello")
+            await quota.record("gemini-x", estimate, usage)
+
+    asyncio.run(scenario())
+    assert len(backend._buckets) <= 3
+    assert list(quota.usage["user"]) == ["bob", "carol"]
@@ -0,0 +1,37 @@
+# python_services/tests/test_recommendation_cache.py
+import asyncio
+import threading
+
+from recommendation_cache import RecommendationCache, SQLiteTier
+
+
+class ThreadRecordingTier(SQLiteTier):
+    def __init__(self, path):
+        super().__init__(path)
+        self.threads = set()
+
+    def get(self, key):
+        self.threads.add(threading.get_ident())
+        return super().get(key)
+
+    def set(self, key, value, expires_at):
+        self.threads.add(threading.get_ident())
+        super().set(key, value, expires_at)
+
+
+def test_tier_is_shared_and_used_off_the_event_loop(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    writer = RecommendationCache(tier=ThreadRecordingTier(path))
+    reader = RecommendationCache(tier=ThreadRecordingTier(path))
+
+    async def scenario():
+        await writer.aset("key", {"RECHECK_AT": 15})
+        assert await reader.aget("key") == {"RECHECK_AT": 15}   # from the shared tier
+        assert await reader.aget("key") == {"RECHECK_AT": 15}   # now from memory
+        assert await reader.aget("missing") is None
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(scenario())
+    assert reader.stats()["disk_hits"] == 1 and reader.hits == 1 and reader.misses == 1
+    for cache in (writer, reader):
+        assert cache.disk.threads and loop_thread not in cache.disk.threads
@@ -0,0 +1,27 @@
+# python_services/tests/test_replay_store.py
+from replay_gemini import ReplayStore
+
+
+def test_workers_sharing_a_file_replay_each_others_records(tmp_path):
+    path = str(tmp_path / "gemini.jsonl")
+    first, second = ReplayStore(path), ReplayStore(path)
+    first.append({"key": "a", "text": "from first"})
+    second.append({"key": "b", "text": "from second"})
+    first.append({"key": "a", "text": "first again"})
+    second.close()
+    first.close()
+
+    replay = ReplayStore(path)
+    assert [replay.next("a")["text"], replay.next("a")["text"]] == ["from first", "first again"]
+    assert replay.next("b")["text"] == "from second"
+
+
+def test_index_written_before_another_worker_finished_is_ignored(tmp_path):
+    path = str(tmp_path / "gemini.jsonl")
+    early, late = ReplayStore(path), ReplayStore(path)
+    early.append({"key": "a", "text": "early"})
+    early.close()
+    late.append({"key": "b", "text": "late"})   # still recording, index not rewritten yet
+
+    assert ReplayStore(path).next("b")["text"] == "late"
+    late.close()
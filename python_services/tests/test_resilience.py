@@ -0,0 +1,148 @@
+# python_services/tests/test_resilience.py
+import time
+import asyncio
+
+import pytest
+from google.genai import errors as genai_errors
+
+from resilience import CircuitBreaker, CircuitOpenError, ResiliencePolicy
+
+
+def api_error(code: int):
+    cls = genai_errors.ServerError if code >= 500 else genai_errors.ClientError
+    return cls(code, {"error": {"code": code, "message": "test", "status": "TEST"}})
+
+
+def failing(error, calls: list):
+    async def fn():
+        calls.append(1)
+        raise error
+    return fn
+
+
+# ----------------------------
+# 🔌 Breaker
+# ----------------------------
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.stats()["trips"] == 1
+
+
+def test_breaker_half_open_allows_one_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.before_call()
+    breaker.record_failure()
+    time.sleep(0.02)
+
+    breaker.before_call()                 # the probe
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()             # everyone else waits for it
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_breaker_failed_probe_reopens():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.trips == 2
+
+
+# ----------------------------
+# 🔁 Retries
+# ----------------------------
+def test_retryable_errors_are_retried_and_counted():
+    policy = ResiliencePolicy(max_retries=2, backoff_base=0, breaker=CircuitBreaker(failure_threshold=10))
+    calls = []
+    with pytest.raises(genai_errors.ServerError):
+        asyncio.run(policy.call(failing(api_error(503), calls)))
+    assert len(calls) == 3
+    assert policy.retries == 2
+    assert policy.breaker.failures == 3
+
+
+@pytest.mark.parametrize("error", [api_error(400), api_error(404), LookupError("no recording")])
+def test_non_retryable_errors_fail_once_without_tripping(error):
+    policy = ResiliencePolicy(max_retries=2, backoff_base=0, breaker=CircuitBreaker(failure_threshold=1))
+    calls = []
+    with pytest.raises(type(error)):
+        asyncio.run(policy.call(failing(error, calls)))
+    assert len(calls) == 1
+    assert policy.breaker.state == "closed" and policy.breaker.failures == 0
+
+
+def test_non_retryable_error_releases_half_open_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    policy = ResiliencePolicy(max_retries=0, breaker=breaker)
+    with pytest.raises(genai_errors.ClientError):
+        asyncio.run(policy.call(failing(api_error(400), [])))
+    breaker.before_call()   # the next call may probe again
+    assert breaker.state == "half_open"
+
+
+# ----------------------------
+# 🏁 Hedging
+# ----------------------------
+def hedging_policy() -> ResiliencePolicy:
+    policy = ResiliencePolicy(hedge=True, hedge_quantile=0.95)
+    for _ in range(20):
+        policy.latency.add(0.01)   # hedge after ~10 ms
+    return policy
+
+
+def test_hedge_cancels_the_loser():
+    policy = hedging_policy()
+    cancelled = []
+
+    async def fn():
+        slow = not cancelled and policy.hedges == 0
+        try:
+            await asyncio.sleep(1 if slow else 0)
+        except asyncio.CancelledError:
+            cancelled.append("slow")
+            raise
+        return "slow" if slow else "fast"
+
+    async def scenario():
+        assert await policy.call(fn) == "fast"
+        await asyncio.sleep(0.01)   # let the cancellation land
+        assert cancelled == ["slow"]
+
+    asyncio.run(scenario())
+    assert policy.hedges == 1 and policy.hedge_wins == 1
+
+
+def test_cancelled_caller_cancels_outstanding_attempts():
+    policy = hedging_policy()
+    started, cancelled = [], []
+
+    async def fn():
+        started.append(1)
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def scenario():
+        caller = asyncio.ensure_future(policy.call(fn))
+        await asyncio.sleep(0.002)   # still inside the first wait, before the hedge
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        await asyncio.sleep(0.01)
+        assert len(started) == 1 and cancelled == [1]   # before asyncio.run() reaps leftover tasks
+
+    asyncio.run(scenario())
@@ -0,0 +1,22 @@
+# python_services/tests/test_room_state.py
+from room_state import RoomStateStore
+
+KEY = ("user", "room")
+ENV = ({"room_name": "Hall"}, {"AC": True}, {"age": 30}, {"temperature": 28.0, "co2": 1100}, {"pm2_5": 40})
+RECOMMENDATION = {"RECHECK_AT": 15, "AC_MODE": "COOL"}
+RISING = {"co2": ("rising", True)}
+
+
+def test_unchanged_readings_and_trends_reuse_the_answer():
+    store = RoomStateStore()
+    store.update(KEY, ENV, RECOMMENDATION, RISING)
+    recommendation, _age, delta = store.lookup(KEY, ENV, {"co2": ("rising", True)})
+    assert recommendation == RECOMMENDATION and delta == 0
+
+
+def test_changed_trend_signature_forces_a_fresh_answer():
+    store = RoomStateStore()
+    store.update(KEY, ENV, RECOMMENDATION, RISING)
+    assert store.lookup(KEY, ENV, {"co2": ("steady", True)}) is None
+    assert store.lookup(KEY, ENV) is None
+    assert store.stats()["changed"] == 2
@@ -0,0 +1,87 @@
+# python_services/tests/test_scheduler.py
+import asyncio
+
+import pytest
+
+from recommendation_scheduler import RecommendationScheduler
+
+KEY = ("user", "room")
+
+
+def scheduler_with(results, **kwargs):
+    calls = []
+
+    async def refresh(*inputs):
+        calls.append(inputs)
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return RecommendationScheduler(rate=0, jitter=0, refresh=refresh, **kwargs), calls
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.parametrize("result, expected", [
+    ({"recommendation": {"RECHECK_AT": 15}, "source": "ai"}, 900),
+    ({"recommendation": {"RECHECK_AT": 15}, "source": "state", "stale_age": 300.0}, 600),
+    ({"recommendation": {}, "source": "rules"}, 300),
+    ({"recommendation": {"RECHECK_AT": "soon"}, "source": "ai"}, 300),
+])
+def test_recheck_in_follows_the_model(result, expected):
+    assert RecommendationScheduler.recheck_in(result) == expected
+
+
+def test_room_stays_tracked_until_its_recheck_is_due():
+    async def scenario():
+        scheduler, calls = scheduler_with([{"recommendation": {"RECHECK_AT": 15}, "source": "ai"}])
+        scheduler.start()
+        scheduler.track(KEY, ("first",))
+        await settle()
+        stats = scheduler.stats()
+        await scheduler.stop()
+        return calls, stats
+
+    calls, stats = asyncio.run(scenario())
+    assert calls == [("first",)]
+    assert stats["rooms"] == 1 and stats["queued"] == 1
+    assert 895 < stats["next_due_in"] <= 900
+
+
+def test_push_brings_a_pending_recheck_forward_with_the_newest_readings():
+    async def scenario():
+        scheduler, calls = scheduler_with([
+            {"recommendation": {"RECHECK_AT": 15}, "source": "ai"},
+            {"recommendation": {"RECHECK_AT": 10}, "source": "ai"},
+        ])
+        scheduler.start()
+        scheduler.track(KEY, ("first",))
+        await settle()
+        scheduler.track(KEY, ("second",))
+        await settle()
+        stats = scheduler.stats()
+        await scheduler.stop()
+        return calls, stats
+
+    calls, stats = asyncio.run(scenario())
+    assert calls == [("first",), ("second",)]
+    assert 595 < stats["next_due_in"] <= 600
+
+
+def test_failed_refresh_is_retried_and_silent_rooms_expire():
+    async def scenario():
+        scheduler, calls = scheduler_with([RuntimeError("gemini down")], retry_seconds=0.05, room_ttl=0.02)
+        scheduler.start()
+        scheduler.track(KEY, ("first",))
+        await asyncio.sleep(0.2)
+        stats = scheduler.stats()
+        await scheduler.stop()
+        return calls, stats
+
+    calls, stats = asyncio.run(scenario())
+    assert calls == [("first",)]
+    assert stats["failed"] == 1 and stats["expired_rooms"] == 1 and stats["rooms"] == 0
@@ -0,0 +1,44 @@
+# python_services/tests/test_semantic_cache.py
+import pytest
+
+from semantic_cache import SemanticCache
+
+pytest.importorskip("numpy")
+
+
+def cache_with(question: str) -> SemanticCache:
+    cache = SemanticCache(enabled=True)
+    cache.set(question, "cached reply")
+    return cache
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("what is PM2.5?", "What's PM 2.5"),                                         # exact after normalization
+    ("what is pm2.5?", "what is pm2.5 exactly?"),
+    ("how does humidity affect comfort?", "how does humidity affect comfort levels?"),
+    ("what are the health effects of smog?", "what are the health effects of smog exposure?"),
+])
+def test_paraphrases_hit(stored, asked):
+    assert cache_with(stored).get(asked) == "cached reply"
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("is indoor air worse than outdoor air?", "is outdoor air worse than indoor air?"),     # swapped comparison
+    ("is a fan better than an AC?", "is an AC better than a fan?"),
+    ("does high humidity cause mold?", "does mold cause high humidity?"),                   # swapped cause
+    ("is indoor air worse than outdoor air?", "is indoor air better than outdoor air?"),    # comparison word
+    ("is it safe to run when aqi is high?", "is it not safe to run when aqi is high?"),     # negation
+    ("is co2 of 800 ok?", "is co2 of 1800 ok?"),                                            # number
+])
+def test_reversed_meanings_miss(stored, asked):
+    cache = cache_with(stored)
+    assert cache.get(asked) is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_personal_and_discomfort_messages_are_not_cached():
+    cache = SemanticCache(enabled=True)
+    for text in ("what is my room temperature?", "I feel dizzy"):
+        cache.set(text, "reply")
+        assert cache.get(text) is None
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,220 @@
+# python_services/trend_features.py
+"""
+Streaming trend features over recent indoor readings.
+
+The Node scheduler stores a reading every 5 minutes; /ai/recommend may pass
+the most recent ones as `history`. For CO2, PM2.5 and temperature we keep a
+fixed-size ring buffer per room and maintain running sums, so each new sample
+updates the rolling mean, least-squares slope, EWMA and time above threshold
+in O(1). Only a compact summary of those features goes into the prompt.
+"""
+import os
+import math
+import threading
+from datetime import datetime
+from collections import OrderedDict
+
+from data_samples import extract_indoor_pollutants
+
+# field -> (threshold for "time above", slope per hour treated as steady)
+TREND_FIELDS = {
+    "co2": (1000, 60),          # ppm
+    "pm2_5": (35, 5),           # µg/m³
+    "temperature": (28, 0.5),   # °C
+}
+
+TREND_WINDOW = int(os.getenv("TREND_WINDOW", 12))            # 12 × 5 min = last hour
+TREND_EWMA_ALPHA = float(os.getenv("TREND_EWMA_ALPHA", 0.3))
+TREND_MAX_ROOMS = int(os.getenv("TREND_MAX_ROOMS", 10000))
+SAMPLE_INTERVAL_MINUTES = 5
+
+
+def parse_timestamp(value):
+    """Minutes since the epoch from a Mongo/ISO timestamp or epoch seconds; None if unknown."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value / 60
+    if isinstance(value, datetime):
+        return value.timestamp() / 60
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).timestamp() / 60
+        except ValueError:
+            return None
+    return None
+
+
+class RollingTrend:
+    """
+    Ring buffer of (minute, value) with running sums for mean and slope.
+    Sums are rebuilt from the buffer once per full rotation (amortized O(1))
+    so floating-point drift and growing time offsets never accumulate.
+    """
+
+    __slots__ = ("size", "threshold", "alpha", "times", "values", "head", "count",
+                 "origin", "sx", "sy", "sxx", "sxy", "above", "ewma", "since_rebuild")
+
+    def __init__(self, size: int, threshold: float, alpha: float):
+        self.size = size
+        self.threshold = threshold
+        self.alpha = alpha
+        self.times = [0.0] * size
+        self.values = [0.0] * size
+        self.head = 0          # next slot to write
+        self.count = 0
+        self.origin = None
+        self.sx = self.sy = self.sxx = self.sxy = 0.0
+        self.above = 0
+        self.ewma = None
+        self.since_rebuild = 0
+
+    def add(self, minute: float, value: float):
+        if self.origin is None:
+            self.origin = minute
+        if self.count == self.size:
+            self._remove(self.times[self.head], self.values[self.head])
+        else:
+            self.count += 1
+
+        self.times[self.head] = minute
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.size
+        self._include(minute, value)
+        self.ewma = value if self.ewma is None else self.alpha * value + (1 - self.alpha) * self.ewma
+
+        self.since_rebuild += 1
+        if self.since_rebuild >= self.size:
+            self._rebuild()
+
+    def _include(self, minute, value):
+        x = minute - self.origin
+        self.sx += x
+        self.sy += value
+        self.sxx += x * x
+        self.sxy += x * value
+        self.above += value > self.threshold
+
+    def _remove(self, minute, value):
+        x = minute - self.origin
+        self.sx -= x
+        self.sy -= value
+        self.sxx -= x * x
+        self.sxy -= x * value
+        self.above -= value > self.threshold
+
+    def _rebuild(self):
+        start = (self.head - self.count) % self.size
+        self.origin = self.times[start]
+        self.sx = self.sy = self.sxx = self.sxy = 0.0
+        self.above = 0
+        for i in range(self.count):
+            slot = (start + i) % self.size
+            self._include(self.times[slot], self.values[slot])
+        self.since_rebuild = 0
+
+    @property
+    def mean(self):
+        return self.sy / self.count if self.count else None
+
+    @property
+    def slope_per_hour(self):
+        n = self.count
+        denominator = n * self.sxx - self.sx * self.sx
+        if n < 2 or denominator <= 0:
+            return None
+        return (n * self.sxy - self.sx * self.sy) / denominator * 60
+
+    def summary(self, precision: int) -> dict:
+        slope = self.slope_per_hour
+        return {
+            "mean": round(self.mean, precision),
+            "ewma": round(self.ewma, precision),
+            "slope_h": None if slope is None else round(slope, precision),
+            "above_min": self.above * SAMPLE_INTERVAL_MINUTES,
+            "n": self.count,
+        }
+
+
+class TrendExtractor:
+    """RollingTrend per tracked field, fed one raw Node document at a time."""
+
+    def __init__(self, window: int = TREND_WINDOW, alpha: float = TREND_EWMA_ALPHA):
+        self.trends = {field: RollingTrend(window, threshold, alpha)
+                       for field, (threshold, _band) in TREND_FIELDS.items()}
+        self.last_minute = None
+
+    def add(self, raw_indoor: dict) -> bool:
+        """Feed one reading; readings not newer than the last one are ignored."""
+        readings = extract_indoor_pollutants(raw_indoor)
+        if not readings:
+            return False
+        minute = parse_timestamp(readings.get("timestamp"))
+        if minute is None:
+            # No usable timestamp: assume the scheduler's regular cadence
+            minute = (self.last_minute or 0) + SAMPLE_INTERVAL_MINUTES
+        elif self.last_minute is not None and minute <= self.last_minute:
+            return False
+
+        for field, trend in self.trends.items():
+            value = readings.get(field)
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and not math.isnan(value):
+                trend.add(minute, value)
+        self.last_minute = minute
+        return True
+
+    def summary(self) -> dict:
+        """Compact per-field features; fields without samples are omitted."""
+        return {
+            field: trend.summary(0 if field == "co2" else 1)
+            for field, trend in self.trends.items() if trend.count
+        }
+
+
+def trend_signature(summary: dict) -> dict:
+    """Coarse view for cache keys: direction and whether the threshold was crossed."""
+    signature = {}
+    for field, features in (summary or {}).items():
+        band = TREND_FIELDS[field][1]
+        slope = features.get("slope_h") or 0
+        direction = "rising" if slope > band else "falling" if slope < -band else "steady"
+        signature[field] = (direction, features["above_min"] > 0)
+    return signature
+
+
+class TrendStore:
+    """
+    Per-room extractors kept across requests, so each call only pays for the
+    readings that arrived since the previous one.
+    """
+
+    def __init__(self, max_rooms: int = TREND_MAX_ROOMS):
+        self.max_rooms = max_rooms
+        self._extractors = OrderedDict()
+        self._lock = threading.Lock()
+        self.samples = 0
+
+    def summarize(self, key, history: list, latest: dict | None = None) -> dict:
+        """Feed `history` (oldest first) plus the latest reading and return the trend summary."""
+        docs = [doc for doc in list(history or ()) + [latest] if doc]
+        # Without timestamps, repeated history cannot be told apart from new samples
+        if key is None or any(parse_timestamp(doc.get("timestamp")) is None for doc in docs):
+            extractor = TrendExtractor()
+        else:
+            with self._lock:
+                extractor = self._extractors.get(key)
+                if extractor is None:
+                    extractor = self._extractors[key] = TrendExtractor()
+                self._extractors.move_to_end(key)
+                while len(self._extractors) > self.max_rooms:
+                    self._extractors.popitem(last=False)
+
+        for doc in docs:
+            self.samples += extractor.add(doc)
+        return extractor.summary()
+
+    def stats(self) -> dict:
+        return {"rooms": len(self._extractors), "samples": self.samples}
+
+
+trend_store = TrendStore()
@@ -16,9 +16,12 @@ const callPythonAgent = async (req, res) => {
     }
 
     // 🔹 Step 1: Send message to Python /ai/agent
-    const pythonRes = await axios.post(`${PYTHON_API_BASE}/ai/agent`, {
-      user_input: message,
-    });
+    // userId is the Gemini quota owner; without it every chat shares one bucket
+    const pythonRes = await axios.post(
+      `${PYTHON_API_BASE}/ai/agent`,
+      { user_input: message, user_id: userId ? String(userId) : undefined },
+      { headers: userId ? { "X-User-Id": String(userId) } : {} }
+    );
 
     const aiResult = pythonRes.data?.result;
     const agentReply =
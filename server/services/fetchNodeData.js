@@ -1,5 +1,6 @@
 const axios = require("axios");
 const Node = require("../models/Node.js");
+const trackRoomReadings = require("./trackRoomReadings.js");
 
 const SENSOR_API_URL = process.env.SENSOR_API_URL;
 
@@ -41,10 +42,13 @@ async function fetchAndStoreNodeData() {
     });
 
     // ✅ Always insert new records
-    await Node.insertMany(nodesToInsert);
+    const inserted = await Node.insertMany(nodesToInsert);
     console.log(
       `[+] ✅ Inserted ${nodesToInsert.length} node records.`
     );
+
+    // ✅ Let the recommendation scheduler precompute for the affected rooms
+    await trackRoomReadings(inserted.map((doc) => doc.toObject()));
   } catch (error) {
     console.error("[-][Scheduler] ❌ Error fetching node data:", error.message);
   }
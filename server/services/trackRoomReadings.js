@@ -0,0 +1,48 @@
+const axios = require("axios");
+const Room = require("../models/Room.js");
+const User = require("../models/User.js");
+const OutdoorData = require("../models/OutdoorData.js");
+
+const PYTHON_API_BASE = process.env.PYTHON_API_BASE;
+
+// Push freshly stored readings of every room that uses one of the devices to
+// the Python recommendation scheduler, so recommendations are ready before
+// they are read. Rooms use their first device with a fresh reading.
+async function trackRoomReadings(nodeDocs) {
+  if (!PYTHON_API_BASE || nodeDocs.length === 0) return;
+
+  const latestByDevice = new Map(nodeDocs.map((doc) => [String(doc.nodeValue), doc]));
+  const trackUrl = `${PYTHON_API_BASE.replace(/\/$/, "")}/ai/rooms/track`;
+
+  try {
+    const [rooms, latestOutdoorDoc] = await Promise.all([
+      Room.find({ devices: { $in: [...latestByDevice.keys()] }, isDeleted: false }).lean(),
+      OutdoorData.findOne({ isDeleted: false }).sort({ timestamp: -1 }).lean(),
+    ]);
+    const users = await User.find({ _id: { $in: rooms.map((room) => room.userId) }, isDeleted: false }).lean();
+    const usersById = new Map(users.map((user) => [String(user._id), user]));
+
+    for (const room of rooms) {
+      const user = usersById.get(String(room.userId));
+      const device = room.devices.find((d) => latestByDevice.has(String(d)));
+      if (!user || device === undefined) continue;
+
+      const payload = {
+        user,
+        room,
+        indoor: latestByDevice.get(String(device)),
+        outdoor: latestOutdoorDoc || null,
+      };
+      try {
+        await axios.post(trackUrl, payload, { timeout: 10_000 });
+      } catch (err) {
+        if (err.response?.status === 503) return; // scheduler disabled or unavailable
+        console.error(`[-][Scheduler] Tracking room ${room._id} failed:`, err.message);
+      }
+    }
+  } catch (error) {
+    console.error("[-][Scheduler] ❌ Error tracking room readings:", error.message);
+  }
+}
+
+module.exports = trackRoomReadings;